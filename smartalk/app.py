@@ -4,17 +4,28 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from smartalk.core.dynamodb import AWS_EGRESS_DB_COUNTER_BYTES, get_dynamodb_resource_context, get_table
+from smartalk.core.dynamodb import (
+    DB_RESPONSE_BYTES,
+    close_shared_dynamodb_resource,
+    dynamodb_connection,
+    get_table,
+    open_shared_dynamodb_resource,
+    scan_items,
+)
+from smartalk.core.metrics import render_metrics
 from smartalk.core.settings import settings
+from smartalk.core.tracing import DBTracingMiddleware
 
 # from smartalk.db_usage.data_scheduler import (
 #     get_all_coaches,
 #     process_calendar_delta,
 #     setup_watch_for_calendar,
 # )
-from smartalk.db_usage.sync_calendars import get_sync_item
+from smartalk.email_and_automations.utils.calendars_manager import close_google_clients
+from smartalk.email_and_automations.utils.pdf_renderer import shutdown_pdf_render_pool, start_pdf_render_pool
 from smartalk.routes import auth, coach, student, website
 
 # from smartalk.routes import calendar_sync, scheduler
@@ -35,7 +46,7 @@ DO_STARTUP = True
 
 
 # -----------------------------------------------------
-# LIFESPAN (solo creazione tabelle)
+# LIFESPAN (risorsa DynamoDB condivisa e creazione tabelle)
 # -----------------------------------------------------
 
 
@@ -44,16 +55,28 @@ async def lifespan(app: FastAPI):
     """Gestisce l'avvio e la chiusura dell'applicazione."""
     logger.info("\n[AVVIO APPLICAZIONE]")
 
-    db_context = get_dynamodb_resource_context()
-    async with db_context as db:
-        # 1. crea tabelle
-        await ensure_tables(db)
-        logger.info("Tabelle DynamoDB pronte.")
+    # 0. risorsa DynamoDB condivisa (un solo pool di connessioni per processo)
+    db = await open_shared_dynamodb_resource()
+
+    # 1. crea tabelle
+    await ensure_tables(db)
+    logger.info("Tabelle DynamoDB pronte.")
+
+    # 2. pool di processi per il render dei PDF (WeasyPrint)
+    await start_pdf_render_pool()
+
+    # 3. template del sito compilati prima della prima richiesta
+    compiled = await asyncio.to_thread(website.precompile_templates)
+    logger.info(f"Template compilati: {compiled}.")
 
     yield
 
     logger.info("\n[CHIUSURA APPLICAZIONE]")
-    mb = AWS_EGRESS_DB_COUNTER_BYTES / (1024 * 1024)
+    # shutdown(wait=True) attende i render in corso: fuori dall'event loop
+    await asyncio.to_thread(shutdown_pdf_render_pool)
+    await close_google_clients()
+    await close_shared_dynamodb_resource()
+    mb = DB_RESPONSE_BYTES.total() / (1024 * 1024)
     logger.info(f"Egress DB inviato: {mb:.4f} MB")
     logger.info("Shutdown completato.")
 
@@ -91,6 +114,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tracing DynamoDB per richiesta (header Server-Timing)
+app.add_middleware(DBTracingMiddleware)
+
 # Routers
 app.include_router(auth.router)
 app.include_router(student.router)
@@ -122,8 +148,7 @@ async def unified_startup(x_internal_key: str | None = None):
     # Disattiva ulteriori invocazioni
     DO_STARTUP = False
 
-    db_context = get_dynamodb_resource_context()
-    async with db_context as db:
+    async with dynamodb_connection() as db:
         # 1. Migrazione (se abilitata)
         if settings.RUN_DATA_MIGRATION:
             logger.info("Eseguo MIGRAZIONE DATI...")
@@ -196,14 +221,19 @@ TABLE_MAP = {
 }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Contatori del processo (byte e chiamate DynamoDB per tabella/operazione) in formato Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/see_data")
 async def see_table_data(table_short_name: str):
     """
     Servizio di debug per visualizzare tutti i dati di una tabella.
     Usa un nome breve per la tabella (es. 'users', 'products').
     """
-    db_ = get_dynamodb_resource_context()
-    async with db_ as db:
+    async with dynamodb_connection() as db:
         if table_short_name not in TABLE_MAP:
             raise HTTPException(
                 status_code=404, detail=f"Nome tabella non valido. Usare uno tra: {list(TABLE_MAP.keys())}"
@@ -215,13 +245,7 @@ async def see_table_data(table_short_name: str):
             table = await get_table(db, table_name)
             # L'operazione 'scan' legge tutti gli item in una tabella.
             # ATTENZIONE: può essere costosa su tabelle molto grandi in produzione.
-            response = await table.scan()
-            items = response.get("Items", [])
-
-            # Gestisce la paginazione se la tabella è grande
-            while "LastEvaluatedKey" in response:
-                response = await table.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
-                items.extend(response.get("Items", []))
+            items = await scan_items(table)
 
             return {"quantity": len(items), "items": items}
 
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List
+
+from botocore.exceptions import ClientError
+from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
+
+from smartalk.core.dynamodb import get_table, make_atomic_transaction, to_low_level_item
+from smartalk.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# LOCK DELLE PRENOTAZIONI (BOOKING_LOCKS Table)
+# ==========================
+#
+# Prima di toccare Google Calendar, book_call prende un lock per ogni mezz'ora dello slot:
+# un item {"lock_id": "<coach_id>#<inizio mezz'ora UTC>", "owner", "expires_at"} scritto con
+# una sola TransactWriteItems condizionale. Due prenotazioni sovrapposte dello stesso coach
+# condividono almeno una mezz'ora: la seconda fallisce subito in DynamoDB (BookingLockConflict)
+# e non arriva mai a Google, quindi non c'è niente da annullare.
+# Il lock viene rilasciato a fine prenotazione; se il processo muore resta fino a expires_at
+# (BOOKING_LOCK_TTL_SECONDS). Il TTL di DynamoDB cancella gli item scaduti solo dopo un po',
+# per questo la condizione di acquisizione accetta anche un lock scaduto ancora presente.
+
+LOCK_BUCKET_MINUTES = 30
+
+
+class BookingLockConflict(Exception):
+    """Un'altra prenotazione dello stesso coach tiene già una parte dello slot."""
+
+
+def lock_buckets(start_dt: datetime, end_dt: datetime) -> List[datetime]:
+    """Inizio (UTC) delle mezz'ore toccate da [start_dt, end_dt)."""
+    start_utc = start_dt.astimezone(timezone.utc)
+    minute = start_utc.minute - start_utc.minute % LOCK_BUCKET_MINUTES
+    bucket = start_utc.replace(minute=minute, second=0, microsecond=0)
+    buckets = []
+    while bucket < end_dt:
+        buckets.append(bucket)
+        bucket += timedelta(minutes=LOCK_BUCKET_MINUTES)
+    return buckets
+
+
+def lock_ids(coach_id: str, start_dt: datetime, end_dt: datetime) -> List[str]:
+    return [f"{coach_id}#{bucket.isoformat()}" for bucket in lock_buckets(start_dt, end_dt)]
+
+
+async def acquire_booking_lock(
+    db: DynamoDBServiceResource, coach_id: str, start_dt: datetime, end_dt: datetime, owner: str
+) -> List[str]:
+    """Prende tutte le mezz'ore dello slot (tutte o nessuna) e restituisce i lock_id."""
+    ids = lock_ids(coach_id, start_dt, end_dt)
+    if len(ids) > 25:
+        # limite di TransactWriteItems: 12 ore e mezza, ben oltre qualsiasi chiamata
+        raise ValueError(f"Slot troppo lungo per il lock di prenotazione: {len(ids)} mezz'ore")
+
+    now = int(time.time())
+    puts = [
+        {
+            "TableName": settings.BOOKING_LOCKS_TABLE,
+            "Item": to_low_level_item(
+                {"lock_id": lock_id, "owner": owner, "expires_at": now + settings.BOOKING_LOCK_TTL_SECONDS}
+            ),
+            "ConditionExpression": "attribute_not_exists(lock_id) OR expires_at < :now",
+            "ExpressionAttributeValues": {":now": {"N": str(now)}},
+        }
+        for lock_id in ids
+    ]
+    try:
+        await make_atomic_transaction(db, puts=puts)
+    except ClientError as e:
+        if _is_lock_conflict(e):
+            raise BookingLockConflict(f"Slot {start_dt.isoformat()} del coach {coach_id} già in prenotazione") from e
+        raise
+    return ids
+
+
+def _is_lock_conflict(e: ClientError) -> bool:
+    """
+    Conflitto solo se la transazione è stata annullata da una condizione fallita:
+    throttling, TransactionConflict, ValidationError ecc. vengono rilanciati.
+    """
+    if e.response["Error"]["Code"] != "TransactionCanceledException":
+        return False
+    codes = [reason.get("Code", "None") for reason in e.response.get("CancellationReasons", [])]
+    return "ConditionalCheckFailed" in codes and all(code in ("None", "ConditionalCheckFailed") for code in codes)
+
+
+async def release_booking_lock(db: DynamoDBServiceResource, ids: List[str], owner: str) -> None:
+    """Rilascia i lock presi da owner; un lock già scaduto e ripreso da altri non viene toccato."""
+    table = await get_table(db, settings.BOOKING_LOCKS_TABLE)
+
+    async def release(lock_id: str) -> None:
+        try:
+            await table.delete_item(
+                Key={"lock_id": lock_id},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": owner},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                # resta comunque fino a expires_at
+                logger.warning(f"Lock di prenotazione {lock_id} non rilasciato: {e}")
+
+    await asyncio.gather(*[release(lock_id) for lock_id in ids])
+
+
+@asynccontextmanager
+async def booking_lock(
+    db: DynamoDBServiceResource, coach_id: str, start_dt: datetime, end_dt: datetime
+) -> AsyncIterator[List[str]]:
+    """
+    async with booking_lock(db, coach_id, start_dt, end_dt): ...
+    Lancia BookingLockConflict se un'altra prenotazione tiene una parte dello slot.
+    """
+    owner = uuid.uuid4().hex
+    ids = await acquire_booking_lock(db, coach_id, start_dt, end_dt, owner)
+    try:
+        yield ids
+    finally:
+        await release_booking_lock(db, ids, owner)
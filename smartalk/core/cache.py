@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Cache in memoria (per processo) con scadenza degli elementi (TTL)
+    e rimozione LRU quando si supera max_size.
+
+    Non usa lock: tutte le operazioni sono sincrone e quindi atomiche
+    rispetto all'event loop di asyncio.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Restituisce il valore se presente e non scaduto, altrimenti default."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return default
+
+        # accesso recente → in fondo alla coda LRU
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Inserisce (o sostituisce) un valore; con ttl_seconds <= 0 la cache è disattivata."""
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Rimuove un singolo elemento (es. dopo una scrittura sul DB)."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ReadThroughCache:
+    """
+    Cache read-through asincrona sopra TTLCache: in caso di miss chiama il loader,
+    e le richieste concorrenti per la stessa chiave attendono un unico caricamento (single-flight).
+
+    Un'invalidazione durante un caricamento in corso scarta il risultato di quel caricamento
+    (non viene salvato) e le richieste successive ripartono dal DB.
+    I valori None (es. item inesistente) non vengono salvati.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024, key_names: Tuple[str, ...] = ()):
+        self.key_names = key_names
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_size=max_size)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def key_for(self, item: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+        """Chiave di cache (tupla dei valori di key_names) di una chiave primaria o di un item completo."""
+        if not all(name in item for name in self.key_names):
+            return None
+        return tuple(item[name] for name in self.key_names)
+
+    def peek(self, key: Hashable) -> Any:
+        """Valore in cache senza caricamento (None se assente o scaduto)."""
+        return self._cache.get(key)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if value is not None:
+            self._cache.set(key, value)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(loader())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._store(key, f))
+
+        # shield: se un chiamante viene cancellato il caricamento condiviso prosegue per gli altri
+        return await asyncio.shield(future)
+
+    def _store(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is not future:
+            return  # invalidato durante il caricamento
+        del self._inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.set(key, future.result())
+
+    def invalidate(self, key: Hashable) -> None:
+        self._cache.invalidate(key)
+        self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._inflight.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+# ==========================
+# CACHE PER TABELLA E HOOK DI INVALIDAZIONE
+# ==========================
+#
+# Le scritture centralizzate (put_item, delete_item, make_atomic_transaction in
+# smartalk.core.dynamodb) chiamano invalidate_item(table_name, item_or_key):
+# ogni hook registrato per quella tabella riceve la chiave (o l'item scritto).
+
+_item_caches: Dict[str, ReadThroughCache] = {}
+_invalidation_hooks: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+
+
+def add_invalidation_hook(table_name: str, hook: Callable[[Dict[str, Any]], None]) -> None:
+    _invalidation_hooks.setdefault(table_name, []).append(hook)
+
+
+def register_item_cache(
+    table_name: str, key_names: Tuple[str, ...], ttl_seconds: float, max_size: int = 1024
+) -> ReadThroughCache:
+    """Cache read-through degli item di una tabella, invalidata dalle scritture su quella tabella."""
+    cache = ReadThroughCache(ttl_seconds=ttl_seconds, max_size=max_size, key_names=key_names)
+    _item_caches[table_name] = cache
+
+    def invalidate(item: Dict[str, Any]) -> None:
+        key = cache.key_for(item)
+        if key is None:
+            cache.clear()  # chiave non ricostruibile: meglio svuotare che servire dati vecchi
+        else:
+            cache.invalidate(key)
+
+    add_invalidation_hook(table_name, invalidate)
+    return cache
+
+
+def get_item_cache(table_name: str) -> Optional[ReadThroughCache]:
+    return _item_caches.get(table_name)
+
+
+def invalidate_item(table_name: str, item_or_key: Dict[str, Any]) -> None:
+    """Da chiamare dopo ogni scrittura su table_name (item completo o sola chiave primaria)."""
+    for hook in _invalidation_hooks.get(table_name, ()):
+        hook(item_or_key)
@@ -1,25 +1,50 @@
 import asyncio
-import json
 import logging
-from contextlib import asynccontextmanager
+import random
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import date, datetime, timezone
 from decimal import Decimal
 from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional
 
 from aioboto3 import Session as AioSession
+from aiobotocore.config import AioConfig
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
 from types_aiobotocore_dynamodb.client import DynamoDBClient
 
+from smartalk.core.cache import get_item_cache, invalidate_item, register_item_cache
+from smartalk.core.metrics import counter
 from smartalk.core.settings import settings
+from smartalk.core.tracing import record_db_call
 
 # Inizializzazione logger
 logger = logging.getLogger("aws_egress_db_counter")
-logger.setLevel(logging.INFO)  # Mantenere INFO per vedere il conteggio
 
-# Contatore globale che stima il traffico in uscita da AWS (DB -> Server)
-AWS_EGRESS_DB_COUNTER_BYTES = 0
-lock = asyncio.Lock()
+# Traffico in uscita da AWS (DB -> Server), per tabella e operazione: esposto su /metrics
+DB_RESPONSE_BYTES = counter(
+    "smartalk_dynamodb_response_bytes_total",
+    "Byte ricevuti da DynamoDB (Content-Length della risposta HTTP)",
+    ("table", "operation"),
+)
+DB_CALLS = counter("smartalk_dynamodb_calls_total", "Chiamate a DynamoDB", ("table", "operation", "status"))
+CACHE_REQUESTS = counter(
+    "smartalk_item_cache_requests_total", "Letture get_item servite dalla cache", ("table", "result")
+)
+
+# Dati di riferimento letti quasi a ogni richiesta: get_item su queste tabelle passa dalla cache
+# read-through (smartalk.core.cache), invalidata da put_item, delete_item e make_atomic_transaction
+products_cache = register_item_cache(
+    settings.PRODUCTS_TABLE, ("product_id",), settings.PRODUCTS_CACHE_TTL_SECONDS, settings.PRODUCTS_CACHE_MAX_SIZE
+)
+users_cache = register_item_cache(
+    settings.USERS_TABLE, ("id",), settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_SIZE
+)
+
+# Risorsa DynamoDB condivisa dal processo (aperta/chiusa nel lifespan dell'app)
+_shared_resource = None
+_shared_resource_stack: Optional[AsyncExitStack] = None
 
 
 def get_today_string(today: date = None):
@@ -98,14 +123,180 @@ def clean_dynamo_value(value: Any) -> Any:
     return value
 
 
+async def get_raw_item(db, table_name: str, keys: dict) -> Optional[Dict[str, Any]]:
+    """
+    Item così come arriva da DynamoDB (None se non esiste). Per le tabelle con cache
+    registrata (es. PRODUCTS, USERS) legge prima dalla cache: il dict restituito è
+    condiviso, non va modificato.
+    """
+
+    async def load():
+        table = await get_table(db, table_name)
+        item_response = await table.get_item(Key=keys)
+        return item_response.get("Item")
+
+    cache = get_item_cache(table_name)
+    key = cache.key_for(keys) if cache is not None else None
+    if key is None:
+        return await load()
+
+    CACHE_REQUESTS.inc(table=table_name, result="hit" if cache.peek(key) is not None else "miss")
+    return await cache.get(key, load)
+
+
 async def get_item(db, table_name: str, keys: dict) -> dict:
     """Ottiene un item da DynamoDB e converte i Decimal e altri tipi non JSON-friendly."""
+    raw_item = await get_raw_item(db, table_name, keys)
+    return clean_dynamo_value(raw_item or {})
+
+
+async def paginate(
+    table: Table,
+    operation: str = "query",
+    page_size: Optional[int] = None,
+    max_items: Optional[int] = None,
+    **kwargs,
+) -> AsyncGenerator[List[Dict[str, Any]], None]:
+    """
+    Esegue query/scan seguendo LastEvaluatedKey e restituisce una pagina (lista di item) alla volta.
+
+    - page_size: suggerimento per il Limit di ogni richiesta (item valutati, prima del FilterExpression)
+    - max_items: stop anticipato dopo aver restituito max_items item in totale
+    Interrompere il ciclo "async for" non esegue altre richieste.
+    """
+    method = getattr(table, operation)
+    if page_size:
+        kwargs["Limit"] = page_size
+
+    returned = 0
+    while True:
+        response = await method(**kwargs)
+        items = response.get("Items", [])
+
+        if max_items is not None and returned + len(items) >= max_items:
+            yield items[: max_items - returned]
+            return
+
+        if items:
+            returned += len(items)
+            yield items
+
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+async def query_items(
+    table: Table, page_size: Optional[int] = None, max_items: Optional[int] = None, **kwargs
+) -> List[Dict[str, Any]]:
+    """Tutti gli item di una query (tutte le pagine), fino a max_items se indicato."""
+    items = []
+    async for page in paginate(table, "query", page_size=page_size, max_items=max_items, **kwargs):
+        items.extend(page)
+    return items
+
+
+async def scan_items(
+    table: Table, page_size: Optional[int] = None, max_items: Optional[int] = None, **kwargs
+) -> List[Dict[str, Any]]:
+    """Tutti gli item di una scan (tutte le pagine), fino a max_items se indicato."""
+    items = []
+    async for page in paginate(table, "scan", page_size=page_size, max_items=max_items, **kwargs):
+        items.extend(page)
+    return items
+
+
+async def batch_get_items(
+    db: DynamoDBServiceResource,
+    table_name: str,
+    keys: List[Dict[str, Any]],
+    projection: Optional[List[str]] = None,
+    max_retries: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Legge più item con BatchGetItem (max 100 chiavi per chiamata).
+    Le chiavi duplicate vengono scartate e le UnprocessedKeys vengono ripetute
+    con backoff esponenziale. Restituisce gli item così come arrivano da DynamoDB
+    (nessun ordine garantito, le chiavi inesistenti sono semplicemente assenti).
+    """
+    # de-duplicazione preservando l'ordine
+    unique_keys = list({tuple(sorted(k.items())): k for k in keys if None not in k.values()}.values())
+    if not unique_keys:
+        return []
+
+    request_base: Dict[str, Any] = {}
+    if projection:
+        # alias per tutti gli attributi: evita problemi con le parole riservate (es. "name", "status")
+        names = {f"#p{i}": attr for i, attr in enumerate(projection)}
+        request_base["ProjectionExpression"] = ", ".join(names)
+        request_base["ExpressionAttributeNames"] = names
+
+    items: List[Dict[str, Any]] = []
+    for start in range(0, len(unique_keys), 100):
+        request_items = {table_name: {"Keys": unique_keys[start : start + 100], **request_base}}
+
+        for attempt in range(max_retries + 1):
+            response = await db.batch_get_item(RequestItems=request_items)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+            if attempt == max_retries:
+                raise RuntimeError(f"batch_get_items ({table_name} table): UnprocessedKeys dopo {attempt} retry")
+            await asyncio.sleep(min(0.05 * 2**attempt, 2))
+
+    return items
+
+
+async def get_key_names(db: DynamoDBServiceResource, table_name: str) -> List[str]:
+    """Attributi della chiave primaria (HASH e, se presente, RANGE) letti con DescribeTable."""
     table = await get_table(db, table_name)
+    return [k["AttributeName"] for k in await table.key_schema]
 
-    item_response = await table.get_item(Key=keys)
-    raw_item = item_response.get("Item", {})
 
-    return clean_dynamo_value(raw_item)
+async def batch_write_items(
+    db: DynamoDBServiceResource,
+    table_name: str,
+    items: List[Dict[str, Any]],
+    key_names: Optional[List[str]] = None,
+    max_concurrency: int = 4,
+    max_retries: int = 8,
+) -> int:
+    """
+    Scrive (PutRequest) gli item con BatchWriteItem, a blocchi da 25 inviati in parallelo
+    (al massimo max_concurrency alla volta). Gli UnprocessedItems vengono ripetuti con backoff
+    esponenziale e jitter. Item con la stessa chiave: vince l'ultimo, come con put_item in sequenza
+    (BatchWriteItem rifiuta chiavi duplicate nella stessa richiesta).
+    Restituisce il numero di item scritti.
+    """
+    key_names = key_names or await get_key_names(db, table_name)
+    unique = {tuple(item[k] for k in key_names): item for item in items}
+    if len(unique) < len(items):
+        logger.info(f"batch_write_items ({table_name} table): {len(items) - len(unique)} item duplicati sovrascritti")
+    items = list(unique.values())
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def write_chunk(chunk: List[Dict[str, Any]]) -> None:
+        request_items = {table_name: [{"PutRequest": {"Item": item}} for item in chunk]}
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                response = await db.batch_write_item(RequestItems=request_items)
+                request_items = response.get("UnprocessedItems") or {}
+                if not request_items:
+                    return
+                if attempt == max_retries:
+                    raise RuntimeError(f"batch_write_items ({table_name} table): UnprocessedItems dopo {attempt} retry")
+                await asyncio.sleep(random.uniform(0, min(0.05 * 2**attempt, 5)))
+
+    try:
+        await asyncio.gather(*[write_chunk(items[i : i + 25]) for i in range(0, len(items), 25)])
+    finally:
+        for item in items:
+            invalidate_item(table_name, item)
+    return len(items)
 
 
 async def put_item(db: DynamoDBServiceResource, table_name: str, item: dict, keys: list) -> Table:
@@ -114,6 +305,7 @@ async def put_item(db: DynamoDBServiceResource, table_name: str, item: dict, key
         await table.put_item(
             Item=to_dynamodb_item(item), ConditionExpression=" AND ".join([f"attribute_not_exists({k})" for k in keys])
         )
+        invalidate_item(table_name, item)
         return {"success": True}
     except ClientError as e:
         logger.error(f"DynamoDB Error in put_item ({table_name} table): {e}")
@@ -124,6 +316,7 @@ async def delete_item(db: DynamoDBServiceResource, table_name: str, keys: dict)
     try:
         table = await get_table(db, table_name)
         await table.delete_item(Key=keys, ConditionExpression=" AND ".join([f"attribute_exists({k})" for k in keys]))
+        invalidate_item(table_name, keys)
         return {"success": True}
     except ClientError as e:
         logger.error(f"DynamoDB Error in delete_item ({table_name} table): {e}")
@@ -134,6 +327,18 @@ def get_db_client(db: DynamoDBServiceResource) -> DynamoDBClient:
     return db.meta.client
 
 
+def get_dynamodb_client_config() -> AioConfig:
+    """
+    Configurazione del client aiobotocore: dimensione del pool di connessioni
+    aiohttp e keep-alive, per riutilizzare le connessioni HTTP tra le richieste.
+    """
+    return AioConfig(
+        max_pool_connections=settings.DYNAMO_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=settings.DYNAMO_TCP_KEEPALIVE,
+        connector_args={"keepalive_timeout": settings.DYNAMO_KEEPALIVE_TIMEOUT},
+    )
+
+
 def get_dynamodb_resource_context():
     """
     Restituisce l'AsyncContextManager (session.resource(...)).
@@ -152,7 +357,7 @@ def get_dynamodb_resource_context():
         region_name=settings.AWS_REGION,
     )
 
-    kwargs = {}
+    kwargs = {"config": get_dynamodb_client_config()}
 
     # Configura endpoint_url solo se specificato (caso locale/custom)
     if settings.DYNAMO_ENDPOINT:
@@ -165,89 +370,171 @@ def get_dynamodb_resource_context():
     return session.resource("dynamodb", **kwargs)
 
 
-class DynamoDBResourceWrapper:
-    """
-    Wrapper che avvolge la risorsa DynamoDB per intercettare i metodi di lettura
-    e misurare i byte della risposta.
-    """
+def _table_label(params: Dict[str, Any]) -> str:
+    """Nome della tabella di una richiesta low-level (più tabelle separate da virgola)."""
+    if "TableName" in params:
+        return params["TableName"]
+    if "RequestItems" in params:
+        return ",".join(sorted(params["RequestItems"]))
+    if "TransactItems" in params:
+        tables = {op.get("TableName") for item in params["TransactItems"] for op in item.values()}
+        return ",".join(sorted(t for t in tables if t))
+    return ""
+
+
+def _count_items(parsed: Dict[str, Any]) -> Optional[int]:
+    if "Items" in parsed:
+        return len(parsed["Items"])
+    if "Item" in parsed:
+        return 1
+    responses = parsed.get("Responses")
+    if isinstance(responses, dict):  # BatchGetItem
+        return sum(len(items) for items in responses.values())
+    if isinstance(responses, list):  # TransactGetItems
+        return len(responses)
+    return None
+
+
+def _consumed_capacity(parsed: Dict[str, Any]) -> Optional[float]:
+    consumed = parsed.get("ConsumedCapacity")
+    if consumed is None:
+        return None
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return float(sum(c.get("CapacityUnits", 0) for c in consumed))
+
+
+def _before_db_call(params, model, context, **kwargs):
+    # before-parameter-build: params è già la copia definitiva (boto3 la crea in provide-client-params)
+    context["metrics_table"] = _table_label(params)
+    context["metrics_operation"] = model.name
+    context["metrics_index"] = params.get("IndexName")
+    if settings.DB_TRACE_CONSUMED_CAPACITY and "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+    context["metrics_started"] = time.perf_counter()
+
+
+def _after_db_call(http_response, parsed, model, context, **kwargs):
+    # after-call: la risposta è già stata letta, basta l'header (nessuna serializzazione)
+    try:
+        received_bytes = int(http_response.headers.get("content-length", 0))
+    except (TypeError, ValueError):
+        received_bytes = 0
+
+    table = context.get("metrics_table", "")
+    failed = http_response.status_code >= 300
+    DB_RESPONSE_BYTES.inc(received_bytes, table=table, operation=model.name)
+    DB_CALLS.inc(table=table, operation=model.name, status="error" if failed else "ok")
+
+    if "metrics_started" in context:
+        record_db_call(
+            operation=model.name,
+            table=table,
+            latency_ms=(time.perf_counter() - context["metrics_started"]) * 1000,
+            index=context.get("metrics_index"),
+            items=None if failed else _count_items(parsed),
+            consumed_capacity=_consumed_capacity(parsed),
+            error=parsed.get("Error", {}).get("Code") if failed else None,
+        )
 
-    def __init__(self, resource):
-        self._resource = resource
 
-    def __getattr__(self, name):
-        # Ottiene l'attributo/metodo reale dalla risorsa sottostante
-        attr = getattr(self._resource, name)
+def _after_db_call_error(exception, context, **kwargs):
+    # errori di rete/timeout: nessuna risposta HTTP
+    table = context.get("metrics_table", "")
+    operation = context.get("metrics_operation", "")
+    DB_CALLS.inc(table=table, operation=operation, status="error")
+    if "metrics_started" in context:
+        record_db_call(
+            operation=operation,
+            table=table,
+            latency_ms=(time.perf_counter() - context["metrics_started"]) * 1000,
+            index=context.get("metrics_index"),
+            error=type(exception).__name__,
+        )
 
-        # Intercetta solo i metodi che restituiscono dati
-        if callable(attr) and name in ("get_item", "scan", "query", "batch_get_item"):
-            return self._wrap_method(attr, name)
 
-        return attr
+def install_db_metrics(resource) -> None:
+    """
+    Registra gli hook di botocore (idempotente) che, per ogni chiamata della risorsa,
+    aggiornano i contatori di /metrics e la traccia della richiesta corrente (smartalk.core.tracing).
+    """
+    events = resource.meta.client.meta.events
+    events.register("before-parameter-build.dynamodb", _before_db_call, unique_id="smartalk-metrics-before")
+    events.register("after-call.dynamodb", _after_db_call, unique_id="smartalk-metrics-after")
+    events.register("after-call-error.dynamodb", _after_db_call_error, unique_id="smartalk-metrics-error")
 
-    def _wrap_method(self, original_method, method_name):
-        # Funzione di wrapping asincrona
-        async def wrapped_method(*args, **kwargs):
-            try:
-                # Esegue l'operazione reale su DynamoDB
-                response = await original_method(*args, **kwargs)
 
-                # Misurazione: serializza la risposta per stimare i byte ricevuti
-                response_json = json.dumps(response, separators=(",", ":")).encode("utf-8")
-                # Misura la dimensione (stimata)
-                received_bytes = len(response_json)
+async def open_shared_dynamodb_resource():
+    """
+    Crea (una sola volta per processo) la risorsa DynamoDB condivisa:
+    credenziali, loader di botocore e pool HTTP vengono inizializzati qui
+    e riutilizzati da tutte le richieste. Da chiamare nel lifespan dell'app.
+    """
+    global _shared_resource, _shared_resource_stack
 
-                # Aggiornamento del Contatore Globale
-                global AWS_EGRESS_DB_COUNTER_BYTES
-                current_counter = None
-                async with lock:
-                    AWS_EGRESS_DB_COUNTER_BYTES += received_bytes
-                    current_counter = AWS_EGRESS_DB_COUNTER_BYTES
+    if _shared_resource is not None:
+        return _shared_resource
 
-                logger.info(f"-> DB {method_name} | Received: {received_bytes / 1024:.2f} KB")
-                logger.info(f"Total current received from db: {current_counter / 1024**2:.2f} MB")
+    stack = AsyncExitStack()
+    try:
+        _shared_resource = await stack.enter_async_context(get_dynamodb_resource_context())
+        install_db_metrics(_shared_resource)
+    except Exception:
+        await stack.aclose()
+        raise
+    _shared_resource_stack = stack
+    logger.info(f"Risorsa DynamoDB condivisa pronta (pool: {settings.DYNAMO_MAX_POOL_CONNECTIONS} connessioni)")
+    return _shared_resource
 
-                return response
-            except Exception as e:
-                logger.error(f"Errore DB in {method_name}: {e}")
-                raise
 
-        return wrapped_method
+async def close_shared_dynamodb_resource() -> None:
+    """Chiude la risorsa DynamoDB condivisa e il suo pool di connessioni."""
+    global _shared_resource, _shared_resource_stack
+
+    stack = _shared_resource_stack
+    _shared_resource = None
+    _shared_resource_stack = None
+    if stack is not None:
+        await stack.aclose()
 
 
-@asynccontextmanager
 async def get_dynamodb_connection() -> AsyncGenerator:
     """
-    Dependency Injection per ottenere la connessione resiliente (risolve TypeError)
-    e applica il wrapper di misurazione.
+    Dependency Injection per ottenere la connessione DynamoDB.
+
+    Usa la risorsa condivisa aperta nel lifespan dell'app; se non disponibile
+    (es. script lanciati fuori dall'app) apre una risorsa dedicata.
     """
-    db_context_manager = get_dynamodb_resource_context()
+    if _shared_resource is not None:
+        yield _shared_resource
+        return
 
     # Uso di async with per creare la risorsa in modo asincrono
-    async with db_context_manager as db_resource:
+    async with get_dynamodb_resource_context() as db_resource:
+        install_db_metrics(db_resource)
         try:
-            # Passa la risorsa DynamoDB wrappata alla funzione che la richiede
-            yield DynamoDBResourceWrapper(db_resource)
+            yield db_resource
         except Exception as e:
             logger.critical(f"Errore CRITICO durante l'inizializzazione/uso di DynamoDB: {e}")
             raise
 
 
-async def _count_db_egress_bytes(op_name: str, response: Dict) -> None:
-    """Stima i byte ricevuti serializzando la response come JSON compatto."""
-    try:
-        # JSON “compatto” per non sovrastimare con spaziature
-        payload = json.dumps(response, separators=(",", ":")).encode("utf-8")
-        received_bytes = len(payload)
+# Stessa connessione di get_dynamodb_connection, utilizzabile con "async with" fuori dalla Dependency Injection
+dynamodb_connection = asynccontextmanager(get_dynamodb_connection)
+
+
+_deserializer = TypeDeserializer()
 
-        global AWS_EGRESS_DB_COUNTER_BYTES
-        async with lock:
-            AWS_EGRESS_DB_COUNTER_BYTES += received_bytes
-            total = AWS_EGRESS_DB_COUNTER_BYTES
 
-        logger.info(f"-> DB {op_name} | Received: {received_bytes / 1024:.2f} KB")
-        logger.info(f"Total current received from db: {total / 1024**2:.2f} MB")
-    except Exception as e:
-        logger.warning(f"Impossibile stimare egress per {op_name}: {e}")
+def _invalidate_transaction_items(items: List[Dict]) -> None:
+    """Invalida in cache gli item toccati da una TransactWriteItems (wire format low-level)."""
+    for item in items:
+        for op_type, operation in item.items():
+            if op_type == "ConditionCheck":
+                continue
+            key = operation.get("Key") or operation.get("Item")
+            if key:
+                invalidate_item(operation["TableName"], {k: _deserializer.deserialize(v) for k, v in key.items()})
 
 
 # ---------------------------
@@ -288,14 +575,10 @@ async def make_atomic_transaction(
         if len(gets) > 25:
             raise ValueError("TransactGetItems: max 25 operazioni.")
 
-        response = await get_db_client(db).transact_get_items(
+        return await get_db_client(db).transact_get_items(
             TransactItems=[{"Get": g["Get"]} if "Get" in g else {"Get": g} for g in gets]
         )
 
-        # Conteggio egress per le get transaction
-        await _count_db_egress_bytes("transact_get_items", response)
-        return response
-
     # ----- TransactWriteItems -----
     if not gets and any([checks, puts, updates, deletes]):
         items: List[Dict] = []
@@ -317,4 +600,8 @@ async def make_atomic_transaction(
         if len(items) > 25:
             raise ValueError("TransactWriteItems: max 25 operazioni.")
 
-        await get_db_client(db).transact_write_items(TransactItems=items)
+        try:
+            await get_db_client(db).transact_write_items(TransactItems=items)
+        finally:
+            # anche in caso di errore (es. timeout): la transazione potrebbe essere stata applicata
+            _invalidate_transaction_items(items)
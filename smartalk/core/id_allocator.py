@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from botocore.exceptions import ClientError
+from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
+
+from smartalk.core.dynamodb import get_table
+from smartalk.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# ID PROGRESSIVI (COUNTERS Table)
+# ==========================
+#
+# Ogni contatore è un item {"counter_name": str, "value": N} in COUNTERS_TABLE.
+# Le prenotazioni usano UpdateItem "ADD": atomico lato DynamoDB, quindi due richieste
+# (o due processi) non ricevono mai lo stesso numero.
+# Con block_size > 1 il processo prenota un blocco di numeri e li assegna in locale:
+# una scrittura ogni block_size ID, al prezzo di buchi nella numerazione
+# (blocchi non finiti al riavvio) e di ID non ordinati tra processi diversi.
+
+
+class IdAllocator:
+    """
+    Allocatore di ID progressivi, es. IdAllocator("contract_id", prefix="CON") → "CON001", "CON002", ...
+
+    seed: funzione opzionale chiamata una sola volta, se il contatore non esiste ancora,
+    per ripartire dal massimo già presente nei dati (es. contratti creati prima del contatore).
+    """
+
+    def __init__(
+        self,
+        counter_name: str,
+        prefix: str = "",
+        width: int = 3,
+        block_size: int = 1,
+        seed: Optional[Callable[[DynamoDBServiceResource], Awaitable[int]]] = None,
+    ):
+        self.counter_name = counter_name
+        self.prefix = prefix
+        self.width = width
+        self.block_size = max(1, block_size)
+        self.seed = seed
+        self._next = 0
+        self._end = 0  # escluso
+        self._lock = asyncio.Lock()
+
+    def format(self, number: int) -> str:
+        # oltre width cifre il numero si allunga (CON999 → CON1000)
+        return f"{self.prefix}{number:0{self.width}d}"
+
+    def parse(self, value: str) -> Optional[int]:
+        """Numero di un ID generato da questo allocatore (None se il formato non corrisponde)."""
+        if not value or not value.startswith(self.prefix) or not value[len(self.prefix) :].isdigit():
+            return None
+        return int(value[len(self.prefix) :])
+
+    async def _add(self, db: DynamoDBServiceResource, count: int) -> int:
+        table = await get_table(db, settings.COUNTERS_TABLE)
+        response = await table.update_item(
+            Key={"counter_name": self.counter_name},
+            UpdateExpression="ADD #v :n",
+            ConditionExpression="attribute_exists(#v)",
+            ExpressionAttributeNames={"#v": "value"},
+            ExpressionAttributeValues={":n": count},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["value"])
+
+    async def _initialize(self, db: DynamoDBServiceResource) -> None:
+        start = await self.seed(db) if self.seed else 0
+        table = await get_table(db, settings.COUNTERS_TABLE)
+        try:
+            await table.put_item(
+                Item={"counter_name": self.counter_name, "value": start},
+                ConditionExpression="attribute_not_exists(counter_name)",
+            )
+            logger.info(f"Contatore {self.counter_name} inizializzato a {start}")
+        except ClientError as e:
+            # un'altra richiesta/processo l'ha già creato: si usa il suo valore
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    async def reserve(self, db: DynamoDBServiceResource, count: int) -> List[int]:
+        """Prenota count numeri consecutivi con una sola UpdateItem (es. per le migrazioni massive)."""
+        if count <= 0:
+            return []
+        try:
+            last = await self._add(db, count)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            await self._initialize(db)
+            last = await self._add(db, count)
+        return list(range(last - count + 1, last + 1))
+
+    async def reserve_ids(self, db: DynamoDBServiceResource, count: int) -> List[str]:
+        return [self.format(n) for n in await self.reserve(db, count)]
+
+    async def next_id(self, db: DynamoDBServiceResource) -> str:
+        """Prossimo ID: dal blocco locale se disponibile, altrimenti prenota un nuovo blocco."""
+        async with self._lock:
+            if self._next >= self._end:
+                numbers = await self.reserve(db, self.block_size)
+                self._next, self._end = numbers[0], numbers[-1] + 1
+            number = self._next
+            self._next += 1
+        return self.format(number)
+
+    async def ensure_at_least(self, db: DynamoDBServiceResource, value: int) -> None:
+        """
+        Porta il contatore ad almeno value (es. dopo un import con ID già assegnati) e scarta il
+        blocco locale, che potrebbe contenere numeri già usati dall'import.
+        I blocchi già prenotati da ALTRI processi non si possono invalidare: un import che assegna
+        ID da sé va eseguito prima che l'app serva traffico (come la migrazione in /startup).
+        """
+        async with self._lock:
+            self._next = self._end = 0
+        table = await get_table(db, settings.COUNTERS_TABLE)
+        try:
+            await table.update_item(
+                Key={"counter_name": self.counter_name},
+                UpdateExpression="SET #v = :v",
+                ConditionExpression="attribute_not_exists(#v) OR #v < :v",
+                ExpressionAttributeNames={"#v": "value"},
+                ExpressionAttributeValues={":v": value},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
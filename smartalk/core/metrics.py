@@ -0,0 +1,65 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# ==========================
+# CONTATORI IN MEMORIA (formato Prometheus)
+# ==========================
+#
+# Contatori per processo, senza lock: vengono incrementati solo dall'event loop
+# (operazioni sincrone, quindi atomiche rispetto ad asyncio).
+# L'endpoint /metrics li espone nel formato testuale di Prometheus.
+
+
+class Counter:
+    """Contatore monotono con etichette (es. table, operation)."""
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._values[tuple(str(labels.get(name, "")) for name in self.label_names)] += amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            if label_values:
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, label_values))
+                lines.append(f"{self.name}{{{labels}}} {_format(value)}")
+            else:
+                lines.append(f"{self.name} {_format(value)}")
+        return lines
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry: Dict[str, Counter] = {}
+
+
+def counter(name: str, description: str, label_names: Tuple[str, ...] = ()) -> Counter:
+    """Restituisce il contatore registrato con questo nome, creandolo se non esiste."""
+    if name not in _registry:
+        _registry[name] = Counter(name, description, label_names)
+    return _registry[name]
+
+
+def render_metrics() -> str:
+    """Tutti i contatori registrati, nel formato testuale di Prometheus (text/plain; version=0.0.4)."""
+    lines: List[str] = []
+    for name in sorted(_registry):
+        lines.extend(_registry[name].render())
+    return "\n".join(lines) + "\n"
@@ -11,6 +11,18 @@ class settings(BaseSettings):
     DYNAMO_ENDPOINT: str | None = None
     AWS_ACCESS_KEY_ID: str | None = "dummy"
     AWS_SECRET_ACCESS_KEY: str | None = "dummy"
+    # Pool HTTP (aiohttp) della risorsa DynamoDB condivisa dal processo
+    DYNAMO_MAX_POOL_CONNECTIONS: int = 50
+    DYNAMO_TCP_KEEPALIVE: bool = True
+    DYNAMO_KEEPALIVE_TIMEOUT: float = 60.0
+    # Richieste DynamoDB parallele per singola registrazione di call di gruppo
+    LOG_CALL_MAX_CONCURRENCY: int = 8
+    # Tracing delle chiamate DynamoDB: soglia del log "query lenta" (ms)
+    DB_SLOW_QUERY_MS: float = 200.0
+    # Chiede ReturnConsumedCapacity=TOTAL su ogni chiamata che lo supporta
+    DB_TRACE_CONSUMED_CAPACITY: bool = True
+    # Logga il riepilogo delle richieste HTTP con almeno N chiamate DynamoDB (0 = disattivato)
+    DB_TRACE_LOG_MIN_CALLS: int = 0
 
     # Tables
     USERS_TABLE: str
@@ -23,22 +35,84 @@ class settings(BaseSettings):
     DEBRIEFS_TABLE: str
     COMPANY_EMPLOYEES_TABLE: str
     BOOKING_CALLS_TABLE: str
+    COUNTERS_TABLE: str
 
     # JWT
     JWT_SECRET: str
     JWT_ALG: str
 
+    # Cache degli utenti autenticati (chiave: "sub" del JWT)
+    USER_CACHE_TTL_SECONDS: float = 60
+    USER_CACHE_MAX_SIZE: int = 1024
+    # Se True i controlli di ruolo usano i claim del JWT firmato (nessuna lettura su USERS per i rifiuti)
+    AUTH_TRUST_JWT_CLAIMS: bool = False
+
+    # Password (bcrypt) in un thread pool dedicato
+    PASSWORD_HASH_WORKERS: int = 4
+    # Login: verifiche bcrypt contemporanee (le altre attendono fino a LOGIN_QUEUE_TIMEOUT_SECONDS, poi 429)
+    LOGIN_MAX_CONCURRENCY: int = 4
+    LOGIN_QUEUE_TIMEOUT_SECONDS: float = 5
+    # Login: password errate massime per (IP client, email) nella finestra (poi 429)
+    LOGIN_RATE_LIMIT_ATTEMPTS: int = 10
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: float = 60
+
+    # ID contratti (CONxxx): numeri prenotati per volta dal contatore atomico in COUNTERS_TABLE
+    CONTRACT_ID_BLOCK_SIZE: int = 10
+    # Cache del catalogo prodotti (PRODUCTS cambia raramente)
+    PRODUCTS_CACHE_TTL_SECONDS: float = 300
+    PRODUCTS_CACHE_MAX_SIZE: int = 1024
+    # Cache breve dei nomi di studenti/clienti (USERS)
+    NAMES_CACHE_TTL_SECONDS: float = 60
+    NAMES_CACHE_MAX_SIZE: int = 4096
+
+    # Render PDF (WeasyPrint) in un pool di processi
+    PDF_RENDER_WORKERS: int = 2
+
+    # Invio email: "gmail" (Gmail API) oppure "memory" (finto, per test e benchmark)
+    EMAIL_TRANSPORT: str = "gmail"
+    EMAIL_SEND_MAX_CONCURRENCY: int = 4
+    EMAIL_SEND_MAX_RETRIES: int = 5
+
     # Google OAuth
     GOOGLE_CLIENT_ID: str
     GMAIL_TOKEN_JSON: str
     CALENDAR_SERVICE: str
+    # Discovery document di Google Calendar v3 in locale (JSON); se assente viene scaricato una volta per processo
+    CALENDAR_DISCOVERY_DOC_PATH: str | None = None
+    # Indice locale degli slot liberi dei coach: finestra caricata da Google (giorni) e
+    # ricarica di sicurezza, per le modifiche arrivate senza webhook
+    AVAILABILITY_HORIZON_DAYS: int = 56
+    AVAILABILITY_INDEX_TTL_SECONDS: float = 900.0
+    AVAILABILITY_INDEX_MAX_CALENDARS: int = 256
+    # Ricerca su tutti i coach: calendari letti in parallelo e cache della lista dei coach prenotabili
+    AVAILABILITY_MAX_CONCURRENT_CALENDARS: int = 8
+    BOOKABLE_COACHES_TTL_SECONDS: float = 300.0
+
+    # Template del sito: True in sviluppo per ricaricare i template modificati senza riavviare
+    TEMPLATES_AUTO_RELOAD: bool = False
+    # Cartella del bytecode Jinja2 (solo con TEMPLATES_AUTO_RELOAD=False); None = cartella temporanea di sistema
+    TEMPLATES_BYTECODE_CACHE_DIR: str | None = None
 
     # --- Variabili per la migrazione ---
     # Impostare a 'True' nel file .env solo per il primo avvio
     RUN_DATA_MIGRATION: bool = False
     RUN_INIT_CALENDARS: bool = False
     LOCAL_ENDPOINT: str
+    # Endpoint Apps Script che espone i fogli (in locale: smartalk/scripts/sheets_stand_in_server.py)
+    APPS_SCRIPT_URL: str = "https://script.google.com/macros/s/AKfycbxkMQHNbDYt3LesAzEDbeii9aqgJ7xsww31yWcK9fLBs9l-tvKgR1WsVcAXJ3CNcm8/exec"
+    # Righe per richiesta (offset/limit) nella lettura dei fogli
+    SHEETS_PAGE_SIZE: int = 1000
     X_SECRET: str
+    # Thread per validazione Pydantic e hash delle password dei fogli
+    MIGRATION_VALIDATION_WORKERS: int = 4
+    # BatchWriteItem (e letture di preparazione) in parallelo per foglio
+    MIGRATION_WRITE_CONCURRENCY: int = 8
+    # Checkpoint della migrazione: un file JSON per foglio e tabella di destinazione,
+    # aggiornato ogni MIGRATION_CHECKPOINT_ROWS righe
+    MIGRATION_CHECKPOINT_DIR: str = "logs/migration_checkpoints"
+    MIGRATION_CHECKPOINT_ROWS: int = 1000
+    # Salta i fogli completati nel run precedente quando la migrazione parte da /startup
+    MIGRATION_RESUME: bool = False
 
     # Startup
     INTERNAL_STARTUP_KEY: str
@@ -51,6 +125,10 @@ class settings(BaseSettings):
     CALENDAR_SYNC_TABLE: str
     CALENDAR_SYNC_WEBHOOK_URL: str
 
+    # Lock delle prenotazioni (smartalk.core.booking_lock): non copiata da sync_local_to_aws
+    BOOKING_LOCKS_TABLE: str
+    BOOKING_LOCK_TTL_SECONDS: int = 120
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,119 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from smartalk.core.settings import settings
+
+logger = logging.getLogger("dynamodb_tracing")
+
+# ==========================
+# TRACCIA DELLE CHIAMATE DYNAMODB PER RICHIESTA
+# ==========================
+#
+# Ogni richiesta HTTP apre una traccia (lista di chiamate) in una ContextVar:
+# gli hook di botocore (vedi smartalk.core.dynamodb) vi aggiungono una voce per chiamata.
+# I task creati con asyncio.gather/create_task copiano il contesto e quindi
+# scrivono nella stessa lista. Fuori da una richiesta (script, lifespan) non c'è traccia
+# e resta attivo solo il log delle query lente.
+
+_current_trace: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("db_trace", default=None)
+
+
+def start_trace() -> List[Dict[str, Any]]:
+    """Apre una nuova traccia nel contesto corrente e la restituisce."""
+    trace: List[Dict[str, Any]] = []
+    _current_trace.set(trace)
+    return trace
+
+
+def get_trace() -> Optional[List[Dict[str, Any]]]:
+    return _current_trace.get()
+
+
+def record_db_call(
+    operation: str,
+    table: str,
+    latency_ms: float,
+    index: Optional[str] = None,
+    items: Optional[int] = None,
+    consumed_capacity: Optional[float] = None,
+    error: Optional[str] = None,
+) -> None:
+    """Registra una chiamata nella traccia corrente (se presente) e la logga se lenta."""
+    call = {
+        "operation": operation,
+        "table": table,
+        "index": index,
+        "items": items,
+        "consumed_capacity": consumed_capacity,
+        "latency_ms": round(latency_ms, 2),
+        "error": error,
+    }
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append(call)
+
+    if latency_ms >= settings.DB_SLOW_QUERY_MS:
+        logger.warning(
+            f"DynamoDB lenta: {operation} {table}{'/' + index if index else ''} "
+            f"{latency_ms:.0f} ms, items={items}, capacity={consumed_capacity}"
+            f"{', error=' + error if error else ''}"
+        )
+
+
+def summarize_trace(trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totali di una traccia: numero di chiamate, tempo cumulato, capacità consumata, chiamate per operazione."""
+    by_operation: Dict[str, int] = {}
+    for call in trace:
+        key = f"{call['operation']} {call['table']}"
+        by_operation[key] = by_operation.get(key, 0) + 1
+
+    return {
+        "calls": len(trace),
+        "latency_ms": round(sum(c["latency_ms"] for c in trace), 2),
+        "consumed_capacity": round(sum(c["consumed_capacity"] or 0 for c in trace), 2),
+        "by_operation": by_operation,
+    }
+
+
+def server_timing_header(trace: List[Dict[str, Any]], total_ms: float) -> str:
+    """
+    Valore dell'header Server-Timing, es.:
+    db;dur=42.1;desc="7 calls, 3.5 RCU/WCU", app;dur=58.3
+    La durata "db" è la somma delle latenze: con chiamate in parallelo può superare "app".
+    """
+    summary = summarize_trace(trace)
+    return (
+        f'db;dur={summary["latency_ms"]};desc="{summary["calls"]} calls, {summary["consumed_capacity"]} RCU/WCU", '
+        f"app;dur={total_ms:.2f}"
+    )
+
+
+class DBTracingMiddleware(BaseHTTPMiddleware):
+    """
+    Apre una traccia per ogni richiesta e aggiunge alla risposta l'header Server-Timing.
+    Con settings.DB_TRACE_LOG_MIN_CALLS > 0 logga anche il riepilogo delle richieste
+    che superano quel numero di chiamate (utile per scovare gli N+1).
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        trace = start_trace()
+        started = time.perf_counter()
+
+        response = await call_next(request)
+
+        total_ms = (time.perf_counter() - started) * 1000
+        response.headers["Server-Timing"] = server_timing_header(trace, total_ms)
+
+        if 0 < settings.DB_TRACE_LOG_MIN_CALLS <= len(trace):
+            summary = summarize_trace(trace)
+            logger.warning(
+                f"{request.method} {request.url.path}: {summary['calls']} chiamate DynamoDB "
+                f"({summary['latency_ms']} ms, {summary['consumed_capacity']} RCU/WCU) {summary['by_operation']}"
+            )
+        return response
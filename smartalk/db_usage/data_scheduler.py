@@ -32,7 +32,11 @@ from smartalk.db_usage.sync_calendars import (
     put_sync_item,
     update_sync_token,
 )
-from smartalk.email_and_automations.utils.calendars_manager import CalendarManager
+from smartalk.email_and_automations.utils.calendars_manager import (
+    CalendarManager,
+    apply_calendar_event,
+    get_calendar_api,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,27 +77,27 @@ async def process_calendar_delta(
     """
 
     calendar_manager = CalendarManager(coach_email, calendar_id)
-    async with calendar_manager._client() as ag:
-        api = await ag.discover("calendar", "v3")
-
-        if sync_token:
-            resp = await ag.as_service_account(
-                api.events.list(
-                    calendarId=calendar_id,
-                    syncToken=sync_token,
-                    showDeleted=True,
-                )
+    ag = calendar_manager._client()
+    api = await get_calendar_api()
+
+    if sync_token:
+        resp = await ag.as_service_account(
+            api.events.list(
+                calendarId=calendar_id,
+                syncToken=sync_token,
+                showDeleted=True,
             )
-        else:
-            # Prima sync completa (occhio se il calendario è grande)
-            resp = await ag.as_service_account(
-                api.events.list(
-                    calendarId=calendar_id,
-                    showDeleted=True,
-                    singleEvents=True,
-                    maxResults=2500,
-                )
+        )
+    else:
+        # Prima sync completa (occhio se il calendario è grande)
+        resp = await ag.as_service_account(
+            api.events.list(
+                calendarId=calendar_id,
+                showDeleted=True,
+                singleEvents=True,
+                maxResults=2500,
             )
+        )
 
     items = resp.get("items", [])
     logger.info(f"Calendar {calendar_id}: received {len(items)} delta events")
@@ -128,16 +132,15 @@ async def setup_watch_for_calendar(
     address = settings.CALENDAR_SYNC_WEBHOOK_URL
 
     calendar_manager = CalendarManager(coach_email, calendar_id)
-    async with calendar_manager._client() as ag:
-        api = await ag.discover("calendar", "v3")
+    api = await get_calendar_api()
 
-        body = {
-            "id": channel_id,
-            "type": "web_hook",
-            "address": address,
-        }
+    body = {
+        "id": channel_id,
+        "type": "web_hook",
+        "address": address,
+    }
 
-        resp = await ag.as_service_account(api.events.watch(calendarId=calendar_id, json=body))
+    resp = await calendar_manager._client().as_service_account(api.events.watch(calendarId=calendar_id, json=body))
 
     resource_id = resp["resourceId"]
     expiration = int(resp["expiration"])
@@ -163,13 +166,13 @@ async def setup_watch_for_calendar(
     return channel_id, resource_id
 
 
-async def renew_all_watchers():
-    items = await list_all_sync_items()
+async def renew_all_watchers(db: DynamoDBServiceResource):
+    items = await list_all_sync_items(db)
     now_ms = int(time.time() * 1000)
 
     for item in items:
         if item["expiration"] - now_ms < 24 * 3600 * 1000:
-            await setup_watch_for_calendar(item["email"], item["calendar_id"])
+            await setup_watch_for_calendar(db, item["email"], item["calendar_id"], item.get("coach_id") or None)
 
 
 # async def update_booked_calls(db: DynamoDBServiceResource) -> None:
@@ -214,6 +217,9 @@ async def handle_event_delta(
     Aggiorna DynamoDB in base al singolo evento cambiato.
     Qui devi mappare la tua logica FREE/BUSY, booking, ecc.
     """
+    # indice locale degli slot liberi (eventi FREE creati, spostati, cancellati o diventati BUSY)
+    apply_calendar_event(calendar_id, event)
+
     event_id = event["id"]
     status = event.get("status")  # confirmed | cancelled
     transparency = event.get("transparency", "opaque")  # transparent | opaque
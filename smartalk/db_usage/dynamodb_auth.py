@@ -1,6 +1,8 @@
+import asyncio
 import datetime
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Optional
 
 from boto3.dynamodb.conditions import Attr, Key
@@ -8,7 +10,8 @@ from botocore.exceptions import ClientError
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
 from passlib.context import CryptContext
 
-from smartalk.core.dynamodb import get_table
+from smartalk.core.cache import invalidate_item
+from smartalk.core.dynamodb import get_raw_item, get_table, query_items
 from smartalk.core.settings import settings
 
 logger = logging.getLogger("Auth")
@@ -16,6 +19,9 @@ logger = logging.getLogger("Auth")
 # Contesto per l'hashing delle password. Usiamo bcrypt, lo standard moderno.
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Pool dedicato a bcrypt (100-300 ms di CPU per chiamata, rilascia il GIL): tiene libero l'event loop
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
 
 # -----------------------------
 # UTILITIES PASSWORD
@@ -32,6 +38,18 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """Come hash_password, eseguita nel pool bcrypt (da usare nel codice async)."""
+    return await asyncio.get_running_loop().run_in_executor(password_executor, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Come verify_password, eseguita nel pool bcrypt (da usare nel codice async)."""
+    return await asyncio.get_running_loop().run_in_executor(
+        password_executor, verify_password, plain_password, hashed_password
+    )
+
+
 # -----------------------------
 # UTILITIES EMAIL / DATA
 # -----------------------------
@@ -66,13 +84,13 @@ async def get_user_by_email(email: str, db) -> Optional[Dict[str, Any]]:
     table = await get_table(db, settings.USERS_TABLE)
     norm = normalize_email(email)
 
-    resp = await table.query(
+    items = await query_items(
+        table,
+        page_size=1,
+        max_items=1,
         IndexName="email-index",
         KeyConditionExpression=Key("email").eq(norm),
-        Limit=1,
     )
-
-    items = resp.get("Items", [])
     if not items:
         return None
 
@@ -84,7 +102,25 @@ async def get_user_by_email(email: str, db) -> Optional[Dict[str, Any]]:
 async def get_user_by_id(user_id: str, db: DynamoDBServiceResource) -> Optional[Dict[str, Any]]:
     table = await get_table(db, settings.USERS_TABLE)
     full = await table.get_item(Key={"id": user_id})
-    return full["Item"]
+    return full.get("Item")
+
+
+async def get_cached_user_by_id(user_id: str, db: DynamoDBServiceResource) -> Optional[Dict[str, Any]]:
+    """
+    Come get_user_by_id ma passa dalla cache degli item di USERS (smartalk.core.dynamodb.users_cache):
+    una sola get_item al primo accesso, poi nessuna lettura fino alla scadenza o all'invalidazione.
+    """
+    user = await get_raw_item(db, settings.USERS_TABLE, {"id": user_id})
+    if not user:
+        return None
+
+    # copia: il chiamante può modificare il dict senza sporcare la cache
+    return dict(user)
+
+
+def invalidate_cached_user(user_id: str) -> None:
+    """Da chiamare dopo ogni scrittura sull'utente in USERS fatta fuori da put_item/delete_item/transazioni."""
+    invalidate_item(settings.USERS_TABLE, {"id": user_id})
 
 
 async def update_user(user_id: str, updates: Dict[str, Any], db: DynamoDBServiceResource) -> Dict[str, Any]:
@@ -108,6 +144,7 @@ async def update_user(user_id: str, updates: Dict[str, Any], db: DynamoDBService
         ExpressionAttributeValues=expr_vals,
         ReturnValues="ALL_NEW",
     )
+    invalidate_cached_user(user_id)
     return resp["Attributes"]
 
 
@@ -124,7 +161,7 @@ async def create_user_if_not_exists(
         raise Exception("Fornire una password.")
 
     # Hashing della password prima di salvarla
-    password_hash = hash_password(password)
+    password_hash = await hash_password_async(password)
 
     for attempt in range(10):
         user_id = f"u_{uuid.uuid4().hex[:10]}"
@@ -143,6 +180,7 @@ async def create_user_if_not_exists(
             # Atomicita' su ID: l'ID viene inserito solo se non esiste.
             await table.put_item(Item=item, ConditionExpression=Attr("id").not_exists())
             # Successo
+            invalidate_cached_user(user_id)
             return item
 
         except ClientError as e:
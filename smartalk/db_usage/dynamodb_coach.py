@@ -1,5 +1,6 @@
 # smartalk/db_usage/dynamodb_coach.py
 
+import asyncio
 import logging
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
@@ -12,20 +13,52 @@ from botocore.exceptions import ClientError
 from dateutil.relativedelta import relativedelta
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
 
+from smartalk.core.cache import TTLCache, add_invalidation_hook
 from smartalk.core.dynamodb import (
+    batch_get_items,
     delete_item,
     get_item,
     get_table,
     get_today_string,
     make_atomic_transaction,
+    paginate,
+    products_cache,
     put_item,
+    query_items,
     to_dynamodb_item,
     to_low_level_item,
 )
+from smartalk.core.id_allocator import IdAllocator
 from smartalk.core.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# ID dei contratti (CON001, CON002, ...) dal contatore atomico in COUNTERS_TABLE
+contract_id_allocator = IdAllocator(
+    "contract_id",
+    prefix="CON",
+    width=3,
+    block_size=settings.CONTRACT_ID_BLOCK_SIZE,
+    seed=lambda db: get_max_contract_number(db),
+)
+
+
+async def get_max_contract_number(db: DynamoDBServiceResource) -> int:
+    """
+    Numero più alto tra i CONxxx esistenti: punto di partenza del contatore degli ID contratto.
+    Scan completa di CONTRACTS, eseguita una sola volta (contatore non ancora creato).
+    """
+    table = await get_table(db, settings.CONTRACTS_TABLE)
+    numbers = [0]
+    async for page in paginate(table, "scan", ProjectionExpression="contract_id"):
+        numbers.extend(contract_id_allocator.parse(item["contract_id"]) or 0 for item in page)
+    return max(numbers)
+
+
+# Nomi visualizzati di studenti e clienti (chiave: id utente), invalidati dalle scritture su USERS
+names_cache = TTLCache(ttl_seconds=settings.NAMES_CACHE_TTL_SECONDS, max_size=settings.NAMES_CACHE_MAX_SIZE)
+add_invalidation_hook(settings.USERS_TABLE, lambda user: names_cache.invalidate(user.get("id")))
+
 # --- UTILITY ---
 
 
@@ -47,32 +80,107 @@ async def get_active_students(db: DynamoDBServiceResource) -> List[str]:
     try:
         # HASH: user_type (index: user-type-index)
         table = await get_table(db, settings.USERS_TABLE)
-        response = await table.query(
+        items = await query_items(
+            table,
             IndexName="user-type-index",
             KeyConditionExpression=Key("user_type").eq("student"),
             FilterExpression=Attr("status").eq("active"),
             ProjectionExpression="#id",
             ExpressionAttributeNames={"#id": "id"},
         )
-        return [item.get("id") for item in response.get("Items", [])]
+        return [item.get("id") for item in items]
     except ClientError as e:
         logger.error(f"DynamoDB Error in get_active_students (USERS table): {e}")
         return []
 
 
+# Funzioni per Tabella PRODUCTS
+async def get_products(product_ids: List[str], db: DynamoDBServiceResource) -> Dict[str, Dict[str, Any]]:
+    """
+    Restituisce {product_id: product} per gli id richiesti: prima products_cache,
+    poi un'unica BatchGetItem (a blocchi da 100, id de-duplicati) per i mancanti.
+    I prodotti inesistenti non compaiono nel risultato.
+    """
+    products = {}
+    missing = []
+    for product_id in dict.fromkeys(product_ids):
+        if product_id is None:
+            continue
+        product = products_cache.peek((product_id,))
+        if product is None:
+            missing.append(product_id)
+        else:
+            products[product_id] = product
+
+    if missing:
+        items = await batch_get_items(db, settings.PRODUCTS_TABLE, [{"product_id": pid} for pid in missing])
+        for product in items:
+            products_cache.set((product["product_id"],), product)
+            products[product["product_id"]] = product
+
+    return products
+
+
+def get_display_name(user: Dict[str, Any]) -> Optional[str]:
+    if user.get("user_type") == "student":
+        return f"{user.get('name', '')} {user.get('surname', '')}"
+    if user.get("user_type") == "company":
+        return user.get("name", "")
+
+
+# Valori negativi in names_cache (None non viene salvato): utente senza nome visualizzato (es. coach)
+# o inesistente, così le richieste successive non tornano su DynamoDB
+_NO_DISPLAY_NAME = object()
+_NOT_FOUND = object()
+
+
+async def resolve_names(ids: List[str], db: DynamoDBServiceResource) -> Dict[str, Optional[str]]:
+    """
+    Restituisce {id: nome visualizzato} per studenti e clienti (USERS Table):
+    prima names_cache, poi BatchGetItem (a blocchi da 100) dei soli name, surname e user_type.
+    Gli id inesistenti non compaiono nel risultato.
+    """
+    names = {}
+    missing = []
+    for user_id in dict.fromkeys(ids):
+        if user_id is None:
+            continue
+        cached = names_cache.get(user_id)
+        if cached is None:
+            missing.append(user_id)
+        elif cached is _NO_DISPLAY_NAME:
+            names[user_id] = None
+        elif cached is not _NOT_FOUND:
+            names[user_id] = cached
+
+    if missing:
+        users = await batch_get_items(
+            db,
+            settings.USERS_TABLE,
+            [{"id": user_id} for user_id in missing],
+            projection=["id", "name", "surname", "user_type"],
+        )
+        for user in users:
+            names[user["id"]] = get_display_name(user)
+            names_cache.set(user["id"], _NO_DISPLAY_NAME if names[user["id"]] is None else names[user["id"]])
+        for user_id in missing:
+            if user_id not in names:
+                names_cache.set(user_id, _NOT_FOUND)
+
+    return names
+
+
 async def get_client_name(client_id: str, db: DynamoDBServiceResource) -> str:
-    client = await get_item(db, settings.USERS_TABLE, {"id": client_id})
-    if client["user_type"] == "student":
-        return f"{client['name']} {client['surname']}"
-    if client["user_type"] == "company":
-        return client["name"]
+    names = await resolve_names([client_id], db)
+    return names[client_id]
 
 
 async def get_student_contracts_for_individual(
     student_id: str, coach_role: str, db: DynamoDBServiceResource
 ) -> List[Dict[str, Any]]:
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    items = await query_items(
+        contracts_table,
         IndexName="student-id-status-index",
         KeyConditionExpression=Key("student_id").eq(student_id) & Key("status").eq("active"),
         FilterExpression=Attr("unlimited").eq(True)
@@ -81,19 +189,19 @@ async def get_student_contracts_for_individual(
         ScanIndexForward=False,
         ProjectionExpression=", ".join(["product_id", "client_id", "contract_id"]),
     )
-    products_table = await get_table(db, settings.PRODUCTS_TABLE)
+    products = await get_products([item.get("product_id") for item in items], db)
+
+    client_names = await resolve_names([item["client_id"] for item in items], db)
 
     contracts = []
-    for item in contracts_response.get("Items", []):
-        product_response = await products_table.get_item(Key={"product_id": item.get("product_id")})
-        product = product_response["Item"]
+    for item in items:
+        product = products[item.get("product_id")]
         if product["participants"] == 1:
-            client_name = await get_client_name(item["client_id"], db)
             contracts.append(
                 {
-                    "productName": product_response["Item"]["product_name"],
-                    "duration": product_response["Item"]["duration"],
-                    "clientName": client_name,
+                    "productName": product["product_name"],
+                    "duration": product["duration"],
+                    "clientName": client_names[item["client_id"]],
                     "contract_id": item["contract_id"],
                     "coach_rate": product[f"{coach_role.split(' ')[0].lower()}_coach_rate"],
                 }
@@ -108,7 +216,8 @@ async def get_student_contracts_for_individual(
 
 async def get_student_contracts_for_group(db: DynamoDBServiceResource) -> List[Dict[str, Any]]:
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    items = await query_items(
+        contracts_table,
         IndexName="status-index",
         KeyConditionExpression=Key("status").eq("Active"),
         FilterExpression=Attr("unlimited").eq(True)
@@ -117,19 +226,19 @@ async def get_student_contracts_for_group(db: DynamoDBServiceResource) -> List[D
         ScanIndexForward=False,
         ProjectionExpression=", ".join(["product_id", "contract_id", "student_id", "client_id"]),
     )
-    products_table = await get_table(db, settings.PRODUCTS_TABLE)
+    products = await get_products([item.get("product_id") for item in items], db)
+
+    client_names = await resolve_names([item["client_id"] for item in items], db)
 
     contracts = []
-    for item in contracts_response.get("Items", []):
-        product_response = await products_table.get_item(Key={"product_id": item.get("product_id")})
-        product = product_response["Item"]
+    for item in items:
+        product = products[item.get("product_id")]
         if product["participants"] > 1:
-            client_name = await get_client_name(item["client_id"], db)
             contracts.append(
                 {
-                    "productName": product_response["Item"]["product_name"],
+                    "productName": product["product_name"],
                     "product_id": item["product_id"],
-                    "clientName": client_name,
+                    "clientName": client_names[item["client_id"]],
                     "client_id": item["client_id"],
                     "student_id": item["student_id"],
                     "contract_id": item["contract_id"],
@@ -155,7 +264,8 @@ async def get_students_and_contracts_by_client_and_product(
     client_id: str, product_id: str, db: DynamoDBServiceResource
 ) -> List[Dict[str, Any]]:
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    items = await query_items(
+        contracts_table,
         IndexName="client-id-product-id-index",
         KeyConditionExpression=Key("client_id").eq(client_id) & Key("product_id").eq(product_id),
         FilterExpression=Attr("status").eq("active")
@@ -167,17 +277,15 @@ async def get_students_and_contracts_by_client_and_product(
         ScanIndexForward=False,
         ProjectionExpression=", ".join(["student_id", "contract_id"]),
     )
-    students_table = await get_table(db, settings.USERS_TABLE)
+    student_names = await resolve_names([item.get("student_id") for item in items], db)
 
     students = []
-    for item in contracts_response.get("Items", []):
-        student_response = await students_table.get_item(Key={"id": item.get("student_id")})
-        student = student_response["Item"]
+    for item in items:
         students.append(
             {
-                "student_id": student["id"],
+                "student_id": item["student_id"],
                 "contract_id": item["contract_id"],
-                "student_fullname": f"{student['name']} {student['surname']}",
+                "student_fullname": student_names[item["student_id"]],
             }
         )
 
@@ -185,8 +293,9 @@ async def get_students_and_contracts_by_client_and_product(
 
 
 async def get_participants(product_id: str, db: DynamoDBServiceResource) -> int:
-    product = await get_item(db, settings.PRODUCTS_TABLE, {"product_id": product_id})
-    return product["participants"]
+    products = await get_products([product_id], db)
+    # gli item in products_cache sono quelli grezzi di DynamoDB (Decimal)
+    return int(products[product_id]["participants"])
 
 
 def create_student_response(student_info: dict) -> dict:
@@ -244,6 +353,271 @@ def calculate_max_end_date(total_calls: int, calls_per_week: int, start_date: st
     return (datetime.fromisoformat(start_date).date() + timedelta(days=delta_days)).isoformat()
 
 
+async def prepare_call_transaction(individual_call: dict, db: DynamoDBServiceResource) -> Dict[str, List[Dict]]:
+    """
+    Fase di lettura di log_call_to_db per un singolo studente: legge debrief, report card
+    ed eventuale report card generator e costruisce gli item della sua TransactWriteItems.
+    """
+    call = individual_call["call"]
+    contract = individual_call["contract"]
+
+    unlimited = contract.get("unlimited", False)
+    max_end_date = contract.get("max_end_date")
+    start_date = contract.get("start_date")
+    call_units = call["units"]
+    call_date = call["date"]
+    calls_per_week = call["calls_per_week"]
+    total_calls = call["total_calls"]
+    report_card_generator_id = contract.get("report_card_generator_id")
+
+    checks: List[Dict] = []
+    puts: List[Dict] = []
+    updates: List[Dict] = []
+    deletes: List[Dict] = []
+
+    # 1) CONTRACT: Check if contract has been initialized and its real status
+
+    # status
+    checks.append(
+        {
+            "TableName": settings.CONTRACTS_TABLE,
+            "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+            "ConditionExpression": "#st = :active",
+            "ExpressionAttributeNames": {
+                "#st": "status",
+            },
+            "ExpressionAttributeValues": {
+                ":active": {"S": "Active"},
+            },
+        }
+    )
+    if not unlimited:
+        if start_date is None:
+            # set start_date and max_end_date
+            updates.append(
+                {
+                    "TableName": settings.CONTRACTS_TABLE,
+                    "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+                    "ConditionExpression": "attribute_exists(contract_id) AND attribute_not_exists(start_date)",
+                    "UpdateExpression": "SET start_date = :call_date, max_end_date = :max_end",
+                    "ExpressionAttributeValues": {
+                        ":call_date": {"S": call_date},
+                        ":max_end": {"S": calculate_max_end_date(total_calls, calls_per_week, call_date)},
+                    },
+                }
+            )
+        if max_end_date is not None:
+            # call_date <= max_end_date
+            checks.append(
+                {
+                    "TableName": settings.CONTRACTS_TABLE,
+                    "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+                    "ConditionExpression": ":call_date <= #max_end",
+                    "ExpressionAttributeNames": {
+                        "#max_end": "max_end_date",
+                    },
+                    "ExpressionAttributeValues": {
+                        ":call_date": {"S": call["date"]},
+                    },
+                }
+            )
+
+        # call_units <= left_calls
+        checks.append(
+            {
+                "TableName": settings.CONTRACTS_TABLE,
+                "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+                "ConditionExpression": ":units <= #left",
+                "ExpressionAttributeNames": {
+                    "#left": "left_calls",
+                },
+                "ExpressionAttributeValues": {
+                    ":units": {"N": str(call_units)},
+                },
+            }
+        )
+
+    # 2) TRACKER: Put con 'attribute_not_exists(session_id)'
+
+    debrief_id = f"{call['student_id']}#{call['coach_id']}"
+    debriefs_table = await get_table(db, settings.DEBRIEFS_TABLE)
+    debriefs = await query_items(
+        debriefs_table,
+        max_items=1,
+        KeyConditionExpression=Key("debrief_id").eq(debrief_id) & Key("date").eq(call_date),
+        ProjectionExpression="#date",
+        ExpressionAttributeNames={
+            "#date": "date",
+        },
+    )
+
+    extra_dict_for_call = {}
+    if debriefs:
+        extra_dict_for_call["has_debrief"] = True
+    else:
+        # debrief does not exists
+        checks.append(
+            {
+                "TableName": settings.DEBRIEFS_TABLE,
+                "Key": to_low_level_item({"debrief_id": debrief_id, "date": call_date}),
+                "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
+                "ExpressionAttributeNames": {
+                    "#pk_attr": "debrief_id",
+                    "#sk_attr": "date",
+                },
+            }
+        )
+
+    puts.append(
+        {
+            "TableName": settings.CALLS_TABLE,
+            "Item": to_low_level_item({**call, **extra_dict_for_call}),
+            "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
+            "ExpressionAttributeNames": {
+                "#pk_attr": "contract_id",
+                "#sk_attr": "session_id",
+            },
+        }
+    )
+
+    # 3) CONTRACT: se NON unlimited, aggiorna conteggi
+    if not unlimited:
+        # Unico Update per conteggi
+        updates.append(
+            {
+                "TableName": settings.CONTRACTS_TABLE,
+                "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+                "ConditionExpression": "attribute_exists(contract_id) AND attribute_exists(left_calls) AND attribute_exists(used_calls)",
+                "UpdateExpression": "SET left_calls = left_calls - :units, used_calls = used_calls + :units",
+                "ExpressionAttributeValues": {
+                    ":units": {"N": str(call_units)},
+                },
+            }
+        )
+
+        # Secondo Update condizionale **sullo stato pre-transazione**:
+        # Se left_calls == call_units → setta status = 'Inactive'
+        updates.append(
+            {
+                "TableName": settings.CONTRACTS_TABLE,
+                "Key": to_low_level_item({"contract_id": call["contract_id"]}),
+                "UpdateExpression": "SET #st = :inactive",
+                "ConditionExpression": "attribute_exists(contract_id) AND attribute_exists(left_calls) AND left_calls = :units",
+                "ExpressionAttributeNames": {"#st": "status"},
+                "ExpressionAttributeValues": {
+                    ":units": {"N": str(call_units)},
+                    ":inactive": {"S": "Inactive"},
+                },
+            }
+        )
+
+    # 4) REPORT CARD
+
+    if report_card_generator_id is not None:
+        report_card_id = f"{call['coach_id']}#{report_card_generator_id}"
+        report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
+
+        report_cards = await query_items(
+            report_cards_table,
+            max_items=1,
+            KeyConditionExpression=Key("report_card_id").eq(report_card_id) & Key("start_month").lte(call_date),
+            FilterExpression=Attr("end_month").gt(call_date),
+            ProjectionExpression="#report_card_id, #start_month, #status",
+            ExpressionAttributeNames={
+                "#report_card_id": "report_card_id",
+                "#start_month": "start_month",
+                "#status": "status",
+            },
+        )
+        report_card = report_cards[0] if report_cards else {}
+
+        # 4a) CREAZIONE se non esiste e rimozione di eventuale no show
+        if not report_card:
+            report_card_generators_table = await get_table(db, settings.REPORT_CARD_GENERATORS_TABLE)
+            report_card_generator_response = await report_card_generators_table.get_item(
+                Key={"report_card_generator_id": report_card_generator_id}
+            )
+            report_card_generator = report_card_generator_response.get("Item")
+            assert (
+                report_card_generator["current_start_month"] <= call_date
+                and call_date < report_card_generator["next_start_month"]
+                or report_card_generator["next_start_month"] <= call_date
+            ), "Report card generator non aggiornato"
+
+            # new report card
+            report_card["report_card_id"] = report_card_id
+            if (
+                report_card_generator["current_start_month"] <= call_date
+                and call_date < report_card_generator["next_start_month"]
+            ):
+                report_card["start_month"] = report_card_generator["current_start_month"]
+                report_card["end_month"] = report_card_generator["next_start_month"]
+            if report_card_generator["next_start_month"] <= call_date:
+                report_card["start_month"] = report_card_generator["next_start_month"]
+                report_card["end_month"] = (
+                    datetime.fromisoformat(report_card_generator["next_start_month"] + "-01").date()
+                    + relativedelta(months=contract["report_card_cadency"])
+                ).strftime("%Y-%m")
+            report_card["coach_id"] = call["coach_id"]
+            report_card["student_id"] = call["student_id"]
+            report_card["status"] = "draft"
+            report_card["report_card_generator_id"] = report_card_generator_id
+            report_card["report_card_email_recipients"] = contract["report_card_email_recipients"]
+            report_card["report_card_cadency"] = contract["report_card_cadency"]
+            report_card["client_id"] = contract["client_id"]
+
+            puts.append(
+                {
+                    "TableName": settings.REPORT_CARDS_TABLE,
+                    "Item": to_low_level_item(report_card),
+                    "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
+                    "ExpressionAttributeNames": {
+                        "#pk_attr": "report_card_id",
+                        "#sk_attr": "start_month",
+                    },
+                }
+            )
+            # delete no show rc di head coach JJ, se esiste
+            deletes.append(
+                {
+                    "TableName": settings.REPORT_CARDS_TABLE,
+                    "Key": to_low_level_item(
+                        {
+                            "report_card_id": "#".join(["JJ"] + report_card["report_card_id"].split("#")[1:]),
+                            "start_month": report_card["start_month"],
+                        }
+                    ),
+                    "ConditionExpression": "attribute_not_exists(report_card_id) OR #status = :no_show",
+                    "ExpressionAttributeNames": {
+                        "#status": "status",
+                    },
+                    "ExpressionAttributeValues": {
+                        ":no_show": {"S": "no_show"},
+                    },
+                }
+            )
+        else:
+            # 4b) PROMOZIONE NO_SHOW -> DRAFT (se esiste)
+            if report_card["status"] == "no_show":
+                updates.append(
+                    {
+                        "TableName": settings.REPORT_CARDS_TABLE,
+                        "Key": to_low_level_item(
+                            {
+                                "report_card_id": report_card["report_card_id"],
+                                "start_month": report_card["start_month"],
+                            }
+                        ),
+                        "UpdateExpression": "SET #status = :draft",
+                        "ConditionExpression": "attribute_exists(report_card_id) AND attribute_exists(start_month) AND #status = :no_show",
+                        "ExpressionAttributeNames": {"#status": "status"},
+                        "ExpressionAttributeValues": to_low_level_item({":no_show": "no_show", ":draft": "draft"}),
+                    }
+                )
+
+    return {"checks": checks, "puts": puts, "updates": updates, "deletes": deletes}
+
+
 async def log_call_to_db(
     group_call: dict,
     db: DynamoDBServiceResource,
@@ -254,6 +628,10 @@ async def log_call_to_db(
         - contract (left_calls, used_calls, status)
         - report card (crea se non esiste una nuova draft per coach e elimina se esiste la no show oppure aggiorna status della no show a draft)
 
+    Per le call di gruppo letture e transazioni dei singoli studenti sono eseguite in parallelo
+    (max LOG_CALL_MAX_CONCURRENCY alla volta). Le transazioni sono indipendenti: in caso di errore
+    parziale la risposta riporta in "failed" e "logged" i contratti non registrati e quelli registrati.
+
     """
     try:
         for individual_call in group_call:
@@ -263,14 +641,10 @@ async def log_call_to_db(
             # data for checking
             unlimited = contract.get("unlimited", False)
             max_end_date = contract.get("max_end_date")
-            start_date = contract.get("start_date")
             status = contract.get("status")
             left_calls = contract.get("left_calls")
             call_units = call["units"]
             call_date = call["date"]
-            calls_per_week = call["calls_per_week"]
-            total_calls = call["total_calls"]
-            report_card_generator_id = contract.get("report_card_generator_id")
 
             # 0) A priori check
             if status != "Active":
@@ -281,255 +655,46 @@ async def log_call_to_db(
                 if call_units > left_calls:
                     return {"error": f"contract {contract['contract_id']} has less left calls"}
 
-        for individual_call in group_call:
-            call = individual_call["call"]
-            contract = individual_call["contract"]
-            checks: List[Dict] = []
-            puts: List[Dict] = []
-            updates: List[Dict] = []
-            deletes: List[Dict] = []
+        # Fase di lettura: tutti gli studenti in parallelo (con limite di concorrenza)
+        semaphore = asyncio.Semaphore(settings.LOG_CALL_MAX_CONCURRENCY)
 
-            # 1) CONTRACT: Check if contract has been initialized and its real status
+        async def prepare(individual_call: dict) -> Dict[str, List[Dict]]:
+            async with semaphore:
+                return await prepare_call_transaction(individual_call, db)
 
-            # status
-            checks.append(
-                {
-                    "TableName": settings.CONTRACTS_TABLE,
-                    "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                    "ConditionExpression": "#st = :active",
-                    "ExpressionAttributeNames": {
-                        "#st": "status",
-                    },
-                    "ExpressionAttributeValues": {
-                        ":active": {"S": "Active"},
-                    },
-                }
-            )
-            if not unlimited:
-                if start_date is None:
-                    # set start_date and max_end_date
-                    updates.append(
-                        {
-                            "TableName": settings.CONTRACTS_TABLE,
-                            "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                            "ConditionExpression": "attribute_exists(contract_id) AND attribute_not_exists(start_date)",
-                            "UpdateExpression": "SET start_date = :call_date, max_end_date = :max_end",
-                            "ExpressionAttributeValues": {
-                                ":call_date": {"S": call_date},
-                                ":max_end": {"S": calculate_max_end_date(total_calls, calls_per_week, call_date)},
-                            },
-                        }
-                    )
-                if max_end_date is not None:
-                    # call_date <= max_end_date
-                    checks.append(
-                        {
-                            "TableName": settings.CONTRACTS_TABLE,
-                            "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                            "ConditionExpression": ":call_date <= #max_end",
-                            "ExpressionAttributeNames": {
-                                "#max_end": "max_end_date",
-                            },
-                            "ExpressionAttributeValues": {
-                                ":call_date": {"S": call["date"]},
-                            },
-                        }
-                    )
-
-                # call_units <= left_calls
-                checks.append(
-                    {
-                        "TableName": settings.CONTRACTS_TABLE,
-                        "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                        "ConditionExpression": ":units <= #left",
-                        "ExpressionAttributeNames": {
-                            "#left": "left_calls",
-                        },
-                        "ExpressionAttributeValues": {
-                            ":units": {"N": str(call_units)},
-                        },
-                    }
-                )
-
-            # 2) TRACKER: Put con 'attribute_not_exists(session_id)'
-
-            debrief_id = f"{call['student_id']}#{call['coach_id']}"
-            debriefs_table = await get_table(db, settings.DEBRIEFS_TABLE)
-            debriefs_response = await debriefs_table.query(
-                KeyConditionExpression=Key("debrief_id").eq(debrief_id) & Key("date").eq(call_date),
-                ProjectionExpression="#date",
-                ExpressionAttributeNames={
-                    "#date": "date",
-                },
-            )
-            debriefs = debriefs_response.get("Items", [])
+        transactions = await asyncio.gather(*[prepare(individual_call) for individual_call in group_call])
 
-            extra_dict_for_call = {}
-            if debriefs:
-                extra_dict_for_call["has_debrief"] = True
-            else:
-                # debrief does not exists
-                checks.append(
-                    {
-                        "TableName": settings.DEBRIEFS_TABLE,
-                        "Key": to_low_level_item({"debrief_id": debrief_id, "date": call_date}),
-                        "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
-                        "ExpressionAttributeNames": {
-                            "#pk_attr": "debrief_id",
-                            "#sk_attr": "date",
-                        },
-                    }
-                )
+        # Fase di scrittura: una transazione indipendente per studente, in parallelo
+        async def write(transaction: Dict[str, List[Dict]]) -> None:
+            async with semaphore:
+                await make_atomic_transaction(db, **transaction)
 
-            puts.append(
-                {
-                    "TableName": settings.CALLS_TABLE,
-                    "Item": to_low_level_item({**call, **extra_dict_for_call}),
-                    "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
-                    "ExpressionAttributeNames": {
-                        "#pk_attr": "contract_id",
-                        "#sk_attr": "session_id",
-                    },
-                }
-            )
-
-            # 3) CONTRACT: se NON unlimited, aggiorna conteggi
-            if not unlimited:
-                # Unico Update per conteggi
-                updates.append(
-                    {
-                        "TableName": settings.CONTRACTS_TABLE,
-                        "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                        "ConditionExpression": "attribute_exists(contract_id) AND attribute_exists(left_calls) AND attribute_exists(used_calls)",
-                        "UpdateExpression": "SET left_calls = left_calls - :units, used_calls = used_calls + :units",
-                        "ExpressionAttributeValues": {
-                            ":units": {"N": str(call_units)},
-                        },
-                    }
-                )
-
-                # Secondo Update condizionale **sullo stato pre-transazione**:
-                # Se left_calls == call_units → setta status = 'Inactive'
-                updates.append(
-                    {
-                        "TableName": settings.CONTRACTS_TABLE,
-                        "Key": to_low_level_item({"contract_id": call["contract_id"]}),
-                        "UpdateExpression": "SET #st = :inactive",
-                        "ConditionExpression": "attribute_exists(contract_id) AND attribute_exists(left_calls) AND left_calls = :units",
-                        "ExpressionAttributeNames": {"#st": "status"},
-                        "ExpressionAttributeValues": {
-                            ":units": {"N": str(call_units)},
-                            ":inactive": {"S": "Inactive"},
-                        },
-                    }
-                )
-
-            # 4) REPORT CARD
-
-            if report_card_generator_id is not None:
-                report_card_id = f"{call['coach_id']}#{report_card_generator_id}"
-                report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
-
-                report_cards_response = await report_cards_table.query(
-                    KeyConditionExpression=Key("report_card_id").eq(report_card_id) & Key("start_month").lte(call_date),
-                    FilterExpression=Attr("end_month").gt(call_date),
-                    ProjectionExpression="#report_card_id, #start_month, #status",
-                    ExpressionAttributeNames={
-                        "#report_card_id": "report_card_id",
-                        "#start_month": "start_month",
-                        "#status": "status",
-                    },
-                )
-                report_cards = report_cards_response.get("Items", [])
-                report_card = report_cards[0] if report_cards else {}
-
-                # 4a) CREAZIONE se non esiste e rimozione di eventuale no show
-                if not report_card:
-                    report_card_generators_table = await get_table(db, settings.REPORT_CARD_GENERATORS_TABLE)
-                    report_card_generator_response = await report_card_generators_table.get_item(
-                        Key={"report_card_generator_id": report_card_generator_id}
-                    )
-                    report_card_generator = report_card_generator_response.get("Item")
-                    assert (
-                        report_card_generator["current_start_month"] <= call_date
-                        and call_date < report_card_generator["next_start_month"]
-                        or report_card_generator["next_start_month"] <= call_date
-                    ), "Report card generator non aggiornato"
-
-                    # new report card
-                    report_card["report_card_id"] = report_card_id
-                    if (
-                        report_card_generator["current_start_month"] <= call_date
-                        and call_date < report_card_generator["next_start_month"]
-                    ):
-                        report_card["start_month"] = report_card_generator["current_start_month"]
-                        report_card["end_month"] = report_card_generator["next_start_month"]
-                    if report_card_generator["next_start_month"] <= call_date:
-                        report_card["start_month"] = report_card_generator["next_start_month"]
-                        report_card["end_month"] = (
-                            datetime.fromisoformat(report_card_generator["next_start_month"] + "-01").date()
-                            + relativedelta(months=contract["report_card_cadency"])
-                        ).strftime("%Y-%m")
-                    report_card["coach_id"] = call["coach_id"]
-                    report_card["student_id"] = call["student_id"]
-                    report_card["status"] = "draft"
-                    report_card["report_card_generator_id"] = report_card_generator_id
-                    report_card["report_card_email_recipients"] = contract["report_card_email_recipients"]
-                    report_card["report_card_cadency"] = contract["report_card_cadency"]
-                    report_card["client_id"] = contract["client_id"]
-
-                    puts.append(
-                        {
-                            "TableName": settings.REPORT_CARDS_TABLE,
-                            "Item": to_low_level_item(report_card),
-                            "ConditionExpression": "attribute_not_exists(#pk_attr) AND attribute_not_exists(#sk_attr)",
-                            "ExpressionAttributeNames": {
-                                "#pk_attr": "report_card_id",
-                                "#sk_attr": "start_month",
-                            },
-                        }
-                    )
-                    # delete no show rc di head coach JJ, se esiste
-                    deletes.append(
-                        {
-                            "TableName": settings.REPORT_CARDS_TABLE,
-                            "Key": to_low_level_item(
-                                {
-                                    "report_card_id": "#".join(["JJ"] + report_card["report_card_id"].split("#")[1:]),
-                                    "start_month": report_card["start_month"],
-                                }
-                            ),
-                            "ConditionExpression": "attribute_not_exists(report_card_id) OR #status = :no_show",
-                            "ExpressionAttributeNames": {
-                                "#status": "status",
-                            },
-                            "ExpressionAttributeValues": {
-                                ":no_show": {"S": "no_show"},
-                            },
-                        }
-                    )
-                else:
-                    # 4b) PROMOZIONE NO_SHOW -> DRAFT (se esiste)
-                    if report_card["status"] == "no_show":
-                        updates.append(
-                            {
-                                "TableName": settings.REPORT_CARDS_TABLE,
-                                "Key": to_low_level_item(
-                                    {
-                                        "report_card_id": report_card["report_card_id"],
-                                        "start_month": report_card["start_month"],
-                                    }
-                                ),
-                                "UpdateExpression": "SET #status = :draft",
-                                "ConditionExpression": "attribute_exists(report_card_id) AND attribute_exists(start_month) AND #status = :no_show",
-                                "ExpressionAttributeNames": {"#status": "status"},
-                                "ExpressionAttributeValues": to_low_level_item(
-                                    {":no_show": "no_show", ":draft": "draft"}
-                                ),
-                            }
-                        )
+        results = await asyncio.gather(
+            *[write(transaction) for transaction in transactions],
+            return_exceptions=True,
+        )
 
-            await make_atomic_transaction(db, checks=checks, puts=puts, updates=updates, deletes=deletes)
+        failed = []
+        for individual_call, result in zip(group_call, results):
+            if isinstance(result, ClientError):
+                failed.append({"contract_id": individual_call["call"]["contract_id"], "error": str(result)})
+            elif isinstance(result, BaseException):
+                raise result
+
+        if failed:
+            logged = [
+                individual_call["call"]["contract_id"]
+                for individual_call, result in zip(group_call, results)
+                if result is None
+            ]
+            logger.error(f"DynamoDB Error in log_call_to_db (TRACKER | CONTRACTS | REPORT_CARDS table): {failed}")
+            return {
+                "success": False,
+                "error": f"{len(failed)}/{len(group_call)} chiamate non registrate: "
+                + "; ".join(f"{f['contract_id']}: {f['error']}" for f in failed),
+                "failed": failed,
+                "logged": logged,
+            }
 
         return {"success": True, "message": "Chiamata registrata correttamente."}
     except ClientError as e:
@@ -542,28 +707,61 @@ async def get_min_report_card_start_month_by_report_card_generator_id(
 ) -> Dict[str, Any]:
     # check on active contracts
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    contracts = await query_items(
+        contracts_table,
         IndexName="report_card_generator_id-status-index",
         KeyConditionExpression=Key("report_card_generator_id").eq(report_card_generator_id)
         & Key("status").eq("Active"),
         ProjectionExpression="report_card_start_month",
     )
-    start_months = [contract["report_card_start_month"] for contract in contracts_response.get("Items", [])]
+    start_months = [contract["report_card_start_month"] for contract in contracts]
 
     # check on draft report cards
     report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
-    report_cards_response = await report_cards_table.query(
+    report_cards = await query_items(
+        report_cards_table,
         IndexName="report-card-generator-id-status-index",
         KeyConditionExpression=Key("report_card_generator_id").eq(report_card_generator_id) & Key("status").eq("draft"),
         # filtro per sicurezza, in realtà non dovrebbe mai servire
         FilterExpression=Attr("start_month").gt(get_today_string),
         ProjectionExpression="start_month",
     )
-    start_months += [report_card["start_month"] for report_card in report_cards_response.get("Items", [])]
+    start_months += [report_card["start_month"] for report_card in report_cards]
 
     return min(start_months) if start_months else None
 
 
+def _report_card_status_update(
+    report_card: dict,
+    report_card_generator_id: str,
+    old_status: str = "completed",
+    status: str = "sent",
+) -> Dict[str, Any]:
+    """
+    Update (TransactWriteItems) del report card da old_status a status, solo se appartiene
+    ancora a report_card_generator_id. "status" è una parola riservata: va usato tramite #status.
+    """
+    return {
+        "TableName": settings.REPORT_CARDS_TABLE,
+        "Key": to_low_level_item(
+            {
+                "report_card_id": report_card["report_card_id"],
+                "start_month": report_card["start_month"],
+            }
+        ),
+        "ConditionExpression": "attribute_exists(report_card_id) AND attribute_exists(start_month) AND #status = :old_status AND report_card_generator_id = :report_card_generator_id",
+        "UpdateExpression": "SET #status = :status",
+        "ExpressionAttributeNames": {"#status": "status"},
+        "ExpressionAttributeValues": to_low_level_item(
+            {
+                ":old_status": old_status,
+                ":status": status,
+                ":report_card_generator_id": report_card_generator_id,
+            }
+        ),
+    }
+
+
 async def update_report_card_and_generator(
     completed_report_cards: List[dict],
     report_card_generator_id: str,
@@ -587,24 +785,7 @@ async def update_report_card_and_generator(
 
         # update report card status a sent
         for completed_report_card in completed_report_cards:
-            updates.append(
-                {
-                    "TableName": settings.REPORT_CARDS_TABLE,
-                    "Key": to_low_level_item(
-                        {
-                            "report_card_id": completed_report_card["report_card_id"],
-                            "start_month": completed_report_card["start_month"],
-                        }
-                    ),
-                    "ConditionExpression": "attribute_exists(report_card_id) AND attribute_exists(start_month) AND status = :old_status AND report_card_generator_id = :report_card_generator_id",
-                    "UpdateExpression": "SET status = :status",
-                    "ExpressionAttributeValues": {
-                        ":old_status": {"S": "completed"},
-                        ":status": {"S": "sent"},
-                        ":report_card_generator_id": report_card_generator_id,
-                    },
-                }
-            )
+            updates.append(_report_card_status_update(completed_report_card, report_card_generator_id))
 
         today_string = get_today_string()
         if min_report_card_start_month > today_string:
@@ -633,14 +814,16 @@ async def update_report_card_and_generator(
         )
 
         report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
-        report_cards_response = await report_cards_table.query(
+        report_cards = await query_items(
+            report_cards_table,
+            page_size=1,
+            max_items=1,
             IndexName="report-card-generator-id-start-month-index",
             KeyConditionExpression=Key("report_card_generator_id").eq(report_card_generator_id)
             & Key("start_month").eq(report_card_generator["current_start_month"]),
-            Limit=1,
         )
 
-        if not report_cards_response.get("Items", []):
+        if not report_cards:
             # new report card
             report_card = {}
             report_card["report_card_id"] = f"JJ#{report_card_generator['report_card_generator_id']}"
@@ -691,24 +874,7 @@ async def update_report_card_and_delete_generator(
 
         # update report card status a sent
         for completed_report_card in completed_report_cards:
-            updates.append(
-                {
-                    "TableName": settings.REPORT_CARDS_TABLE,
-                    "Key": to_low_level_item(
-                        {
-                            "report_card_id": completed_report_card["report_card_id"],
-                            "start_month": completed_report_card["start_month"],
-                        }
-                    ),
-                    "ConditionExpression": "attribute_exists(report_card_id) AND attribute_exists(start_month) AND status = :old_status AND report_card_generator_id = :report_card_generator_id",
-                    "UpdateExpression": "SET status = :status",
-                    "ExpressionAttributeValues": {
-                        ":old_status": {"S": "completed"},
-                        ":status": {"S": "sent"},
-                        ":report_card_generator_id": report_card_generator_id,
-                    },
-                }
-            )
+            updates.append(_report_card_status_update(completed_report_card, report_card_generator_id))
 
         # delete report card generator
         deletes.append(
@@ -729,6 +895,30 @@ async def update_report_card_and_delete_generator(
         return {"success": False, "error": str(e)}
 
 
+async def update_report_cards_to_sent(
+    completed_report_cards: List[dict],
+    report_card_generator_id: str,
+    db: DynamoDBServiceResource,
+) -> Dict[str, Any]:
+    """
+    Aggiorna gli stati a sent di completed_report_cards senza toccare il report card generator
+    (usato quando parte dei report card del generator non è stata inviata)
+    """
+    try:
+        updates: List[Dict] = []
+
+        # update report card status a sent
+        for completed_report_card in completed_report_cards:
+            updates.append(_report_card_status_update(completed_report_card, report_card_generator_id))
+
+        await make_atomic_transaction(db, updates=updates)
+
+        return {"success": True, "message": "Report card aggiornati correttamente."}
+    except ClientError as e:
+        logger.error(f"DynamoDB Error in update_report_cards_to_sent (REPORT_CARDS table): {e}")
+        return {"success": False, "error": str(e)}
+
+
 async def create_contract(
     contract: dict,
     has_report_card_context: bool,
@@ -748,12 +938,13 @@ async def create_contract(
 
         # check se esiste altro report card generator con stesso client e cadency, devono avere stesse email
         report_card_generators_table = await get_table(db, settings.REPORT_CARD_GENERATORS_TABLE)
-        report_card_generator_response = await report_card_generators_table.query(
+        similar_report_card_generators = await query_items(
+            report_card_generators_table,
+            max_items=1,
             IndexName="client_id-index",
             KeyConditionExpression=Key("client_id").eq(contract["client_id"]),
             ProjectionExpression="report_card_email_recipients",
         )
-        similar_report_card_generators = report_card_generator_response.get("Items", [])
         if similar_report_card_generators:
             assert (
                 similar_report_card_generators[0]["report_card_email_recipients"]
@@ -844,39 +1035,8 @@ async def create_contract(
                     }
                 )
 
-        # create new contract_id
-        contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-        active_contracts_response = await contracts_table.query(
-            IndexName="status-contract_id-index",
-            KeyConditionExpression=Key("status").eq("Active"),
-            ProjectionExpression="contract_id",
-            Limit=1,
-        )
-
-        inactive_contracts_response = await contracts_table.query(
-            IndexName="status-contract_id-index",
-            KeyConditionExpression=Key("status").eq("Inactive"),
-            ProjectionExpression="contract_id",
-            Limit=1,
-        )
-
-        contract_ids = [
-            contract["contract_id"]
-            for contract in active_contracts_response.get("Items", []) + inactive_contracts_response.get("Items", [])
-        ]
-
-        contract_id = "CON001"
-        if contract_ids:
-            max_contract_id = max(contract_ids)
-            contract_id = int(max_contract_id.split("CON")[1]) + 1
-            if contract_id > 99:
-                contract_id = f"CON{contract_id}"
-            else:
-                if contract_id > 9:
-                    contract_id = f"CON0{contract_id}"
-                else:
-                    contract_id = f"CON00{contract_id}"
-
+        # create new contract_id (contatore atomico: nessuna collisione tra richieste concorrenti)
+        contract_id = await contract_id_allocator.next_id(db)
         contract["contract_id"] = contract_id
 
         # prepare put item
@@ -884,7 +1044,7 @@ async def create_contract(
             {
                 "TableName": settings.CONTRACTS_TABLE,
                 "Item": to_low_level_item(contract),
-                "ConditionExpression": "attribute_not_exists('#pk_attr')",
+                "ConditionExpression": "attribute_not_exists(#pk_attr)",
                 "ExpressionAttributeNames": {
                     "#pk_attr": "contract_id",
                 },
@@ -908,18 +1068,18 @@ async def insert_new_company(company: Dict[str, Any], db: DynamoDBServiceResourc
 async def get_employee_students_by_company(company_id: str, db: DynamoDBServiceResource) -> dict:
     # get employees
     company_employees_table = await get_table(db, settings.COMPANY_EMPLOYEES_TABLE)
-    company_response = await company_employees_table.query(Key("company_id").eq(company_id))
-    students = [employee["student_id"] for employee in company_response.get("Items", [])]
+    employees = await query_items(company_employees_table, KeyConditionExpression=Key("company_id").eq(company_id))
+    students = [employee["student_id"] for employee in employees]
     return students
 
 
 async def get_invoices_by_client(client_id: str, db: DynamoDBServiceResource) -> dict:
     # get employees
     invoices_table = await get_table(db, settings.INVOICES_TABLE)
-    invoices_response = await invoices_table.query(
-        IndexName="client-id-index", KeyConditionExpression=Key("client_id").eq(client_id)
+    invoices = await query_items(
+        invoices_table, IndexName="client-id-index", KeyConditionExpression=Key("client_id").eq(client_id)
     )
-    invoices = [invoice["invoice_id"] for invoice in invoices_response.get("Items", [])]
+    invoices = [invoice["invoice_id"] for invoice in invoices]
     return invoices
 
 
@@ -943,14 +1103,15 @@ async def insert_new_company_employee(company_id: str, student_id: str, db: Dyna
 
 
 async def get_students_and_company_list(db: DynamoDBServiceResource) -> dict:
-    students = get_active_students(db)
+    students = await get_active_students(db)
     users_table = await get_table(db, settings.USERS_TABLE)
-    companies_response = await users_table.query(
+    companies = await query_items(
+        users_table,
         IndexName="user-type-index",
         KeyConditionExpression=Key("user_type").eq("company"),
         ProjectionExpression="id",
     )
-    companies = [company["id"] for company in companies_response.get("Items", [])]
+    companies = [company["id"] for company in companies]
     return {"students": students, "companies": companies}
 
 
@@ -961,12 +1122,14 @@ async def get_monthly_earnings(coach_id: str, db: DynamoDBServiceResource) -> fl
     try:
         # GSI: coach-id-date-index (HASH: coach_id, RANGE: date)
         table = await get_table(db, settings.CALLS_TABLE)
-        response = await table.query(
+        total_earnings = Decimal(0)
+        async for page in paginate(
+            table,
             IndexName="coach-id-date-index",
             KeyConditionExpression=Key("coach_id").eq(coach_id) & Key("date").begins_with(today[:7]),
             ProjectionExpression="coach_rate",
-        )
-        total_earnings = sum(item.get("coach_rate", Decimal(0)) for item in response.get("Items", []))
+        ):
+            total_earnings += sum(item.get("coach_rate", Decimal(0)) for item in page)
         return float(round(total_earnings, 2))
     except ClientError as e:
         logger.error(f"DynamoDB Error in get_monthly_earnings (TRACKER table): {e}")
@@ -977,24 +1140,24 @@ async def get_calls_by_coach(db, coach_id: str) -> List[Dict[str, Any]]:
     """Recupera tutte le chiamate (TRACKER Table, coach-id-date-index)."""
     try:
         calls_table = await get_table(db, settings.CALLS_TABLE)
-        lessons = await calls_table.query(
+        history = []
+        async for items in paginate(
+            calls_table,
             IndexName="coach-id-date-index",
             KeyConditionExpression=Key("coach_id").eq(coach_id),
             ScanIndexForward=False,
             ProjectionExpression=", ".join(["date", "student_id", "product_id", "coach_rate"]),
-        )
-        products_table = await get_table(db, settings.PRODUCTS_TABLE)
-        history = []
-        for item in lessons.get("Items", []):
-            product_response = await products_table.get_item(Key={"product_id": item.get("product_id")})
-            history.append(
-                {
-                    "date": item.get("date"),
-                    "studentId": item.get("student_id"),
-                    "productName": product_response["Item"]["product_name"],
-                    "earnings": float(item.get("coach_rate", 0)),
-                }
-            )
+        ):
+            products = await get_products([item.get("product_id") for item in items], db)
+            for item in items:
+                history.append(
+                    {
+                        "date": item.get("date"),
+                        "studentId": item.get("student_id"),
+                        "productName": products[item.get("product_id")]["product_name"],
+                        "earnings": float(item.get("coach_rate", 0)),
+                    }
+                )
 
         return history
     except ClientError as e:
@@ -1006,28 +1169,26 @@ async def get_calls_by_student(student_id: str, db: DynamoDBServiceResource) ->
     """Recupera tutte le chiamate (TRACKER Table, student-id-date-index)."""
     try:
         calls_table = await get_table(db, settings.CALLS_TABLE)
-        lessons = await calls_table.query(
+        history = []
+        async for items in paginate(
+            calls_table,
             IndexName="student-id-date-index",
             KeyConditionExpression=Key("student_id").eq(student_id),
             ScanIndexForward=False,
             ProjectionExpression=", ".join(["date", "product_id", "coach_id", "duration", "attendance", "notes"]),
-        )
-
-        products_table = await get_table(db, settings.PRODUCTS_TABLE)
-
-        history = []
-        for item in lessons.get("Items", []):
-            product_response = await products_table.get_item(Key={"product_id": item.get("product_id")})
-            history.append(
-                {
-                    "date": item.get("date"),
-                    "productName": product_response["Item"]["product_name"],
-                    "coachId": item.get("coach_id"),
-                    "duration": item.get("duration"),
-                    "attendance": item.get("attendance"),
-                    "notes": item.get("notes"),
-                }
-            )
+        ):
+            products = await get_products([item.get("product_id") for item in items], db)
+            for item in items:
+                history.append(
+                    {
+                        "date": item.get("date"),
+                        "productName": products[item.get("product_id")]["product_name"],
+                        "coachId": item.get("coach_id"),
+                        "duration": item.get("duration"),
+                        "attendance": item.get("attendance"),
+                        "notes": item.get("notes"),
+                    }
+                )
 
         return history
     except ClientError as e:
@@ -1037,22 +1198,23 @@ async def get_calls_by_student(student_id: str, db: DynamoDBServiceResource) ->
 
 async def get_student_contracts(student_id: str, db: DynamoDBServiceResource) -> List[Dict[str, Any]]:
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    items = await query_items(
+        contracts_table,
         IndexName="student-id-status-index",
         KeyConditionExpression=Key("student_id").eq(student_id),
         ScanIndexForward=False,
         ProjectionExpression=", ".join(["left_calls", "used_calls", "max_end_date", "product_id"]),
     )
-    products_table = await get_table(db, settings.PRODUCTS_TABLE)
+    products = await get_products([item.get("product_id") for item in items], db)
 
     contracts = []
-    for item in contracts_response.get("Items", []):
-        product_response = await products_table.get_item(Key={"product_id": item.get("product_id")})
+    for item in items:
+        product = products[item.get("product_id")]
         contracts.append(
             {
                 "product": {
-                    "productName": product_response["Item"]["product_name"],
-                    "duration": product_response["Item"]["duration"],
+                    "productName": product["product_name"],
+                    "duration": product["duration"],
                 },
                 "status": item.get("status"),
                 "left_calls": item.get("left_calls"),
@@ -1081,11 +1243,11 @@ def next_month_prefix(today_date: date) -> str:
 async def get_completed_expired_report_cards(db: DynamoDBServiceResource):
     today_string = get_today_string()
     report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
-    report_cards_response = await report_cards_table.query(
+    return await query_items(
+        report_cards_table,
         IndexName="status-end-month-index",
         KeyConditionExpression=Key("status").eq("completed") & Key("end_month").lt(today_string),
     )
-    return report_cards_response.get("Items", [])
 
 
 # Funzioni per Tabella REPORT_CARDS
@@ -1096,11 +1258,11 @@ async def get_report_card_tasks_db(coach: dict, db: DynamoDBServiceResource) ->
     today_string = get_today_string(today_date)
     report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
 
-    report_cards_response = await report_cards_table.query(
+    report_cards = await query_items(
+        report_cards_table,
         IndexName="coach-id-status-index",
         KeyConditionExpression=Key("coach_id").eq(coach["id"]) & Key("status").eq("draft"),
     )
-    report_cards = report_cards_response.get("Items", [])
     report_cards_df = pd.DataFrame.from_dict(report_cards)
     current_report_cards = report_cards_df[report_cards_df["end_month"] > today_string].to_dict("records")
     expired_report_cards = report_cards_df[report_cards_df["end_month"] < today_string].to_dict("records")
@@ -1111,20 +1273,20 @@ async def get_report_card_tasks_db(coach: dict, db: DynamoDBServiceResource) ->
 
     if coach["role"] == "Head Coach":
         # no show scaduti
-        report_cards_response = await report_cards_table.query(
+        no_shows = await query_items(
+            report_cards_table,
             IndexName="coach-id-status-index",
             KeyConditionExpression=Key("coach_id").eq(coach["id"]) & Key("status").eq("no_show"),
             FilterExpression=Attr("end_month").lt(today_string),
         )
-        no_shows = report_cards_response.get("Items", [])
 
         # draft scadute di altri coach
-        report_cards_response = await report_cards_table.query(
+        others_expired_report_cards = await query_items(
+            report_cards_table,
             IndexName="status-end-month-index",
             KeyConditionExpression=Key("status").eq("draft") & Key("end_month").lt(today_string),
             FilterExpression=Attr("coach_id").ne(coach["id"]),
         )
-        others_expired_report_cards = report_cards_response.get("Items", [])
 
         # completed scaduti
         completed_report_cards = await get_completed_expired_report_cards(db)
@@ -1147,18 +1309,24 @@ async def is_empty_no_show_or_draft_expired_report_cards(
 
         today_string = get_today_string()
         # no show scaduti
-        report_cards_response = await report_cards_table.query(
+        report_cards = await query_items(
+            report_cards_table,
+            page_size=1,
+            max_items=1,
             IndexName="status-end-month-index",
-            KeyConditionExpression=Key("status").eq("no_show") & Attr("end_month").lt(today_string),
+            KeyConditionExpression=Key("status").eq("no_show") & Key("end_month").lt(today_string),
         )
-        assert not report_cards_response.get("Items", []), "Ther are no show expired report cards"
+        assert not report_cards, "Ther are no show expired report cards"
 
         # draft scadute di altri coach
-        report_cards_response = await report_cards_table.query(
+        report_cards = await query_items(
+            report_cards_table,
+            page_size=1,
+            max_items=1,
             IndexName="status-end-month-index",
             KeyConditionExpression=Key("status").eq("draft") & Key("end_month").lt(today_string),
         )
-        assert not report_cards_response.get("Items", []), "Ther are draft expired report cards"
+        assert not report_cards, "Ther are draft expired report cards"
 
         return {"success": True, "message": "No no_shor or draft expired report card"}
     except ClientError as e:
@@ -1176,11 +1344,12 @@ async def get_calls_by_report_card(
     assert report_card["coach_id"] == coach_id, "Coach not authorized"
     report_card_generator_id = report_card["report_card_generator_id"]
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    contracts_response = await contracts_table.query(
+    contracts = await query_items(
+        contracts_table,
         IndexName="report_card_generator_id-index",
         KeyConditionExpression=Key("report_card_generator_id").eq(report_card_generator_id),
     )
-    contract_ids = [contract["contract_id"] for contract in contracts_response.get("Items", [])]
+    contract_ids = [contract["contract_id"] for contract in contracts]
     calls = []
     calls_table = await get_table(db, settings.CALLS_TABLE)
     student_id = report_card_generator_id.split("#")[0]
@@ -1199,11 +1368,12 @@ async def get_calls_by_report_card(
     ]
     for contract_id in contract_ids:
         # calls for the contract by the coach in the report card period with the student
-        calls_response = await calls_table.query(
+        async for page in paginate(
+            calls_table,
             KeyConditionExpression=Key("contract_id").eq(contract_id) & Key("session_id").gt(session_id_starting),
             FilterExpression=Attr("date").lt(report_card["end_month"]),
-        )
-        calls += [{k: call.get(k) for k in call_field_to_keep} for call in calls_response.get("Items", [])]
+        ):
+            calls += [{k: call.get(k) for k in call_field_to_keep} for call in page]
     return calls
 
 
@@ -1,5 +1,6 @@
 # smartalk/db_usage/dynamodb_coach.py
 
+import asyncio
 import logging
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
@@ -13,17 +14,20 @@ from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource
 
+from smartalk.core.booking_lock import BookingLockConflict, booking_lock
+from smartalk.core.cache import ReadThroughCache, add_invalidation_hook
 from smartalk.core.dynamodb import (
     delete_item,
     get_item,
     get_table,
     get_today_string,
     make_atomic_transaction,
+    query_items,
     to_dynamodb_item,
     to_low_level_item,
 )
 from smartalk.core.settings import settings
-from smartalk.email_and_automations.utils.calendars_manager import CalendarManager
+from smartalk.email_and_automations.utils.calendars_manager import CalendarManager, parse_event_datetime
 
 logger = logging.getLogger(__name__)
 
@@ -38,33 +42,72 @@ async def get_free_coach_slots(
     db: DynamoDBServiceResource,
 ) -> List[dict]:
     """Recupera gli gli slot liberi di un coach rispetto al prodotto del contratto attivo dello studente."""
-    try:
-        # validate contract
-        contract = await get_item(db, settings.CONTRACTS_TABLE, {"contract_id": contract_id})
-        if not contract:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contratto non trovato")
+    slots_by_duration = await get_free_coach_slots_by_duration(
+        coach_id, student_id, contract_id, start_date, end_date, db
+    )
+    return next(iter(slots_by_duration.values()), [])
 
-        if contract.get("student_id") != student_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Contratto non accessibile")
 
-        status_value = str(contract.get("status", "")).lower()
-        if status_value != "active":
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Contratto non attivo")
+async def get_contract_slot_durations(
+    student_id: str,
+    contract_id: str,
+    db: DynamoDBServiceResource,
+    durations: Optional[List[int]] = None,
+) -> List[int]:
+    """
+    Valida il contratto dello studente e restituisce le durate (minuti) da cercare:
+    durations se indicate (multipli della durata del prodotto), altrimenti la durata del prodotto.
+    """
+    # validate contract
+    contract = await get_item(db, settings.CONTRACTS_TABLE, {"contract_id": contract_id})
+    if not contract:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contratto non trovato")
 
-        if contract.get("left_calls", 0) <= 0 and not contract.get("unlimited"):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nessuna chiamata residua")
+    if contract.get("student_id") != student_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Contratto non accessibile")
 
-        # get duration from product
-        product = await get_item(db, settings.PRODUCTS_TABLE, {"product": contract.get("product_id")})
+    status_value = str(contract.get("status", "")).lower()
+    if status_value != "active":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Contratto non attivo")
 
-        if not product:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prodotto non trovato")
+    if contract.get("left_calls", 0) <= 0 and not contract.get("unlimited"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nessuna chiamata residua")
+
+    # get duration from product
+    product = await get_item(db, settings.PRODUCTS_TABLE, {"product_id": contract.get("product_id")})
+
+    if not product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prodotto non trovato")
 
-        required_duration = product.get("duration")
-        if not isinstance(required_duration, (int, float, Decimal)):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Durata prodotto non valida")
+    required_duration = product.get("duration")
+    if not isinstance(required_duration, (int, float, Decimal)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Durata prodotto non valida")
 
-        required_duration = int(required_duration)
+    required_duration = int(required_duration)
+    durations = durations or [required_duration]
+    if any(d <= 0 or d % required_duration for d in durations):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Le durate devono essere multipli di {required_duration} minuti",
+        )
+    return durations
+
+
+async def get_free_coach_slots_by_duration(
+    coach_id: str,
+    student_id: str,
+    contract_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    db: DynamoDBServiceResource,
+    durations: Optional[List[int]] = None,
+) -> Dict[int, List[dict]]:
+    """
+    Slot liberi di un coach per ogni durata richiesta (minuti, multipli della durata del prodotto),
+    calcolati con una sola lettura dell'indice; senza durations solo la durata del prodotto.
+    """
+    try:
+        durations = await get_contract_slot_durations(student_id, contract_id, db, durations)
 
         # get coach calendar
         coach = await get_item(db, settings.USERS_TABLE, {"id": coach_id})
@@ -78,10 +121,86 @@ async def get_free_coach_slots(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Calendario coach non configurato")
 
         calendar_manager = CalendarManager(user_email=coach_email, calendar_id=calendar_id)
-        return await calendar_manager.list_free_slots_by_period_and_duration(start_date, end_date, required_duration)
+        return await calendar_manager.list_free_slots_by_durations(start_date, end_date, durations)
     except ClientError as e:
         logger.error(f"DynamoDB Error in get_active_students (USERS table): {e}")
-        return []
+        return {}
+
+
+# Coach prenotabili (attivi, con calendario): una query su user-type-index ogni
+# BOOKABLE_COACHES_TTL_SECONDS, svuotata da qualsiasi scrittura su USERS
+bookable_coaches_cache = ReadThroughCache(ttl_seconds=settings.BOOKABLE_COACHES_TTL_SECONDS, max_size=1)
+add_invalidation_hook(settings.USERS_TABLE, lambda user: bookable_coaches_cache.clear())
+
+
+async def get_bookable_coaches(db: DynamoDBServiceResource) -> List[Dict[str, Any]]:
+    """Coach attivi con calendario configurato: [{"id", "email", "calendar_id"}, ...]."""
+
+    async def load() -> List[Dict[str, Any]]:
+        table = await get_table(db, settings.USERS_TABLE)
+        coaches = await query_items(
+            table,
+            IndexName="user-type-index",
+            KeyConditionExpression=Key("user_type").eq("coach"),
+            ProjectionExpression="#id, email, calendar_id, #status",
+            ExpressionAttributeNames={"#id": "id", "#status": "status"},
+        )
+        return [
+            {"id": c["id"], "email": c["email"], "calendar_id": c["calendar_id"]}
+            for c in coaches
+            if str(c.get("status", "")).lower() == "active" and c.get("calendar_id") and c.get("email")
+        ]
+
+    return await bookable_coaches_cache.get("coaches", load)
+
+
+async def get_free_slots_all_coaches(
+    student_id: str,
+    contract_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    db: DynamoDBServiceResource,
+    durations: Optional[List[int]] = None,
+) -> Dict[int, List[dict]]:
+    """
+    Slot liberi di tutti i coach prenotabili, per ogni durata:
+    [{"start", "end", "coach_ids": [...]}, ...] ordinati per start, uno per orario.
+    I calendari vengono letti in parallelo (al massimo AVAILABILITY_MAX_CONCURRENT_CALENDARS
+    alla volta) dall'indice locale di ogni calendario: solo quelli non in cache vanno su Google.
+    Un calendario non leggibile viene saltato, senza far fallire la ricerca.
+    """
+    try:
+        durations = await get_contract_slot_durations(student_id, contract_id, db, durations)
+        coaches = await get_bookable_coaches(db)
+    except ClientError as e:
+        logger.error(f"DynamoDB Error in get_free_slots_all_coaches: {e}")
+        return {}
+
+    semaphore = asyncio.Semaphore(settings.AVAILABILITY_MAX_CONCURRENT_CALENDARS)
+
+    async def coach_slots(coach: Dict[str, Any]) -> Dict[int, List[dict]]:
+        async with semaphore:
+            try:
+                calendar_manager = CalendarManager(user_email=coach["email"], calendar_id=coach["calendar_id"])
+                return await calendar_manager.list_free_slots_by_durations(start_date, end_date, durations)
+            except Exception as e:
+                logger.warning(f"Calendario del coach {coach['id']} non leggibile, saltato: {e}")
+                return {}
+
+    results = await asyncio.gather(*[coach_slots(coach) for coach in coaches])
+
+    merged: Dict[int, Dict[tuple, List[str]]] = {duration: {} for duration in durations}
+    for coach, slots_by_duration in zip(coaches, results):
+        for duration, slots in slots_by_duration.items():
+            for slot in slots:
+                merged[duration].setdefault((slot["start"], slot["end"]), []).append(coach["id"])
+
+    return {
+        duration: [
+            {"start": start, "end": end, "coach_ids": coach_ids} for (start, end), coach_ids in sorted(by_slot.items())
+        ]
+        for duration, by_slot in merged.items()
+    }
 
 
 async def book_call(
@@ -95,9 +214,11 @@ async def book_call(
     """
     Prenota uno slot:
     - valida studente/contratto
+    - prende il lock dello slot su BOOKING_LOCKS (409 se un'altra prenotazione lo tiene)
     - verifica disponibilità subslot
     - trasforma lo slot che lo contiene in 3 eventi (free, busy, free)
     - salva prenotazione su DynamoDB BOOKING_CALLS
+    - rilascia il lock
     """
 
     # -------------------------
@@ -114,7 +235,7 @@ async def book_call(
     if contract.get("left_calls", 0) <= 0 and not contract.get("unlimited"):
         raise HTTPException(400, "Nessuna chiamata residua")
 
-    product = await get_item(db, settings.PRODUCTS_TABLE, {"product": contract["product_id"]})
+    product = await get_item(db, settings.PRODUCTS_TABLE, {"product_id": contract["product_id"]})
     if not product:
         raise HTTPException(404, "Prodotto non trovato")
 
@@ -134,28 +255,44 @@ async def book_call(
     if not calendar_id or not coach_email:
         raise HTTPException(400, "Calendario coach non configurato")
 
-    calendar = CalendarManager(user_email=coach_email, calendar_id=calendar_id)
-    units, start_dt, end_dt, event_id = await calendar.book_call(
-        start, end, product_name, product_unit_duration, student["email"]
-    )
-
     # -------------------------
-    # 8. Salva prenotazione su DynamoDB
+    # 4. Lock dello slot (BOOKING_LOCKS) prima di Google Calendar
     # -------------------------
-    booking_item = {
-        "attendees": f"{coach_id}#{student_id}",  # PK
-        "start": start_dt.isoformat(),  # SK
-        "coach_id": coach_id,
-        "student_id": student_id,
-        "contract_id": contract_id,
-        "end": end_dt.isoformat(),
-        "status": "cancelable",
-        "units": units,
-        "event_id": event_id,
-    }
+    try:
+        start_dt = parse_event_datetime(start)
+        end_dt = parse_event_datetime(end)
+    except ValueError:
+        raise HTTPException(400, "Invalid datetime format")
 
-    booking_calls_table = await get_table(db, settings.BOOKING_CALLS_TABLE)
-    await booking_calls_table.put_item(
-        Item=to_dynamodb_item(booking_item),
-        ConditionExpression=Attr("attendees").not_exists() & Attr("start").not_exists(),
-    )
+    if start_dt >= end_dt:
+        raise HTTPException(400, "Start must be < end")
+
+    calendar = CalendarManager(user_email=coach_email, calendar_id=calendar_id)
+    try:
+        async with booking_lock(db, coach_id, start_dt, end_dt):
+            units, start_dt, end_dt, event_id = await calendar.book_call(
+                start, end, product_name, product_unit_duration, student["email"]
+            )
+
+            # -------------------------
+            # 8. Salva prenotazione su DynamoDB
+            # -------------------------
+            booking_item = {
+                "attendees": f"{coach_id}#{student_id}",  # PK
+                "start": start_dt.isoformat(),  # SK
+                "coach_id": coach_id,
+                "student_id": student_id,
+                "contract_id": contract_id,
+                "end": end_dt.isoformat(),
+                "status": "cancelable",
+                "units": units,
+                "event_id": event_id,
+            }
+
+            booking_calls_table = await get_table(db, settings.BOOKING_CALLS_TABLE)
+            await booking_calls_table.put_item(
+                Item=to_dynamodb_item(booking_item),
+                ConditionExpression=Attr("attendees").not_exists() & Attr("start").not_exists(),
+            )
+    except BookingLockConflict:
+        raise HTTPException(409, "Lo slot è in prenotazione da un altro studente")
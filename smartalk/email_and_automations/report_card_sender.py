@@ -1,15 +1,17 @@
+import asyncio
+import logging
 from datetime import datetime
-from typing import Any, Dict, Iterable, List
-
-import pandas as pd
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 from smartalk.email_and_automations.utils.email import (
-    generate_pdf_bytes_from_html,
-    get_gmail_service,
+    build_email_with_pdf,
     load_snippet_from_template,
-    send_gmail_message_with_pdf,
     templates,
 )
+from smartalk.email_and_automations.utils.email_sender import EmailTransport, send_messages
+from smartalk.email_and_automations.utils.pdf_renderer import render_pdf_bytes
+
+logger = logging.getLogger(__name__)
 
 """
 report_cards_sender.py
@@ -19,22 +21,28 @@ Pipeline produzione:
   (schede già completate e approvate, pronte per l'invio)
 - usa student_names_by_id e client_names_by_id (dict semplici id -> nome completo)
 - raggruppa per client_id
-- genera PDF per ogni client via Jinja2 + WeasyPrint (in memoria)
-- invia via Gmail API
+- genera PDF per ogni client via Jinja2 + WeasyPrint (in memoria, nel pool di processi di pdf_renderer)
+- invia via Gmail API (async, concorrenza limitata, trasporto sostituibile: vedi utils/email_sender.py)
 """
 
 # ==========================
-# DATAFRAME E GROUPING
+# GROUPING
 # ==========================
+#
+# Un solo passaggio sui report card con dict e liste (niente DataFrame): lineare nel numero
+# di report card, anche con migliaia di schede (vedi smartalk/scripts/benchmark_report_card_bundles.py).
 
+BundleKey = Tuple[str, str, str]  # (client_id, start_month, end_month)
 
-def prepare_report_cards_dataframe(
+
+def group_report_cards_by_client_and_period(
     completed_report_cards: Iterable[Dict[str, Any]],
     student_names_by_id: Dict[str, str],
-) -> pd.DataFrame:
+) -> Dict[BundleKey, List[Dict[str, Any]]]:
     """
-    Converte completed_report_cards (list[dict]) in DataFrame
-    e aggiunge il nome completo dello studente.
+    Raggruppa i report card per (client_id, start_month, end_month), aggiungendo a ogni
+    record il nome completo dello studente (student_full_name). I report card senza
+    client_id o periodo vengono esclusi.
 
     Assunzione: i dict hanno le chiavi in snake_case come:
       - student_id
@@ -46,18 +54,28 @@ def prepare_report_cards_dataframe(
       - end_month
       - client_id
     """
-    rows = list(completed_report_cards)
-    if not rows:
-        return pd.DataFrame()
-
-    df = pd.DataFrame(rows)
+    groups: Dict[BundleKey, List[Dict[str, Any]]] = {}
+    for report_card in completed_report_cards:
+        key = (report_card.get("client_id"), report_card.get("start_month"), report_card.get("end_month"))
+        if None in key:
+            continue
+        record = dict(report_card)
+        # nome completo studente, es. "Mario Rossi"
+        record["student_full_name"] = student_names_by_id[report_card["student_id"]]
+        groups.setdefault(key, []).append(record)
+    return groups
 
-    # nome completo studente, es. "Mario Rossi"
-    def _student_full_name(sid: str) -> str:
-        return student_names_by_id[sid]
 
-    df["student_full_name"] = df["student_id"].map(_student_full_name)
-    return df
+def group_report_cards_by_generator(
+    completed_report_cards: Iterable[Dict[str, Any]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """report_card_generator_id → [{"report_card_id", "start_month"}], in un solo passaggio."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for report_card in completed_report_cards:
+        groups.setdefault(report_card["report_card_generator_id"], []).append(
+            {"report_card_id": report_card["report_card_id"], "start_month": report_card["start_month"]}
+        )
+    return groups
 
 
 # ==========================
@@ -68,7 +86,7 @@ def prepare_report_cards_dataframe(
 def render_pdf_html_for_client_and_period(
     company_name: str,
     period_str: str,
-    client_df: pd.DataFrame,
+    client_report_cards: List[Dict[str, Any]],
     logo_html: str,
 ) -> str:
     """
@@ -90,20 +108,21 @@ def render_pdf_html_for_client_and_period(
     except Exception as e:
         raise RuntimeError(f"Missing template reportCardPdf.html: {e}")
 
-    # ordina per nome studente
-    client_df = client_df.sort_values("student_full_name", na_position="last")
+    # ordina per nome studente (senza nome in fondo)
+    client_report_cards = sorted(
+        client_report_cards,
+        key=lambda r: (r.get("student_full_name") is None, r.get("student_full_name") or ""),
+    )
 
-    items: List[Dict[str, Any]] = []
-    for _, row in client_df.iterrows():
-        full_name = row.get("student_full_name", "") or ""
-        items.append(
-            {
-                "fullName": full_name,
-                "coach": row.get("coach_id", "") or "",
-                "attendance": row.get("attendance", "") or "",
-                "report": row.get("report", "") or "",
-            }
-        )
+    items: List[Dict[str, Any]] = [
+        {
+            "fullName": row.get("student_full_name", "") or "",
+            "coach": row.get("coach_id", "") or "",
+            "attendance": row.get("attendance", "") or "",
+            "report": row.get("report", "") or "",
+        }
+        for row in client_report_cards
+    ]
 
     html = pdf_template.render(
         companyName=company_name,
@@ -119,80 +138,134 @@ def render_pdf_html_for_client_and_period(
 # ==========================
 
 
-def generate_grouped_report_card_bundles(
+async def build_report_card_bundle(
+    key: BundleKey,
+    client_report_cards: List[Dict[str, Any]],
+    client_names_by_id: Dict[str, str],
+    logo_html: str,
+) -> Optional[Dict[str, Any]]:
+    """Costruisce il bundle di un gruppo (client_id, start_month, end_month); None se senza destinatario."""
+    client_id, start_month, end_month = key
+    company_name = client_names_by_id[client_id]
+
+    # recipients
+    report_card_email_recipients_list = list(
+        dict.fromkeys(r.get("report_card_email_recipients") for r in client_report_cards)
+    )
+    if not len(report_card_email_recipients_list) == 1:
+        raise RuntimeError(f"report_card_email_recipients not well defined for client {client_id}")
+
+    report_card_email_recipients = report_card_email_recipients_list[0]
+    if not report_card_email_recipients:
+        raise RuntimeError(f"report_card_email_recipients undefined for client {client_id}")
+
+    emails = [e.strip() for e in report_card_email_recipients.split(",") if e.strip()]
+    to_email = emails[0] if emails else ""
+    cc_email = ", ".join(emails[1:]) if len(emails) > 1 else ""
+
+    if not to_email:
+        return None
+
+    period_str = f"{start_month} - {end_month}"
+
+    html_content = render_pdf_html_for_client_and_period(
+        company_name=company_name,
+        period_str=period_str,
+        client_report_cards=client_report_cards,
+        logo_html=logo_html,
+    )
+    pdf_bytes = await render_pdf_bytes(html_content)
+
+    filename = f"{company_name}_Report_Card_{period_str}.pdf".replace(" ", "_")
+
+    return {
+        "client_id": client_id,
+        "start_month": start_month,
+        "end_month": end_month,
+        "company_name": company_name,
+        "to_email": to_email,
+        "cc_email": cc_email,
+        "pdf_list": [
+            {
+                "pdf_bytes": pdf_bytes,
+                "filename": filename,
+            }
+        ],
+    }
+
+
+async def iter_grouped_report_card_bundles(
     completed_report_cards: Iterable[Dict[str, Any]],
     student_names_by_id: Dict[str, str],
     client_names_by_id: Dict[str, str],
     logo_html: str,
-) -> List[Dict[str, Any]]:
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Raggruppa i report card per client_id e costruisce una lista di "bundle":
+    Raggruppa i report card per (client_id, start_month, end_month) e restituisce i "bundle"
+    man mano che i rispettivi PDF sono pronti (render in parallelo nel pool di processi):
 
     bundle = {
         "client_id": str,
+        "start_month": str,
+        "end_month": str,
         "company_name": str,
         "to_email": str,
         "cc_email": str,
         "pdf_list": list, # [{"pdf_bytes": bytes, "filename": str}]
-        "report_cards": DataFrame di quel client,
     }
-    """
-    df = prepare_report_cards_dataframe(completed_report_cards, student_names_by_id)
-    if df.empty:
-        return []
-
-    bundles: List[Dict[str, Any]] = []
 
-    grouped = df.groupby(["client_id", "start_month", "end_month"], dropna=True)
+    Un gruppo che non si può inviare (destinatari non definiti o senza indirizzo, client_id o periodo
+    mancante) arriva come {"client_id", "start_month", "end_month", "error"}.
+    """
+    completed_report_cards = list(completed_report_cards)
+    grouped = group_report_cards_by_client_and_period(completed_report_cards, student_names_by_id)
 
-    for key, df_key in grouped:
+    def error_bundle(key: BundleKey, error: str) -> Dict[str, Any]:
         client_id, start_month, end_month = key
-        company_name = client_names_by_id[client_id]
-
-        # recipients
-        report_card_email_recipients_list = list(df_key["report_card_email_recipients"].unique())
-        if not len(report_card_email_recipients_list) == 1:
-            raise RuntimeError(f"report_card_email_recipients not well defined for client {client_id}")
-
-        report_card_email_recipients = report_card_email_recipients_list[0]
-        if not report_card_email_recipients:
-            raise RuntimeError(f"report_card_email_recipients undefined for client {client_id}")
-
-        emails = [e.strip() for e in report_card_email_recipients.split(",") if e.strip()]
-        to_email = emails[0] if emails else ""
-        cc_email = ", ".join(emails[1:]) if len(emails) > 1 else ""
-
-        if not to_email:
-            continue
-
-        period_str = f"{start_month} - {end_month}"
-
-        html_content = render_pdf_html_for_client_and_period(
-            company_name=company_name,
-            period_str=period_str,
-            client_df=df_key,
-            logo_html=logo_html,
-        )
-        pdf_bytes = generate_pdf_bytes_from_html(html_content)
+        logger.error(f"Report card bundle {key} non generato: {error}")
+        return {"client_id": client_id, "start_month": start_month, "end_month": end_month, "error": error}
+
+    # report card esclusi dal raggruppamento: non verranno inviati
+    incomplete_keys = dict.fromkeys(
+        key
+        for key in ((r.get("client_id"), r.get("start_month"), r.get("end_month")) for r in completed_report_cards)
+        if None in key
+    )
+    for key in incomplete_keys:
+        yield error_bundle(key, "client_id or period missing")
+
+    async def build(key: BundleKey, client_report_cards: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # un bundle non costruibile non ferma lo stream: diventa un bundle con "error", che non viene inviato
+        try:
+            bundle = await build_report_card_bundle(key, client_report_cards, client_names_by_id, logo_html)
+        except Exception as e:
+            return error_bundle(key, str(e))
+        if bundle is None:
+            return error_bundle(key, "no valid report card email recipient")
+        return bundle
+
+    tasks = [asyncio.create_task(build(key, client_report_cards)) for key, client_report_cards in grouped.items()]
+    try:
+        for next_bundle in asyncio.as_completed(tasks):
+            yield await next_bundle
+    finally:
+        for task in tasks:
+            task.cancel()
 
-        filename = f"{company_name}_Report_Card_{period_str}.pdf".replace(" ", "_")
 
-        bundles.append(
-            {
-                "client_id": client_id,
-                "company_name": company_name,
-                "to_email": to_email,
-                "cc_email": cc_email,
-                "pdf_list": [
-                    {
-                        "pdf_bytes": pdf_bytes,
-                        "filename": filename,
-                    }
-                ],
-            }
+async def generate_grouped_report_card_bundles(
+    completed_report_cards: Iterable[Dict[str, Any]],
+    student_names_by_id: Dict[str, str],
+    client_names_by_id: Dict[str, str],
+    logo_html: str,
+) -> List[Dict[str, Any]]:
+    """Come iter_grouped_report_card_bundles, ma restituisce la lista completa dei bundle."""
+    return [
+        bundle
+        async for bundle in iter_grouped_report_card_bundles(
+            completed_report_cards, student_names_by_id, client_names_by_id, logo_html
         )
-
-    return bundles
+    ]
 
 
 # ==========================
@@ -200,42 +273,54 @@ def generate_grouped_report_card_bundles(
 # ==========================
 
 
-def send_grouped_report_cards_emails_gmail(
-    bundles: List[Dict[str, Any]],
+def build_report_card_email(bundle: Dict[str, Any], signature_html: str, sender: str) -> Dict[str, Any]:
+    """Messaggio pronto per il trasporto ({"raw": ...}) con i riferimenti del bundle."""
+    company_name = bundle["company_name"]
+    subject = f"Report Cards for {company_name}"
+    html_body = (
+        f"Dear {company_name},<br><br>Please find attached the report cards for {company_name}.<br><br>{signature_html}"
+    )
+
+    raw = build_email_with_pdf(
+        sender=sender,
+        to=bundle["to_email"],
+        subject=subject,
+        html_body=html_body,
+        pdf_list=bundle.get("pdf_list"),
+        cc=bundle.get("cc_email"),
+    )
+    return {
+        "raw": raw,
+        "client_id": bundle["client_id"],
+        "start_month": bundle["start_month"],
+        "end_month": bundle["end_month"],
+        "to_email": bundle["to_email"],
+    }
+
+
+async def send_grouped_report_cards_emails(
+    bundles: AsyncIterable[Dict[str, Any]],
     signature_html: str,
     sender: str,
-) -> None:
+    transport: Optional[EmailTransport] = None,
+) -> List[Dict[str, Any]]:
     """
-    Invia tutte le email per i bundle generati.
-    Usa Gmail API e allega il PDF in memoria.
+    Invia le email dei bundle man mano che arrivano dallo stream
+    (concorrenza limitata e retry su 429/5xx in email_sender).
+    Restituisce un risultato per bundle con "success" ed eventuale "error"
+    (anche per i bundle arrivati con "error", che non vengono inviati).
     """
-    if not bundles:
-        return
-
-    service = get_gmail_service()
-
-    for b in bundles:
-        company_name = b["company_name"]
-        to_email = b["to_email"]
-        cc_email = b.get("cc_email")
-        pdf_list = b.get("pdf_list")
-        subject = f"Report Cards for {company_name}"
-        html_body = (
-            f"Dear {company_name},<br><br>"
-            f"Please find attached the report cards for {company_name}.<br><br>"
-            f"{signature_html}"
-        )
+    failed_bundles = []
 
-        # se vuoi loggare, fallo qui
-        send_gmail_message_with_pdf(
-            service=service,
-            sender=sender,
-            to=to_email,
-            subject=subject,
-            html_body=html_body,
-            pdf_list=pdf_list,
-            cc=cc_email,
-        )
+    async def messages():
+        async for bundle in bundles:
+            if "error" in bundle:
+                failed_bundles.append({**bundle, "success": False})
+            else:
+                yield build_report_card_email(bundle, signature_html, sender)
+
+    results = await send_messages(messages(), transport=transport)
+    return results + failed_bundles
 
 
 # ==========================
@@ -243,38 +328,44 @@ def send_grouped_report_cards_emails_gmail(
 # ==========================
 
 
-def run_send_report_cards(
+async def run_send_report_cards(
     completed_report_cards: List[Dict[str, Any]],
     student_names_by_id: Dict[str, str],
     client_names_by_id: Dict[str, str],
     sender: str,
-) -> None:
+    transport: Optional[EmailTransport] = None,
+) -> List[Dict[str, Any]]:
     """
     Funzione principale da chiamare dal tuo job/cron:
 
     - completed_report_cards: list[dict] già filtrate come "pronte per invio"
       (equivalente di Final check spuntato e non ancora Sent)
     - student_names_by_id: dict student_id -> "Nome Cognome"
-      (puoi popolarlo usando get_client_name per user_type == "student")
+      (puoi popolarlo usando resolve_names)
     - client_names_by_id: dict client_id -> nome cliente/azienda
-      (company o student singolo, sempre tramite get_client_name)
+      (company o student singolo, sempre tramite resolve_names)
     - sender: indirizzo Gmail/Workspace da cui inviare, es. "jj@smartalk.online"
+    - transport: trasporto email (default: settings.EMAIL_TRANSPORT)
+
+    L'invio parte appena il primo PDF è pronto, senza attendere il render di tutti i bundle.
+    Restituisce i risultati di invio per bundle.
     """
     if not completed_report_cards:
-        return
+        return []
 
     logo_html = load_snippet_from_template("logoBase64.html")
     signature_html = load_snippet_from_template("signature.html")
 
-    bundles = generate_grouped_report_card_bundles(
+    bundles = iter_grouped_report_card_bundles(
         completed_report_cards=completed_report_cards,
         student_names_by_id=student_names_by_id,
         client_names_by_id=client_names_by_id,
         logo_html=logo_html,
     )
 
-    send_grouped_report_cards_emails_gmail(
+    return await send_grouped_report_cards_emails(
         bundles=bundles,
         signature_html=signature_html,
         sender=sender,
+        transport=transport,
     )
@@ -1,19 +1,101 @@
 # calendar_manager.py
 
+import asyncio
 import json
+import logging
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from aiogoogle import Aiogoogle
 from aiogoogle.auth.creds import ServiceAccountCreds
+from aiogoogle.excs import HTTPError
+from aiogoogle.resource import GoogleAPI
+from aiogoogle.sessions.aiohttp_session import AiohttpSession
 from fastapi import HTTPException
 
+from smartalk.core.cache import ReadThroughCache
 from smartalk.core.settings import settings
 
+logger = logging.getLogger(__name__)
+
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+# ---------------------------------------------------------
+# CLIENT GOOGLE CONDIVISI (uno per processo)
+# ---------------------------------------------------------
+
+# Discovery document di Calendar v3 (caricato una sola volta)
+_calendar_api: Optional[GoogleAPI] = None
+_calendar_api_lock = asyncio.Lock()
+
+# Un client Aiogoogle per subject impersonato: conserva l'access token del service account fino alla scadenza
+_clients_by_subject: Dict[str, Aiogoogle] = {}
+
+# Sessione HTTP condivisa da tutti i client
+_shared_session: Optional["SharedAiohttpSession"] = None
+
+
+class SharedAiohttpSession(AiohttpSession):
+    """Sessione aiohttp riutilizzata tra le chiamate: "async with" non la chiude, vedi close_google_clients."""
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+def _shared_session_factory() -> SharedAiohttpSession:
+    global _shared_session
+
+    if _shared_session is None or _shared_session._session.closed:
+        _shared_session = SharedAiohttpSession()
+    return _shared_session
 
-def _parse_event_datetime(value: str) -> datetime:
+
+def get_google_client(subject: str) -> Aiogoogle:
+    """Client Aiogoogle (con token cache) per l'utente impersonato dal service account."""
+    client = _clients_by_subject.get(subject)
+    if client is None:
+        info = json.loads(settings.CALENDAR_SERVICE)
+        client = Aiogoogle(
+            service_account_creds=ServiceAccountCreds(scopes=SCOPES, **info, subject=subject),
+            session_factory=_shared_session_factory,
+        )
+        _clients_by_subject[subject] = client
+    return client
+
+
+async def get_calendar_api() -> GoogleAPI:
+    """
+    Discovery document di Calendar v3: da file locale (CALENDAR_DISCOVERY_DOC_PATH) se configurato,
+    altrimenti scaricato da Google alla prima richiesta. In entrambi i casi una sola volta per processo.
+    """
+    global _calendar_api
+
+    if _calendar_api is None:
+        async with _calendar_api_lock:
+            if _calendar_api is None:
+                if settings.CALENDAR_DISCOVERY_DOC_PATH:
+                    with open(settings.CALENDAR_DISCOVERY_DOC_PATH, encoding="utf-8") as f:
+                        _calendar_api = GoogleAPI(json.load(f))
+                else:
+                    _calendar_api = await Aiogoogle(session_factory=_shared_session_factory).discover("calendar", "v3")
+                logger.info("Discovery document Google Calendar v3 caricato")
+    return _calendar_api
+
+
+async def close_google_clients() -> None:
+    """Chiude la sessione HTTP condivisa (da chiamare allo shutdown dell'app)."""
+    global _shared_session
+
+    session = _shared_session
+    _shared_session = None
+    _clients_by_subject.clear()
+    if session is not None:
+        await session.close()
+
+
+def parse_event_datetime(value: str) -> datetime:
     # Google Calendar può restituire date in vari formati ISO, ad esempio:
     # - "2025-03-01T12:30:00Z"           → Z = UTC
     # - "2025-03-01T12:30:00+01:00"      → offset specificato
@@ -38,17 +120,286 @@ def _parse_event_datetime(value: str) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+# ---------------------------------------------------------
+# INDICE LOCALE DELLA DISPONIBILITÀ (eventi FREE e BUSY per calendar_id)
+# ---------------------------------------------------------
+#
+# Gli eventi di ogni calendario sono tenuti in memoria come intervalli in minuti UTC
+# (minuti dall'epoch), ordinati per inizio, per una finestra di AVAILABILITY_HORIZON_DAYS giorni:
+#   - FREE = transparency "transparent", BUSY = ogni altro evento non cancellato
+#   - disponibilità = unione degli eventi FREE (adiacenti o sovrapposti) meno gli eventi BUSY
+#   - gli start candidati (alle :00 e alle :30) si generano con numpy in un solo passaggio
+#     per tutti gli intervalli, e servono tutte le durate richieste (es. 30/45/60 minuti)
+# L'indice resta aggiornato da:
+#   - le scritture fatte da CalendarManager (create/update/delete event, book_call)
+#   - i delta del webhook Google Calendar (data_scheduler.handle_event_delta → apply_calendar_event)
+# e viene comunque ricaricato da Google dopo AVAILABILITY_INDEX_TTL_SECONDS, nel caso si perdano
+# notifiche o il calendario venga modificato senza webhook attivo.
+# La prenotazione (book_call) verifica sempre lo slot sugli eventi reali di Google.
+
+SLOT_STEP_MINUTES = 30
+
+Interval = Tuple[int, int]  # [inizio, fine) in minuti UTC dall'epoch
+
+
+def _ceil_half_hour(dt: datetime) -> datetime:
+    """Prossimo orario alle :00 o :30 (dt stesso se già allineato)."""
+    floored = dt.replace(minute=(dt.minute // 30) * 30, second=0, microsecond=0)
+    return floored if floored == dt else floored + timedelta(minutes=30)
+
+
+def _to_minutes(dt: datetime, ceil: bool = False) -> int:
+    seconds = int(dt.timestamp())
+    return -(-seconds // 60) if ceil else seconds // 60
+
+
+def _from_minutes(minutes: int) -> datetime:
+    return datetime.fromtimestamp(minutes * 60, tz=timezone.utc)
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Unione di intervalli ordinati per inizio: sovrapposti o adiacenti diventano uno solo."""
+    merged: List[Interval] = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(free: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """free meno busy (entrambi uniti e ordinati), in un solo passaggio."""
+    result: List[Interval] = []
+    i = 0
+    for start, end in free:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        current = start
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > current:
+                result.append((current, busy[j][0]))
+            current = max(current, busy[j][1])
+            j += 1
+        if current < end:
+            result.append((current, end))
+    return result
+
+
+def slot_starts_by_duration(intervals: List[Interval], durations: List[int]) -> Dict[int, np.ndarray]:
+    """
+    Start (minuti UTC, alle :00 o :30) degli slot contenuti negli intervalli, per ogni durata.
+    Un solo array di candidati per tutte le durate: per ogni durata basta una maschera.
+    """
+    if not intervals or not durations:
+        return {duration: np.empty(0, dtype=np.int64) for duration in durations}
+
+    bounds = np.asarray(intervals, dtype=np.int64)
+    starts, ends = bounds[:, 0], bounds[:, 1]
+    first = -(-starts // SLOT_STEP_MINUTES) * SLOT_STEP_MINUTES  # allineamento alla mezz'ora successiva
+    counts = np.maximum(0, (ends - min(durations) - first) // SLOT_STEP_MINUTES + 1)
+
+    owner = np.repeat(np.arange(len(intervals)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = first[owner] + position * SLOT_STEP_MINUTES
+    limits = ends[owner]
+    return {duration: candidates[candidates + duration <= limits] for duration in durations}
+
+
+class _SortedIntervals:
+    """Intervalli identificati da event_id, ordinati per inizio (bisect)."""
+
+    def __init__(self):
+        self._by_id: Dict[str, Interval] = {}
+        self._sorted: List[Tuple[int, int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def upsert(self, event_id: str, interval: Interval) -> None:
+        self.remove(event_id)
+        self._by_id[event_id] = interval
+        insort(self._sorted, (interval[0], interval[1], event_id))
+
+    def remove(self, event_id: str) -> None:
+        interval = self._by_id.pop(event_id, None)
+        if interval is not None:
+            del self._sorted[bisect_left(self._sorted, (interval[0], interval[1], event_id))]
+
+    def overlapping(self, start: int, end: int, max_length: int) -> List[Interval]:
+        """Intervalli che si sovrappongono a [start, end), ordinati; max_length limita la ricerca all'indietro."""
+        i = bisect_left(self._sorted, (start - max_length,))
+        result = []
+        for interval_start, interval_end, _ in self._sorted[i:]:
+            if interval_start >= end:
+                break
+            if interval_end > start:
+                result.append((interval_start, interval_end))
+        return result
+
+
+class CalendarAvailability:
+    """Eventi FREE e BUSY di un calendario nella finestra [window_start, window_end)."""
+
+    def __init__(self, window_start: datetime, window_end: datetime):
+        self.window_start = window_start
+        self.window_end = window_end
+        self._free = _SortedIntervals()
+        self._busy = _SortedIntervals()
+        # evento più lungo per tipo: limita la ricerca degli eventi iniziati prima del range
+        self._max_free_length = 0
+        self._max_busy_length = 0
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def covers(self, start_date: datetime, end_date: datetime) -> bool:
+        return self.window_start <= start_date and end_date <= self.window_end
+
+    def remove(self, event_id: str) -> None:
+        self._free.remove(event_id)
+        self._busy.remove(event_id)
+
+    def apply_event(self, event: dict) -> None:
+        """Aggiorna l'indice con un evento Google (creato, modificato o cancellato)."""
+        event_id = event.get("id")
+        if not event_id:
+            return
+
+        self.remove(event_id)
+        start_raw = (event.get("start") or {}).get("dateTime")
+        end_raw = (event.get("end") or {}).get("dateTime")
+        if event.get("status") == "cancelled" or not start_raw or not end_raw:
+            return  # cancellato, o evento all-day (non blocca gli slot, come prima dell'indice)
+        try:
+            start_dt, end_dt = parse_event_datetime(start_raw), parse_event_datetime(end_raw)
+        except ValueError:
+            return
+
+        if event.get("transparency") == "transparent":
+            # FREE: solo i minuti interamente liberi
+            interval = (_to_minutes(start_dt, ceil=True), _to_minutes(end_dt))
+            if interval[0] < interval[1]:
+                self._free.upsert(event_id, interval)
+                self._max_free_length = max(self._max_free_length, interval[1] - interval[0])
+        else:
+            # BUSY: ogni minuto toccato è occupato
+            interval = (_to_minutes(start_dt), _to_minutes(end_dt, ceil=True))
+            if interval[0] < interval[1]:
+                self._busy.upsert(event_id, interval)
+                self._max_busy_length = max(self._max_busy_length, interval[1] - interval[0])
+
+    def free_intervals(self, start_date: datetime, end_date: datetime) -> List[Interval]:
+        """Intervalli disponibili (FREE uniti, meno BUSY) ritagliati su [start_date, end_date), in minuti UTC."""
+        start, end = _to_minutes(start_date, ceil=True), _to_minutes(end_date)
+        free = merge_intervals(self._free.overlapping(start, end, self._max_free_length))
+        busy = merge_intervals(self._busy.overlapping(start, end, self._max_busy_length))
+        clipped = [(max(s, start), min(e, end)) for s, e in subtract_intervals(free, busy)]
+        return [(s, e) for s, e in clipped if s < e]
+
+    def free_slots_by_duration(
+        self, start_date: datetime, end_date: datetime, durations: List[int]
+    ) -> Dict[int, List[Dict[str, str]]]:
+        """Slot liberi per ogni durata (minuti), con un solo calcolo degli intervalli e dei candidati."""
+        starts_by_duration = slot_starts_by_duration(self.free_intervals(start_date, end_date), durations)
+        return {
+            duration: [
+                {
+                    "start": _from_minutes(int(m)).isoformat(),
+                    "end": _from_minutes(int(m) + duration).isoformat(),
+                }
+                for m in starts
+            ]
+            for duration, starts in starts_by_duration.items()
+        }
+
+    def free_slots(self, start_date: datetime, end_date: datetime, required_duration: int) -> List[Dict[str, str]]:
+        return self.free_slots_by_duration(start_date, end_date, [required_duration])[required_duration]
+
+
+availability_index = ReadThroughCache(
+    ttl_seconds=settings.AVAILABILITY_INDEX_TTL_SECONDS, max_size=settings.AVAILABILITY_INDEX_MAX_CALENDARS
+)
+
+
+def apply_calendar_event(calendar_id: str, event: dict) -> None:
+    """
+    Applica all'indice un evento cambiato (webhook o scrittura locale).
+    Se il calendario non è in memoria ma ne è in corso il caricamento, il caricamento viene
+    scartato: potrebbe non contenere questa modifica.
+    """
+    availability = availability_index.peek(calendar_id)
+    if availability is None:
+        availability_index.invalidate(calendar_id)
+        return
+    availability.apply_event(event)
+
+
+async def _load_calendar_availability(
+    manager: "CalendarManager", window_start: datetime, window_end: datetime
+) -> CalendarAvailability:
+    events = await manager.list_events_in_range(window_start, window_end)
+    availability = CalendarAvailability(window_start, window_end)
+    for event in events:
+        availability.apply_event(event)
+    logger.info(
+        f"Indice disponibilità {manager.calendar_id}: {len(availability)} eventi FREE "
+        f"({window_start.date()} → {window_end.date()})"
+    )
+    return availability
+
+
+async def get_calendar_availability(
+    manager: "CalendarManager", start_date: datetime, end_date: datetime
+) -> CalendarAvailability:
+    """Indice del calendario che copre [start_date, end_date], caricato da Google solo se assente o scaduto."""
+    calendar_id = manager.calendar_id
+    availability = availability_index.peek(calendar_id)
+    if availability is not None and availability.covers(start_date, end_date):
+        return availability
+
+    if availability is not None:
+        # finestra non coperta (es. settimana oltre l'orizzonte): si ricarica a partire da start_date
+        availability_index.invalidate(calendar_id)
+    window_end = max(end_date, start_date + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS))
+    availability = await availability_index.get(
+        calendar_id, lambda: _load_calendar_availability(manager, start_date, window_end)
+    )
+    if not availability.covers(start_date, end_date):
+        # caricamento concorrente partito con un'altra finestra
+        availability = await _load_calendar_availability(manager, start_date, window_end)
+        availability_index.set(calendar_id, availability)
+    return availability
+
+
+def _event_body(summary: str, start: str, end: str, attendees=None, transparency="opaque") -> dict:
+    """Body di events.insert; attendees: email o dict già nel formato Google (es. con responseStatus)."""
+    body = {
+        "summary": summary,
+        "start": {"dateTime": start, "timeZone": "Europe/Rome"},
+        "end": {"dateTime": end, "timeZone": "Europe/Rome"},
+        "transparency": transparency,
+    }
+    if attendees:
+        body["attendees"] = [a if isinstance(a, dict) else {"email": a} for a in attendees]
+    return body
+
+
+def _is_gone(error: BaseException) -> bool:
+    """Errore Google "evento non trovato / già cancellato" (404 o 410)."""
+    res = getattr(error, "res", None)
+    return isinstance(error, HTTPError) and res is not None and res.status_code in (404, 410)
+
+
 class CalendarManager:
     def __init__(self, user_email: str, calendar_id: str):
         self.user_email = user_email
         self.calendar_id = calendar_id
 
-    def _creds(self):
-        info = json.loads(settings.CALENDAR_SERVICE)
-        return ServiceAccountCreds(scopes=SCOPES, **info, subject=self.user_email)
-
-    async def _client(self):
-        return Aiogoogle(service_account_creds=self._creds())
+    def _client(self) -> Aiogoogle:
+        return get_google_client(self.user_email)
 
     # ---------------------------------------------------------
     # CREATE EVENT
@@ -59,22 +410,11 @@ class CalendarManager:
         - summary = "FREE" o "BUSY"
         - transparency = "transparent" (FREE) o "opaque" (BUSY)
         """
-        attendees = attendees or []
-
-        async with await self._client() as ag:
-            api = await ag.discover("calendar", "v3")
-
-            body = {
-                "summary": summary,
-                "start": {"dateTime": start, "timeZone": "Europe/Rome"},
-                "end": {"dateTime": end, "timeZone": "Europe/Rome"},
-                "transparency": transparency,
-            }
-
-            if attendees:
-                body["attendees"] = [{"email": a} for a in attendees]
-
-            return await ag.as_service_account(api.events.insert(calendarId=self.calendar_id, json=body))
+        api = await get_calendar_api()
+        body = _event_body(summary, start, end, attendees, transparency)
+        event = await self._client().as_service_account(api.events.insert(calendarId=self.calendar_id, json=body))
+        apply_calendar_event(self.calendar_id, event)
+        return event
 
     async def create_free_slot(self, start: str, end: str):
         return await self.create_event(summary="FREE", start=start, end=end, transparency="transparent")
@@ -84,8 +424,8 @@ class CalendarManager:
         # 1. Parsing start/end
         # -------------------------
         try:
-            start_dt = _parse_event_datetime(start)
-            end_dt = _parse_event_datetime(end)
+            start_dt = parse_event_datetime(start)
+            end_dt = parse_event_datetime(end)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid datetime format")
 
@@ -96,90 +436,149 @@ class CalendarManager:
         # 2. Verifica che il subslot sia libero e multiplo della product unit duration
         # -------------------------
         call_duration = int((end_dt - start_dt).total_seconds() // 60)
-        if call_duration % product_unit_duration == 0:
-            raise HTTPException(status_code=400, detail="Start must be < end")
-        free_slots = await self.list_free_slots_by_period_and_duration(
-            start_date=start_dt, end_date=end_dt, required_duration=call_duration
-        )
-
-        # Deve esserci uno slot che combacia
-        slot_ok = any(
-            s["start"] == start_dt.replace(tzinfo=None).isoformat(timespec="seconds") + "Z"
-            and s["end"] == end_dt.replace(tzinfo=None).isoformat(timespec="seconds") + "Z"
-            for s in free_slots
-        )
-        if not slot_ok:
+        if call_duration % product_unit_duration != 0:
+            raise HTTPException(
+                status_code=400, detail=f"La durata deve essere un multiplo di {product_unit_duration} minuti"
+            )
+        # lo slot deve iniziare alle :00 o alle :30, come quelli di list_free_slots_by_period_and_duration;
+        # la disponibilità si verifica sugli eventi reali di Google (punto 3), non sull'indice locale
+        if _ceil_half_hour(start_dt) != start_dt:
             raise HTTPException(400, "Lo slot non è disponibile")
 
         # -------------------------
-        # 3. Recupera l'evento FREE che contiene lo slot
+        # 3. Recupera gli eventi FREE che coprono lo slot
         # -------------------------
+        # come nell'indice (CalendarAvailability.free_intervals) gli eventi FREE adiacenti o
+        # sovrapposti valgono come un unico intervallo, e nessun evento BUSY deve toccare lo slot
         events = await self.list_events_in_range(start_dt, end_dt)
-        container_event = None
+        free_events = []
 
         for e in events:
-            if e.get("transparency") != "transparent":
+            if e.get("status") == "cancelled":
                 continue
             s_raw = e.get("start", {}).get("dateTime")
             e_raw = e.get("end", {}).get("dateTime")
             if not s_raw or not e_raw:
                 continue
 
-            evt_start = _parse_event_datetime(s_raw)
-            evt_end = _parse_event_datetime(e_raw)
+            evt_start = parse_event_datetime(s_raw)
+            evt_end = parse_event_datetime(e_raw)
+            if evt_end <= start_dt or evt_start >= end_dt:
+                continue
 
-            # contiene?
-            if evt_start <= start_dt and evt_end >= end_dt:
-                container_event = (e, evt_start, evt_end)
+            if e.get("transparency") != "transparent":
+                raise HTTPException(409, "Lo slot non è più disponibile")
+            free_events.append((e, evt_start, evt_end))
+
+        # copertura: gli eventi FREE, ordinati per inizio, non devono lasciare buchi nello slot
+        covered_until = start_dt
+        for _, evt_start, evt_end in sorted(free_events, key=lambda x: x[1]):
+            if evt_start > covered_until:
                 break
+            covered_until = max(covered_until, evt_end)
 
-        if container_event is None:
+        if covered_until < end_dt:
             raise HTTPException(409, "Lo slot non è più disponibile")
 
-        event_obj, evt_start, evt_end = container_event
-        event_id = event_obj["id"]
+        evt_start = min(x[1] for x in free_events)
+        evt_end = max(x[2] for x in free_events)
 
         # -------------------------
-        # 6. Cancella l'evento FREE originale
+        # 4. Crea i nuovi eventi (BUSY + FREE prima/dopo) in parallelo
         # -------------------------
-        await self.delete_event(event_id)
+        # i nuovi eventi vengono creati PRIMA di cancellare i FREE originali: finché i FREE non sono
+        # cancellati lo slot risulta occupato (BUSY sovrapposto), e un errore si annulla senza
+        # ricreare nulla
+        new_bodies = [
+            _event_body(
+                summary=f"Smartalk call - {product_name}",
+                start=start_dt.isoformat(),
+                end=end_dt.isoformat(),
+                attendees=[
+                    {"email": self.user_email, "responseStatus": "accepted"},
+                    {"email": student_email, "responseStatus": "accepted"},
+                ],
+                transparency="opaque",
+            )
+        ]
+        if evt_start < start_dt:
+            new_bodies.append(
+                _event_body("FREE", evt_start.isoformat(), start_dt.isoformat(), transparency="transparent")
+            )
+        if end_dt < evt_end:
+            new_bodies.append(_event_body("FREE", end_dt.isoformat(), evt_end.isoformat(), transparency="transparent"))
+
+        created, errors = await self._insert_events(new_bodies)
+        if errors:
+            logger.error(f"book_call {self.calendar_id}: creazione eventi fallita, rollback: {errors[0]!r}")
+            await self._rollback_booking(created, [])
+            raise HTTPException(502, "Prenotazione non riuscita, riprova")
 
         # -------------------------
-        # 7. Crea i 3 nuovi eventi
+        # 5. Cancella gli eventi FREE originali
         # -------------------------
-
-        # FREE PRIMA
-        if evt_start < start_dt:
-            await self.create_free_slot(start=evt_start.isoformat(), end=start_dt.isoformat())
-
-        # EVENTO BUSY
-        event_busy = await self.create_event(
-            summary=f"Smartalk call - {product_name}",
-            start=start_dt.isoformat(),
-            end=end_dt.isoformat(),
-            attendees=[
-                {"email": self.user_email, "responseStatus": "accepted"},
-                {"email": student_email, "responseStatus": "accepted"},
-            ],
-            transparency="opaque",
+        # un FREE già cancellato (404/410) vuol dire che un'altra prenotazione l'ha appena usato
+        originals = [e for e, _, _ in free_events]
+        deleted, errors = await self._delete_events([e["id"] for e in originals])
+        if errors:
+            await self._rollback_booking(created, [e for e in originals if e["id"] in deleted])
+            if all(_is_gone(error) for error in errors):
+                raise HTTPException(409, "Lo slot non è più disponibile")
+            logger.error(f"book_call {self.calendar_id}: cancellazione FREE fallita, rollback: {errors[0]!r}")
+            raise HTTPException(502, "Prenotazione non riuscita, riprova")
+
+        return int(call_duration / product_unit_duration), start_dt, end_dt, created[0]["id"]
+
+    async def _insert_events(self, bodies: List[dict]) -> Tuple[List[dict], List[BaseException]]:
+        """Crea gli eventi in parallelo: (eventi creati, nell'ordine di bodies; errori)."""
+        api = await get_calendar_api()
+        client = self._client()
+        results = await asyncio.gather(
+            *[client.as_service_account(api.events.insert(calendarId=self.calendar_id, json=b)) for b in bodies],
+            return_exceptions=True,
         )
-        event_id = event_busy["id"]
-
-        # FREE DOPO
-        if end_dt < evt_end:
-            await self.create_free_slot(start=end_dt.isoformat(), end=evt_end.isoformat())
-
-        return int(call_duration / product_unit_duration), start_dt, end_dt, event_id
+        created = [r for r in results if not isinstance(r, BaseException)]
+        for event in created:
+            apply_calendar_event(self.calendar_id, event)
+        return created, [r for r in results if isinstance(r, BaseException)]
+
+    async def _delete_events(self, event_ids: List[str]) -> Tuple[List[str], List[BaseException]]:
+        """Cancella gli eventi in parallelo: (id cancellati, errori)."""
+        api = await get_calendar_api()
+        client = self._client()
+        results = await asyncio.gather(
+            *[client.as_service_account(api.events.delete(calendarId=self.calendar_id, eventId=i)) for i in event_ids],
+            return_exceptions=True,
+        )
+        deleted = [i for i, r in zip(event_ids, results) if not isinstance(r, BaseException)]
+        for event_id in deleted:
+            apply_calendar_event(self.calendar_id, {"id": event_id, "status": "cancelled"})
+        return deleted, [r for r in results if isinstance(r, BaseException)]
+
+    async def _rollback_booking(self, created: List[dict], deleted_originals: List[dict]) -> None:
+        """Annulla una prenotazione a metà: cancella gli eventi creati e ricrea i FREE originali già cancellati."""
+        restore = [
+            _event_body(
+                e.get("summary", "FREE"), e["start"]["dateTime"], e["end"]["dateTime"], transparency="transparent"
+            )
+            for e in deleted_originals
+        ]
+        (_, delete_errors), (_, restore_errors) = await asyncio.gather(
+            self._delete_events([e["id"] for e in created]), self._insert_events(restore)
+        )
+        for error in delete_errors + restore_errors:
+            logger.error(f"book_call {self.calendar_id}: rollback incompleto: {error!r}")
 
     # ---------------------------------------------------------
     # UPDATE EVENT (FREE → BUSY, aggiungere meet link, ecc.)
     # ---------------------------------------------------------
     async def update_event(self, event_id: str, **fields):
-        async with await self._client() as ag:
-            api = await ag.discover("calendar", "v3")
-            return await ag.as_service_account(
-                api.events.patch(calendarId=self.calendar_id, eventId=event_id, json=fields)
-            )
+        api = await get_calendar_api()
+        event = await self._client().as_service_account(
+            api.events.patch(calendarId=self.calendar_id, eventId=event_id, json=fields)
+        )
+        apply_calendar_event(self.calendar_id, event)
+        return event
 
     async def convert_free_to_busy(self, event_id: str, meet_link=None):
         update_payload = {
@@ -195,116 +594,63 @@ class CalendarManager:
     # DELETE EVENT
     # ---------------------------------------------------------
     async def delete_event(self, event_id: str):
-        async with await self._client() as ag:
-            api = await ag.discover("calendar", "v3")
-            return await ag.as_service_account(api.events.delete(calendarId=self.calendar_id, eventId=event_id))
+        api = await get_calendar_api()
+        result = await self._client().as_service_account(
+            api.events.delete(calendarId=self.calendar_id, eventId=event_id)
+        )
+        apply_calendar_event(self.calendar_id, {"id": event_id, "status": "cancelled"})
+        return result
 
     # ---------------------------------------------------------
     # LIST EVENTS
     # ---------------------------------------------------------
     async def list_events_in_range(self, start_date: datetime, end_date: datetime):
-        async with await self._client() as ag:
-            api = await ag.discover("calendar", "v3")
-
-            resp = await ag.as_service_account(
-                api.events.list(
-                    calendarId=self.calendar_id,
-                    timeMin=start_date.astimezone(timezone.utc).isoformat(),
-                    timeMax=end_date.astimezone(timezone.utc).isoformat(),
-                    singleEvents=True,
-                    orderBy="startTime",
-                )
+        api = await get_calendar_api()
+
+        events = []
+        page_token = None
+        while True:
+            params = dict(
+                calendarId=self.calendar_id,
+                timeMin=start_date.astimezone(timezone.utc).isoformat(),
+                timeMax=end_date.astimezone(timezone.utc).isoformat(),
+                singleEvents=True,
+                orderBy="startTime",
+                maxResults=2500,
             )
-
-            return resp.get("items", [])
+            if page_token:
+                params["pageToken"] = page_token
+            resp = await self._client().as_service_account(api.events.list(**params))
+            events.extend(resp.get("items", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return events
 
     async def list_free_slots_by_period_and_duration(
         self, start_date: datetime, end_date: datetime, required_duration: int
     ) -> List[Dict[str, str]]:
         """
-        Ritorna tutti gli slot FREE compresi nel range richiesto:
-        - recupera eventi con transparency == "transparent"
-        - individua i sotto intervalli con
-            - durata >= required_duration (minuti)
+        Ritorna tutti gli slot FREE compresi nel range richiesto, dall'indice locale:
+        - unione degli eventi FREE (transparency == "transparent") meno gli eventi BUSY,
+          ritagliata sul range
+        - sotto intervalli di durata required_duration (minuti)
             - lo start deve essere esattamente alle :00 o :30
-            - risultati in timestamp ISO UTC (Z)
+            - risultati in timestamp ISO UTC
         """
+        availability = await get_calendar_availability(self, start_date, end_date)
+        return availability.free_slots(start_date, end_date, required_duration)
 
-        events = await self.list_events(start_date, end_date)
-        free_slots: List[Dict[str, str]] = []
-
-        # durata richiesta come oggetto timedelta
-        slot_delta = timedelta(minutes=required_duration)
-
-        for event in events:
-            # deve essere uno slot FREE
-            if event.get("transparency") != "transparent":
-                continue
-
-            start_raw = event.get("start", {}).get("dateTime")
-            end_raw = event.get("end", {}).get("dateTime")
-            if not start_raw or not end_raw:
-                continue
-
-            try:
-                start_dt = _parse_event_datetime(start_raw)
-                end_dt = _parse_event_datetime(end_raw)
-            except Exception:
-                continue
-
-            # il range deve essere completamente contenuto tra start_date e end_date
-            if start_dt < start_date or end_dt > end_date:
-                continue
-
-            # durata minima richiesta
-            duration_minutes = (end_dt - start_dt).total_seconds() / 60
-            if duration_minutes < required_duration:
-                continue
-
-            # genera i sotto-intervalli all'interno dello slot FREE
-            current = start_dt
-
-            # allinea il primo slot alla prossima mezz’ora
-            minute = current.minute
-            if minute not in (0, 30):
-                if minute < 30:
-                    current = current.replace(minute=30, second=0, microsecond=0)
-                else:
-                    # minute > 30 → vai all'ora successiva
-                    current = current.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-
-                # ora generiamo slot che iniziano a :00 o :30
-                while True:
-                    sub_start = current
-                    sub_end = current + slot_delta
-
-                    # se il sottoslot supera l'evento FREE → fine
-                    if sub_end > end_dt:
-                        break
-
-                    # se il sottoslot è fuori dal range richiesto → salta
-                    if sub_start < start_date or sub_end > end_date:
-                        current += timedelta(minutes=30)
-                        continue
-
-                    # aggiungi sottoslot
-                    free_slots.append(
-                        {
-                            "start": sub_start.astimezone(timezone.utc).isoformat(),
-                            "end": sub_end.astimezone(timezone.utc).isoformat(),
-                        }
-                    )
-
-                    # passo al prossimo inizio (:00 → :30 → +1 ora → :00 → ...)
-                    current += timedelta(minutes=30)
-
-        return free_slots
+    async def list_free_slots_by_durations(
+        self, start_date: datetime, end_date: datetime, durations: List[int]
+    ) -> Dict[int, List[Dict[str, str]]]:
+        """Come list_free_slots_by_period_and_duration, per più durate con un solo calcolo."""
+        availability = await get_calendar_availability(self, start_date, end_date)
+        return availability.free_slots_by_duration(start_date, end_date, durations)
 
     # ---------------------------------------------------------
     # READ ATTENDEES
     # ---------------------------------------------------------
     async def get_event_attendees(self, event_id: str):
-        async with await self._client() as ag:
-            api = await ag.discover("calendar", "v3")
-            event = await ag.as_service_account(api.events.get(calendarId=self.calendar_id, eventId=event_id))
-            return event.get("attendees", [])
+        api = await get_calendar_api()
+        event = await self._client().as_service_account(api.events.get(calendarId=self.calendar_id, eventId=event_id))
+        return event.get("attendees", [])
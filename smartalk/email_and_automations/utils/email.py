@@ -6,9 +6,9 @@ from typing import Any, Dict, Optional
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from starlette.templating import Jinja2Templates
-from weasyprint import HTML
 
 from smartalk.core.settings import settings
+from smartalk.email_and_automations.utils.pdf_renderer import render_pdf
 
 # ==========================
 # CONFIGURAZIONE
@@ -85,7 +85,7 @@ def build_email_with_pdf(
                 pdf_file["pdf_bytes"],
                 maintype="application",
                 subtype="pdf",
-                filename=pdf_file["pdf_filename"],
+                filename=pdf_file["filename"],
             )
 
     raw_bytes = msg.as_bytes()
@@ -122,5 +122,6 @@ def send_gmail_message_with_pdf(
 def generate_pdf_bytes_from_html(html_content: str) -> bytes:
     """
     Genera il PDF in memoria (bytes) a partire dall'HTML.
+    Sincrono: dal codice async usare pdf_renderer.render_pdf_bytes.
     """
-    return HTML(string=html_content).write_pdf()
+    return render_pdf(html_content)
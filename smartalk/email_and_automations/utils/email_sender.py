@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import random
+import threading
+from typing import Any, AsyncIterable, Dict, List, Optional, Protocol
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from smartalk.core.settings import settings
+from smartalk.email_and_automations.utils.email import get_gmail_service
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# TRASPORTI
+# ==========================
+
+
+class EmailTransportError(Exception):
+    """
+    Errore di invio; status è il codice HTTP (se disponibile) usato per decidere il retry.
+    connection_error: errore di rete (socket, SSL, timeout), sempre ritentabile.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, connection_error: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.connection_error = connection_error
+
+    @property
+    def retryable(self) -> bool:
+        return self.connection_error or self.status == 429 or (self.status is not None and self.status >= 500)
+
+
+class EmailTransport(Protocol):
+    async def send(self, raw_b64: str) -> Dict[str, Any]:
+        """Invia un messaggio MIME già codificato base64url (campo "raw" di Gmail API)."""
+        ...
+
+
+class GmailApiTransport:
+    """
+    Trasporto reale via Gmail API. Il client googleapiclient è sincrono e non thread-safe:
+    ogni thread del pool usa il proprio service, e la chiamata gira fuori dall'event loop.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = get_gmail_service()
+            self._local.service = service
+        return service
+
+    def _send_sync(self, raw_b64: str) -> Dict[str, Any]:
+        try:
+            return self._service().users().messages().send(userId="me", body={"raw": raw_b64}).execute()
+        except HttpError as e:
+            raise EmailTransportError(str(e), status=e.resp.status) from e
+        except (OSError, httplib2.HttpLib2Error) as e:
+            # OSError copre socket, SSL e TimeoutError
+            raise EmailTransportError(repr(e), connection_error=True) from e
+        except Exception as e:
+            # es. RefreshError del token OAuth: non ritentabile
+            raise EmailTransportError(repr(e)) from e
+
+    async def send(self, raw_b64: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._send_sync, raw_b64)
+
+
+class InMemoryTransport:
+    """
+    Trasporto finto per test e benchmark: conserva i messaggi in memoria.
+    latency simula il round trip, failures è una lista di status HTTP restituiti
+    (in ordine) prima dei successi, es. [429, 503].
+    """
+
+    def __init__(self, latency: float = 0.0, failures: Optional[List[int]] = None):
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.sent: List[str] = []
+
+    async def send(self, raw_b64: str) -> Dict[str, Any]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failures:
+            status = self.failures.pop(0)
+            raise EmailTransportError(f"simulated HTTP {status}", status=status)
+        self.sent.append(raw_b64)
+        return {"id": f"fake-{len(self.sent)}"}
+
+
+def get_email_transport() -> EmailTransport:
+    """Trasporto configurato in settings.EMAIL_TRANSPORT ("gmail" | "memory")."""
+    if settings.EMAIL_TRANSPORT == "memory":
+        return InMemoryTransport()
+    return GmailApiTransport()
+
+
+# ==========================
+# INVIO CON RETRY E CONCORRENZA LIMITATA
+# ==========================
+
+
+async def send_with_retry(
+    transport: EmailTransport,
+    raw_b64: str,
+    max_retries: Optional[int] = None,
+    base_delay: float = 0.5,
+) -> Dict[str, Any]:
+    """Invia un messaggio; su 429/5xx riprova con backoff esponenziale e jitter."""
+    max_retries = settings.EMAIL_SEND_MAX_RETRIES if max_retries is None else max_retries
+
+    for attempt in range(max_retries + 1):
+        try:
+            return await transport.send(raw_b64)
+        except EmailTransportError as e:
+            if not e.retryable or attempt == max_retries:
+                raise
+            delay = min(base_delay * 2**attempt, 30) * random.uniform(0.5, 1.5)
+            reason = f"HTTP {e.status}" if e.status is not None else e
+            logger.warning(f"Invio email fallito ({reason}), nuovo tentativo tra {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def send_messages(
+    messages: AsyncIterable[Dict[str, Any]],
+    transport: Optional[EmailTransport] = None,
+    max_concurrency: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Consuma uno stream di messaggi {"raw": str, ...} e li invia appena arrivano,
+    al massimo max_concurrency alla volta. Un invio fallito non blocca gli altri:
+    ogni risultato riporta "success" e, in caso di errore, "error".
+    Gli altri campi del messaggio (es. client_id) vengono riportati nel risultato.
+    """
+    transport = transport or get_email_transport()
+    semaphore = asyncio.Semaphore(max_concurrency or settings.EMAIL_SEND_MAX_CONCURRENCY)
+
+    async def send_one(message: Dict[str, Any]) -> Dict[str, Any]:
+        info = {k: v for k, v in message.items() if k != "raw"}
+        try:
+            async with semaphore:
+                sent = await send_with_retry(transport, message["raw"])
+            return {**info, "success": True, "message_id": sent.get("id")}
+        except EmailTransportError as e:
+            logger.error(f"Invio email fallito definitivamente ({info}): {e}")
+            return {**info, "success": False, "error": str(e)}
+        except Exception as e:
+            # trasporto che solleva altro: l'errore non deve far fallire gli invii già riusciti
+            logger.exception(f"Invio email fallito per un errore imprevisto ({info})")
+            return {**info, "success": False, "error": repr(e)}
+
+    tasks = []
+    try:
+        async for message in messages:
+            tasks.append(asyncio.create_task(send_one(message)))
+    except BaseException:
+        # lo stream si è interrotto: niente invii "orfani"
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return list(await asyncio.gather(*tasks))
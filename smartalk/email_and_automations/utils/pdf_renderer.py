@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from smartalk.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# POOL DI PROCESSI PER WEASYPRINT
+# ==========================
+#
+# WeasyPrint è CPU-bound e sincrono: eseguito nell'event loop blocca tutte le richieste.
+# Il rendering viene quindi spostato in un pool di processi (uno per processo dell'app),
+# avviato e "scaldato" nel lifespan e chiuso allo shutdown.
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+# limita i render in coda (ogni richiesta porta con sé l'HTML serializzato)
+_pdf_semaphore: Optional[asyncio.Semaphore] = None
+
+WARM_UP_HTML = "<html><body><p>warm up</p></body></html>"
+
+
+def render_pdf(html_content: str) -> bytes:
+    """Eseguita nel processo worker: genera il PDF in memoria (bytes) a partire dall'HTML."""
+    from weasyprint import HTML
+
+    return HTML(string=html_content).write_pdf()
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Restituisce il pool di render, creandolo se non ancora avviato (es. script fuori dall'app)."""
+    global _pdf_executor, _pdf_semaphore
+
+    if _pdf_executor is None:
+        # "spawn": i worker non ereditano event loop, thread e connessioni del processo principale
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=settings.PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _pdf_semaphore = asyncio.Semaphore(settings.PDF_RENDER_WORKERS * 2)
+        logger.info(f"Pool di render PDF avviato ({settings.PDF_RENDER_WORKERS} processi)")
+    return _pdf_executor
+
+
+async def start_pdf_render_pool() -> None:
+    """Avvia il pool e fa un render di prova per worker: import di WeasyPrint e font caricati una volta sola."""
+    executor = get_pdf_executor()
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(
+            *[loop.run_in_executor(executor, render_pdf, WARM_UP_HTML) for _ in range(settings.PDF_RENDER_WORKERS)]
+        )
+    except Exception as e:
+        # il pool resta utilizzabile: l'errore si ripresenterà al primo render reale
+        logger.warning(f"Warm up del pool di render PDF fallito: {e}")
+
+
+def shutdown_pdf_render_pool() -> None:
+    global _pdf_executor, _pdf_semaphore
+
+    executor = _pdf_executor
+    _pdf_executor = None
+    _pdf_semaphore = None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def render_pdf_bytes(html_content: str) -> bytes:
+    """Genera il PDF nel pool di processi senza bloccare l'event loop."""
+    executor = get_pdf_executor()
+    loop = asyncio.get_running_loop()
+    async with _pdf_semaphore:
+        return await loop.run_in_executor(executor, render_pdf, html_content)
@@ -1,4 +1,6 @@
+import asyncio
 import datetime
+import time
 import uuid
 from typing import Any, Dict, Optional
 
@@ -9,13 +11,15 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
 
+from smartalk.core.cache import TTLCache
 from smartalk.core.dynamodb import get_dynamodb_connection
 from smartalk.core.settings import settings
 from smartalk.db_usage.dynamodb_auth import (
     create_user_if_not_exists,
+    get_cached_user_by_id,
     get_user_by_email,
     normalize_email,
-    verify_password,
+    verify_password_async,
 )
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -44,6 +48,57 @@ class TokenResponse(BaseModel):
     name: str
 
 
+# -------------------------------------------------
+# LIMITI LOGIN
+# -------------------------------------------------
+
+# Password errate recenti per (IP client, email) (timestamp monotonic), scadono con la finestra.
+# Si contano solo i fallimenti su utenti esistenti: chi conosce un indirizzo non può bloccarne
+# il login da un altro IP, e le email inesistenti non riempiono la cache. Le raffiche di
+# tentativi sono già limitate da login_semaphore.
+login_failures = TTLCache(ttl_seconds=settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS, max_size=10000)
+# Verifiche bcrypt contemporanee per processo
+login_semaphore = asyncio.Semaphore(settings.LOGIN_MAX_CONCURRENCY)
+
+
+def _recent_login_failures(key: tuple, now: float) -> list:
+    window = settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS
+    return [t for t in login_failures.get(key, []) if now - t < window]
+
+
+def check_login_rate(key: tuple) -> None:
+    """429 se key (IP client, email) ha superato LOGIN_RATE_LIMIT_ATTEMPTS password errate nella finestra."""
+    now = time.monotonic()
+    failures = _recent_login_failures(key, now)
+
+    if len(failures) >= settings.LOGIN_RATE_LIMIT_ATTEMPTS:
+        retry_after = int(settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS - (now - failures[0])) + 1
+        raise HTTPException(
+            status_code=429, detail="Too many login attempts.", headers={"Retry-After": str(retry_after)}
+        )
+
+
+def record_login_failure(key: tuple) -> None:
+    """Registra una password errata per key (IP client, email)."""
+    now = time.monotonic()
+    failures = _recent_login_failures(key, now)
+    failures.append(now)
+    login_failures.set(key, failures)
+
+
+async def verify_login_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifica bcrypt con concorrenza limitata: se la coda non si libera in tempo risponde 429."""
+    try:
+        await asyncio.wait_for(login_semaphore.acquire(), timeout=settings.LOGIN_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=429, detail="Too many concurrent logins.", headers={"Retry-After": "1"})
+
+    try:
+        return await verify_password_async(plain_password, hashed_password)
+    finally:
+        login_semaphore.release()
+
+
 # -------------------------------------------------
 # UTILITY TOKEN
 # -------------------------------------------------
@@ -69,22 +124,39 @@ def decode_jwt_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def get_token_claims(request: Request) -> Dict[str, Any] | None:
+    """Restituisce i claim del JWT (firma verificata) presente nell'header Authorization."""
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+        return decode_jwt_token(token)
+    return None
+
+
+def has_user_type_claim(request: Request, user_type: str) -> bool:
+    """
+    Controllo di ruolo basato solo sui claim del JWT firmato (nessuna lettura su USERS).
+    Usato dai validatori di accesso quando AUTH_TRUST_JWT_CLAIMS è attivo.
+    """
+    payload = get_token_claims(request)
+    return bool(payload) and payload.get("user_type") == user_type
+
+
 async def get_current_user(request: Request, DBDependency: Any = DBDependency) -> Dict[str, Any] | None:
     """
     Dipendenza FastAPI per ottenere l'utente autenticato dal JWT.
+    L'utente viene letto per id ("sub") passando dalla cache degli utenti.
     """
     user = None
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        payload = decode_jwt_token(token)
+    payload = get_token_claims(request)
+    if payload:
         user_id = payload.get("sub")
         email = payload.get("email")
         user_type = payload.get("user_type")
 
         if user_id and email and user_type:
-            user = await get_user_by_email(email, DBDependency)
-            if not user or user.get("id") != user_id or user.get("user_type") != user_type:
+            user = await get_cached_user_by_id(user_id, DBDependency)
+            if not user or user.get("email") != normalize_email(email) or user.get("user_type") != user_type:
                 user = None
 
     return user
@@ -142,19 +214,23 @@ async def signup(req: AuthRequest, DBDependency: Any = DBDependency):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(req: AuthRequest, DBDependency: Any = DBDependency):
+async def login(req: AuthRequest, request: Request, DBDependency: Any = DBDependency):
     """
     Login classico basato su email e password.
     """
     email = normalize_email(req.email)
+    rate_key = (request.client.host if request.client else None, email)
+    check_login_rate(rate_key)
     user = await get_user_by_email(email, DBDependency)
 
     # Errore se non esiste o la password non è corretta
     if not user:
         raise HTTPException(status_code=404, detail="Wrong credentials.")
     else:
-        if not verify_password(req.password, user["password_hash"]):
+        if not await verify_login_password(req.password, user["password_hash"]):
+            record_login_failure(rate_key)
             raise HTTPException(status_code=404, detail="Wrong credentials.")
+        login_failures.invalidate(rate_key)
 
     token = create_jwt_token(user["id"], email, user["user_type"])
     return TokenResponse(
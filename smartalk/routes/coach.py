@@ -5,7 +5,6 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Any, Dict, cast
 
-import pandas as pd
 from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
@@ -15,9 +14,9 @@ from pydantic import EmailStr, TypeAdapter
 from smartalk.core.dynamodb import get_dynamodb_connection
 from smartalk.core.settings import settings
 from smartalk.db_usage import dynamodb_coach
-from smartalk.db_usage.dynamodb_auth import hash_password
-from smartalk.email_and_automations.report_card_sender import run_send_report_cards
-from smartalk.routes.auth import create_token_response, get_current_user
+from smartalk.db_usage.dynamodb_auth import hash_password_async
+from smartalk.email_and_automations.report_card_sender import group_report_cards_by_generator, run_send_report_cards
+from smartalk.routes.auth import create_token_response, get_current_user, has_user_type_claim
 
 router = APIRouter(tags=["Coach Dashboard"], prefix="/api/coach")
 
@@ -40,16 +39,25 @@ def to_decimal(value):
 # ====================================================================
 # VALIDAZIONE TIPO UTENTE (Dependency)
 # ====================================================================
-async def validate_coach_access(user: Dict[str, Any] | None = Depends(get_current_user)) -> Dict[str, Any]:
+async def validate_coach_access(request: Request, DBDependency: Any = DBDependency) -> Dict[str, Any]:
     """Verifica che l'utente loggato sia di tipo 'coach' e restituisce l'oggetto utente completo."""
-    if user.get("user_type") != "coach":
+    # controllo di ruolo sui claim firmati: i rifiuti non leggono USERS
+    if settings.AUTH_TRUST_JWT_CLAIMS and not has_user_type_claim(request, "coach"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato ai coach")
+
+    user = await get_current_user(request, DBDependency)
+    if not user or user.get("user_type") != "coach":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato ai coach")
     return user
 
 
-async def validate_head_coach_access(user: Dict[str, Any] | None = Depends(get_current_user)) -> Dict[str, Any]:
+async def validate_head_coach_access(request: Request, DBDependency: Any = DBDependency) -> Dict[str, Any]:
     """Verifica che l'utente loggato sia di tipo 'coach' e che sia con role "Head Coach". Restituisce l'oggetto utente completo."""
-    if user.get("user_type") != "coach" or user.get("role") != "Head Coach":
+    if settings.AUTH_TRUST_JWT_CLAIMS and not has_user_type_claim(request, "coach"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato a Head Coach")
+
+    user = await get_current_user(request, DBDependency)
+    if not user or user.get("user_type") != "coach" or user.get("role") != "Head Coach":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato a Head Coach")
     return user
 
@@ -285,7 +293,7 @@ async def create_company(
         "id": data["id"],
         "name": data["name"],
         "user_type": "company",
-        "password_hash": hash_password(str(data["password"])),
+        "password_hash": await hash_password_async(str(data["password"])),
     }
     result = await dynamodb_coach.insert_new_company(company, DBDependency)
 
@@ -401,7 +409,6 @@ async def log_call_for_group_endpoint(
     product_id = data["product_id"]
     call_date = datetime.fromisoformat(data["callDate"]).date().isoformat()
 
-    contract_table = await dynamodb_coach.get_table(DBDependency, settings.CONTRACTS_TABLE)
     product = await dynamodb_coach.get_item(DBDependency, settings.PRODUCTS_TABLE, {"product_id": product_id})
 
     assert product["participants"] == len(group), (
@@ -420,6 +427,12 @@ async def log_call_for_group_endpoint(
     group_call = []
     students_already_in_group = []
 
+    # contratti di tutti i partecipanti con un'unica BatchGetItem
+    contracts = await dynamodb_coach.batch_get_items(
+        DBDependency, settings.CONTRACTS_TABLE, [{"contract_id": participant["contract_id"]} for participant in group]
+    )
+    contracts_by_id = {contract["contract_id"]: contract for contract in contracts}
+
     for participant in group:
         contract_id = participant["contract_id"]
         student_id = participant["student_id"]
@@ -429,8 +442,7 @@ async def log_call_for_group_endpoint(
         students_already_in_group.append(student_id)
 
         # check right contract for student, client, product
-        contract_response = await contract_table.get_item(Key={"contract_id": contract_id})
-        contract = contract_response["Item"]
+        contract = contracts_by_id[contract_id]
         assert contract["student_id"] == student_id, f"{student_id} has a different contract"
         assert contract["product_id"] == product_id, f"{student_id} has a different product"
         assert contract["client_id"] == client_id, f"{student_id} is under a different client"
@@ -644,27 +656,44 @@ async def send_all_completed_report_cards(
     if not completed_report_cards:
         raise HTTPException(status_code=400, detail="Empty completed expired report cards")
 
-    completed_report_cards_df = pd.DataFrame.from_dict(completed_report_cards)
-    student_ids = list(completed_report_cards_df["student_id"].unique())
-    client_ids = list(completed_report_cards_df["client_id"].unique())
-    student_names_by_id = {}
-    for student_id in student_ids:
-        student_names_by_id[student_id] = await dynamodb_coach.get_client_name(student_id)
-    client_names_by_id = {}
-    for client_id in client_ids:
-        client_names_by_id[client_id] = await dynamodb_coach.get_client_name(client_id)
+    student_ids = list(dict.fromkeys(report_card["student_id"] for report_card in completed_report_cards))
+    client_ids = list(dict.fromkeys(report_card["client_id"] for report_card in completed_report_cards))
+    names_by_id = await dynamodb_coach.resolve_names(student_ids + client_ids, DBDependency)
+    student_names_by_id = {student_id: names_by_id.get(student_id) for student_id in student_ids}
+    client_names_by_id = {client_id: names_by_id.get(client_id) for client_id in client_ids}
 
     # invio report tramite email (raggruppati per client e periodo)
-    run_send_report_cards(
+    send_results = await run_send_report_cards(
         completed_report_cards,
         student_names_by_id,
         client_names_by_id,
         settings.SENDER,
     )
+    # esito per gruppo (client_id, start_month, end_month): solo i gruppi consegnati vengono marcati come sent,
+    # anche se altri falliscono, così ripetendo l'invio non si rimandano email già consegnate
+    sent_keys = {(r["client_id"], r["start_month"], r["end_month"]) for r in send_results if r["success"]}
+    failed_sends = [result for result in send_results if not result["success"]]
+    sent_report_cards = []
+    unsent_generator_ids = set()
+    for report_card in completed_report_cards:
+        if (report_card.get("client_id"), report_card.get("start_month"), report_card.get("end_month")) in sent_keys:
+            sent_report_cards.append(report_card)
+        else:
+            unsent_generator_ids.add(report_card["report_card_generator_id"])
+
+    report_cards_by_generator = group_report_cards_by_generator(sent_report_cards)
 
-    completed_report_cards_df = completed_report_cards_df[["report_card_generator_id", "report_card_id", "start_month"]]
+    for report_card_generator_id, generator_report_cards in report_cards_by_generator.items():
+        if report_card_generator_id in unsent_generator_ids:
+            # parte dei report card del generator non è partita: metto a sent solo quelli inviati,
+            # il generator avanza al prossimo invio riuscito
+            response = await dynamodb_coach.update_report_cards_to_sent(
+                generator_report_cards, report_card_generator_id, DBDependency
+            )
+            if not response.get("success"):
+                raise HTTPException(status_code=400, detail=response.get("error"))
+            continue
 
-    for report_card_generator_id in completed_report_cards_df["report_card_generator_id"].unique():
         # aggiornamento o eliminazione report card generator
         response = {}
         min_report_card_start_month = await dynamodb_coach.get_min_report_card_start_month_by_report_card_generator_id(
@@ -673,9 +702,7 @@ async def send_all_completed_report_cards(
         if min_report_card_start_month:
             # aggiornamento current_start_month e next_start_month, metto a sent gli attuali report card e creazione eventuale report card no_show
             response = await dynamodb_coach.update_report_card_and_generator(
-                completed_report_cards_df[
-                    completed_report_cards_df["report_card_generator_id"] == report_card_generator_id
-                ][["report_card_id", "start_month"]].to_dict("records"),
+                generator_report_cards,
                 report_card_generator_id,
                 min_report_card_start_month,
                 DBDependency,
@@ -683,17 +710,28 @@ async def send_all_completed_report_cards(
         else:
             # elimino report card generator, metto a sent gli attuali report card
             response = await dynamodb_coach.update_report_card_and_delete_generator(
-                completed_report_cards_df[
-                    completed_report_cards_df["report_card_generator_id"] == report_card_generator_id
-                ][["report_card_id", "start_month"]].to_dict("records"),
+                generator_report_cards,
                 report_card_generator_id,
                 DBDependency,
             )
 
         if not response.get("success"):
-            raise HTTPException(status_code=400, detail=check.get("error"))
-
-    return create_token_response({}, head_coach)
+            raise HTTPException(status_code=400, detail=response.get("error"))
+
+    return create_token_response(
+        {
+            "failed": [
+                {
+                    "client_id": r["client_id"],
+                    "start_month": r["start_month"],
+                    "end_month": r["end_month"],
+                    "error": r.get("error"),
+                }
+                for r in failed_sends
+            ]
+        },
+        head_coach,
+    )
 
 
 # @router.post("/saveDebrief")
@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 
-from smartalk.core.dynamodb import get_dynamodb_connection
+from smartalk.core.dynamodb import dynamodb_connection, get_dynamodb_connection
 from smartalk.core.settings import settings
 from smartalk.db_usage import data_scheduler
 
@@ -34,7 +34,13 @@ def verify_cron_secret(request: Request):
         )
 
 
+async def renew_all_watchers_task():
+    # connessione propria: il task gira dopo la chiusura delle dependency della richiesta
+    async with dynamodb_connection() as db:
+        await data_scheduler.renew_all_watchers(db)
+
+
 @router.post("/renew-watchers", dependencies=[Depends(verify_cron_secret)])
 async def renew_watchers(background: BackgroundTasks):
-    background.add_task(data_scheduler.renew_all_watchers)
+    background.add_task(renew_all_watchers_task)
     return {"status": "ok"}
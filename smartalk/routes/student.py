@@ -1,6 +1,6 @@
 import datetime
 from decimal import Decimal
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.responses import JSONResponse
@@ -9,35 +9,30 @@ from smartalk.core.dynamodb import get_dynamodb_connection, get_table
 from smartalk.core.settings import settings
 from smartalk.db_usage import dynamodb_student
 from smartalk.email_and_automations.utils.calendars_manager import CalendarManager
-from smartalk.routes.auth import create_token_response, get_current_user
+from smartalk.routes.auth import create_token_response, get_current_user, has_user_type_claim
 
 router = APIRouter(prefix="/student", tags=["student"])
 
 DBDependency = Depends(get_dynamodb_connection)
 
 
-async def validate_student_access(user: Dict[str, Any] | None = Depends(get_current_user)) -> Dict[str, Any]:
+async def validate_student_access(request: Request, DBDependency: Any = DBDependency) -> Dict[str, Any]:
     """Verifica che l'utente autenticato sia uno studente."""
 
+    # controllo di ruolo sui claim firmati: i rifiuti non leggono USERS
+    if settings.AUTH_TRUST_JWT_CLAIMS and not has_user_type_claim(request, "student"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato agli studenti")
+
+    user = await get_current_user(request, DBDependency)
     if not user or user.get("user_type") != "student":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accesso riservato agli studenti")
     return user
 
 
-@router.get("/coach_free_slots")
-async def get_coach_free_slots(
-    request: Request,
-    student: Dict[str, Any] = Depends(validate_student_access),
-    DBDependency: Any = DBDependency,
-) -> JSONResponse:
-    """Restituisce gli slot liberi del coach per la settimana richiesta."""
-
-    params = dict(request.query_params)
-    contract_id = params["contract_id"]
-    coach_id = params["coach_id"]
+def parse_week_range(params: Dict[str, str]) -> Tuple[datetime.datetime, datetime.datetime]:
+    """Inizio e fine (UTC) della settimana ISO year/week dei parametri; le settimane passate non sono valide."""
     year = int(params["year"])
     week = int(params["week"])
-    student_id = student["id"]
 
     if week < 1 or week > 53:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Settimana non valida")
@@ -52,13 +47,78 @@ async def get_coach_free_slots(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Anno o settimana non validi")
 
     start_date = datetime.datetime.combine(week_start_date, datetime.time.min, tzinfo=datetime.timezone.utc)
-    end_date = start_date + datetime.timedelta(days=7)
+    return start_date, start_date + datetime.timedelta(days=7)
+
+
+def parse_durations(params: Dict[str, str]) -> Optional[List[int]]:
+    """durations=30,60 → [30, 60]; None se non indicate."""
+    if not params.get("durations"):
+        return None
+    try:
+        return [int(d) for d in params["durations"].split(",") if d.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Durate non valide")
+
+
+@router.get("/coach_free_slots")
+async def get_coach_free_slots(
+    request: Request,
+    student: Dict[str, Any] = Depends(validate_student_access),
+    DBDependency: Any = DBDependency,
+) -> JSONResponse:
+    """
+    Restituisce gli slot liberi del coach per la settimana richiesta.
+    Con durations=30,60 (minuti, multipli della durata del prodotto) anche slots_by_duration,
+    calcolati con una sola lettura della disponibilità.
+    """
+
+    params = dict(request.query_params)
+    contract_id = params["contract_id"]
+    coach_id = params["coach_id"]
+    student_id = student["id"]
+    start_date, end_date = parse_week_range(params)
+    durations = parse_durations(params)
 
-    free_slots = await dynamodb_student.get_free_coach_slots(
-        coach_id, student_id, contract_id, start_date, end_date, DBDependency
+    if durations is None:
+        free_slots = await dynamodb_student.get_free_coach_slots(
+            coach_id, student_id, contract_id, start_date, end_date, DBDependency
+        )
+        return create_token_response({"slots": free_slots}, student)
+
+    slots_by_duration = await dynamodb_student.get_free_coach_slots_by_duration(
+        coach_id, student_id, contract_id, start_date, end_date, DBDependency, durations=durations
+    )
+    return create_token_response(
+        {
+            "slots": next(iter(slots_by_duration.values()), []),
+            "slots_by_duration": {str(d): slots for d, slots in slots_by_duration.items()},
+        },
+        student,
     )
 
-    return create_token_response({"slots": free_slots}, student)
+
+@router.get("/free_slots")
+async def get_free_slots_all_coaches(
+    request: Request,
+    student: Dict[str, Any] = Depends(validate_student_access),
+    DBDependency: Any = DBDependency,
+) -> JSONResponse:
+    """
+    Slot liberi di tutti i coach per la settimana richiesta (contract_id, year, week), per chi
+    non ha preferenze sul coach: ogni slot riporta i coach disponibili (coach_ids).
+    Con durations=30,60 come /coach_free_slots anche slots_by_duration.
+    """
+    params = dict(request.query_params)
+    start_date, end_date = parse_week_range(params)
+    durations = parse_durations(params)
+
+    slots_by_duration = await dynamodb_student.get_free_slots_all_coaches(
+        student["id"], params["contract_id"], start_date, end_date, DBDependency, durations=durations
+    )
+    payload = {"slots": next(iter(slots_by_duration.values()), [])}
+    if durations is not None:
+        payload["slots_by_duration"] = {str(d): slots for d, slots in slots_by_duration.items()}
+    return create_token_response(payload, student)
 
 
 @router.post("/book")
@@ -6,7 +6,9 @@ from typing import Any, Dict
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 
+from smartalk.core.settings import settings
 from smartalk.routes.auth import create_jwt_token, get_current_user
 
 logger = logging.getLogger("Website")
@@ -26,9 +28,13 @@ sections = ["lesson-plans", "homework"]
 # templates dinamici sotto la cartella smartalk/website/templates
 real_templates_folder = "smartalk/website/templates"
 templates = Jinja2Templates(directory=real_templates_folder)
-# reload automatico e cache disabilitata
-templates.env.auto_reload = True
+# cache dei template compilati senza limite di dimensione (i template sono un insieme finito)
 templates.env.cache = {}
+# in sviluppo (TEMPLATES_AUTO_RELOAD=True) i template modificati vengono ricaricati a ogni richiesta;
+# in produzione niente controllo dei file e bytecode su disco, per non ricompilare a ogni riavvio
+templates.env.auto_reload = settings.TEMPLATES_AUTO_RELOAD
+if not settings.TEMPLATES_AUTO_RELOAD:
+    templates.env.bytecode_cache = FileSystemBytecodeCache(settings.TEMPLATES_BYTECODE_CACHE_DIR)
 # |shuffle diventa un filtro disponibile per tutti i template
 templates.env.filters["shuffle"] = lambda seq: random.sample(seq, len(seq))
 # aggiungi la funzione random (utile per servire sempre nuove risorse ai browser e impedire la cache)
@@ -52,6 +58,21 @@ templates.env.filters["pretty_title_page"] = lambda x: pretty_title_page(x)
 ####################################################################################
 
 
+def precompile_templates() -> int:
+    """
+    Compila tutti i template all'avvio (da chiamare nel lifespan), così nessuna richiesta paga
+    la compilazione di base.html, lesson_base.html, _macros.html ecc. Restituisce i template compilati.
+    """
+    compiled = 0
+    for name in templates.env.list_templates(extensions=["html"]):
+        try:
+            templates.env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            logger.error(f"Template {name} non compilabile: {e}")
+    return compiled
+
+
 # funzione per gestire pagine non trovate e eccezioni
 async def get_no_handled_path(request: Request, lang: str = "en"):
     # La 404 non ha una lingua definita, usiamo un fallback
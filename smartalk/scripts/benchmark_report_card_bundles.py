@@ -0,0 +1,92 @@
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from smartalk.email_and_automations.report_card_sender import (
+    group_report_cards_by_client_and_period,
+    group_report_cards_by_generator,
+    render_pdf_html_for_client_and_period,
+)
+
+# ==========================
+# BENCHMARK: PREPARAZIONE DEI BUNDLE DEI REPORT CARD
+# ==========================
+#
+# Misura, su report card sintetici, la parte CPU dell'invio (tutto tranne WeasyPrint e Gmail):
+#   - raggruppamento per (client_id, start_month, end_month) e per report_card_generator_id
+#   - render HTML (Jinja2) di ogni bundle
+# Il tempo per report card deve restare circa costante al crescere di N (costo lineare).
+#   poetry run python -m smartalk.scripts.benchmark_report_card_bundles --sizes 1000 5000 20000
+
+
+def make_report_cards(n: int, students_per_client: int = 15, seed: int = 0) -> Tuple[List[Dict[str, Any]], Dict]:
+    rng = random.Random(seed)
+    n_students = max(1, n // 2)
+    n_clients = max(1, n_students // students_per_client)
+    periods = [("2025-01", "2025-04"), ("2025-04", "2025-07"), ("2025-07", "2025-10")]
+
+    report_cards = []
+    for i in range(n):
+        student_id = f"S{rng.randrange(n_students):05d}"
+        client_id = f"C{int(student_id[1:]) % n_clients:04d}"
+        start_month, end_month = rng.choice(periods)
+        coach_id = rng.choice(["JJ", "EL", "TH", "AB", "CD"])
+        report_cards.append(
+            {
+                "report_card_id": f"{coach_id}#{student_id}#{client_id}#3#{i}",
+                "report_card_generator_id": f"{student_id}#{client_id}#3",
+                "student_id": student_id,
+                "client_id": client_id,
+                "coach_id": coach_id,
+                "start_month": start_month,
+                "end_month": end_month,
+                "attendance": f"{rng.randint(50, 100)}%",
+                "report": "Good progress on grammar and vocabulary. " * rng.randint(1, 5),
+                "report_card_email_recipients": f"hr@{client_id.lower()}.example.com",
+            }
+        )
+    student_names_by_id = {f"S{i:05d}": f"Name{i} Surname{i}" for i in range(n_students)}
+    return report_cards, student_names_by_id
+
+
+def run(n: int, repeat: int) -> Dict[str, float]:
+    report_cards, student_names_by_id = make_report_cards(n)
+    best = {"group": float("inf"), "render": float("inf"), "generators": float("inf")}
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        grouped = group_report_cards_by_client_and_period(report_cards, student_names_by_id)
+        best["group"] = min(best["group"], time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for (client_id, start_month, end_month), client_report_cards in grouped.items():
+            render_pdf_html_for_client_and_period(client_id, f"{start_month} - {end_month}", client_report_cards, "")
+        best["render"] = min(best["render"], time.perf_counter() - started)
+
+        started = time.perf_counter()
+        group_report_cards_by_generator(report_cards)
+        best["generators"] = min(best["generators"], time.perf_counter() - started)
+
+    best["bundles"] = len(grouped)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della preparazione dei bundle dei report card.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni per dimensione (si tiene la migliore)")
+    args = parser.parse_args()
+
+    print(f"{'report cards':>12} {'bundles':>8} {'group ms':>9} {'render ms':>10} {'generators ms':>14} {'µs/card':>8}")
+    for n in args.sizes:
+        r = run(n, args.repeat)
+        total = r["group"] + r["render"] + r["generators"]
+        print(
+            f"{n:>12} {int(r['bundles']):>8} {r['group'] * 1000:>9.1f} {r['render'] * 1000:>10.1f} "
+            f"{r['generators'] * 1000:>14.1f} {total / n * 1e6:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
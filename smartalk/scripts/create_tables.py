@@ -448,6 +448,31 @@ async def _create_calendar_sync_table(db, table_name) -> None:
     )
 
 
+async def _create_counters_table(db, table_name) -> None:
+    """Tabella Counters (contatori atomici per gli ID progressivi, es. CONxxx)."""
+    await db.create_table(
+        TableName=table_name,
+        BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "counter_name", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "counter_name", "AttributeType": "S"}],
+    )
+
+
+async def _create_booking_locks_table(db, table_name) -> None:
+    """Tabella Booking Locks (lock brevi delle prenotazioni, scadenza con TTL su expires_at)."""
+    await db.create_table(
+        TableName=table_name,
+        BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "lock_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "lock_id", "AttributeType": "S"}],
+    )
+    client = db.meta.client
+    await client.get_waiter("table_exists").wait(TableName=table_name)
+    await client.update_time_to_live(
+        TableName=table_name, TimeToLiveSpecification={"Enabled": True, "AttributeName": "expires_at"}
+    )
+
+
 # -------------------------------------------------
 # FUNZIONE PRINCIPALE
 # -------------------------------------------------
@@ -472,6 +497,8 @@ async def ensure_tables(db) -> None:
             settings.DEBRIEFS_TABLE: _create_debriefs_table,
             settings.COMPANY_EMPLOYEES_TABLE: _create_company_employees_table,
             settings.CALENDAR_SYNC_TABLE: _create_calendar_sync_table,
+            settings.COUNTERS_TABLE: _create_counters_table,
+            settings.BOOKING_LOCKS_TABLE: _create_booking_locks_table,
         }
 
         for table_name, create_func in tables_to_create.items():
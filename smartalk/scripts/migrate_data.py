@@ -1,3 +1,5 @@
+import argparse
+import asyncio
 import logging
 import os
 
@@ -7,22 +9,38 @@ import sys
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from math import ceil
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import httpx
 import pandas as pd
 from boto3.dynamodb.conditions import Attr, Key
 from dateutil.relativedelta import relativedelta
-from pydantic import BaseModel, EmailStr, Field, TypeAdapter, ValidationError, field_validator
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, field_validator
 
-from smartalk.db_usage.dynamodb_coach import calculate_max_end_date
+from smartalk.db_usage.dynamodb_coach import calculate_max_end_date, contract_id_allocator
 from smartalk.scripts.create_booking_calendars import USER_TIMEZONES, get_or_create_booking_calendar
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from smartalk.core.dynamodb import clean_dynamo_value, get_item, get_table, get_today_string, to_dynamodb_item
+from smartalk.core.dynamodb import (
+    clean_dynamo_value,
+    dynamodb_connection,
+    get_item,
+    get_table,
+    get_today_string,
+    query_items,
+    to_dynamodb_item,
+)
 from smartalk.core.settings import settings
 from smartalk.db_usage.dynamodb_auth import hash_password
+from smartalk.scripts.migration_engine import (
+    MigrationStep,
+    migrate_rows,
+    prepare_rows,
+    run_migration_graph,
+    set_run_mode,
+    write_items,
+)
 
 # --- CONFIG BASE ---
 logging.basicConfig(
@@ -45,10 +63,6 @@ file_handler.setFormatter(
 logger.addHandler(file_handler)
 logger.setLevel(logging.INFO)
 
-APPS_SCRIPT_URL = (
-    "https://script.google.com/macros/s/AKfycbxkMQHNbDYt3LesAzEDbeii9aqgJ7xsww31yWcK9fLBs9l-tvKgR1WsVcAXJ3CNcm8/exec"
-)
-
 # ---
 # SEZIONE 1: MODELLI DI VALIDAZIONE Pydantic (V2, Completi e Corretti)
 # ---
@@ -322,30 +336,88 @@ class CompanyEmployee(BaseModel):
 # ---
 
 
-async def fetch_sheet_data(sheet_name: str) -> List[Dict[str, Any]]:
-    """Chiama l'API di Apps Script e restituisce i dati, seguendo i reindirizzamenti."""
+# Client HTTP condiviso tra i fogli (pool di connessioni), chiuso a fine migrazione
+_sheets_client: Optional[httpx.AsyncClient] = None
+
+
+def get_sheets_client() -> httpx.AsyncClient:
+    global _sheets_client
+    if _sheets_client is None:
+        _sheets_client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=120.0,
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+            },
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+        )
+    return _sheets_client
+
+
+async def close_sheets_client() -> None:
+    global _sheets_client
+    client = _sheets_client
+    _sheets_client = None
+    if client is not None:
+        await client.aclose()
+
+
+class SheetFetchError(RuntimeError):
+    """Il foglio non è stato letto (errore HTTP o risposta senza success)."""
+
+
+async def iter_sheet_pages(sheet_name: str, page_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Legge il foglio a pagine (?offset=&limit=) dall'API di Apps Script, seguendo i reindirizzamenti.
+    Risposta attesa: {"success": true, "data": [...], "total": N}.
+    Un endpoint senza "total" (né "offset" nella risposta) viene considerato non paginato:
+    il foglio arriva tutto nella prima risposta, qualunque sia il numero di righe.
+    Un errore di lettura (a qualunque pagina) solleva SheetFetchError: un foglio illeggibile non deve
+    sembrare vuoto, altrimenti migrate_rows lo segnerebbe come completato nel checkpoint.
+    """
+    page_size = page_size or settings.SHEETS_PAGE_SIZE
+    client = get_sheets_client()
     logger.info(f"Fetching data for sheet: {sheet_name}...")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    async with httpx.AsyncClient(follow_redirects=True) as client:
+    offset = 0
+    while True:
         try:
             response = await client.get(
-                f"{APPS_SCRIPT_URL}?sheet={sheet_name}&x_secret={settings.X_SECRET}", timeout=120.0, headers=headers
+                settings.APPS_SCRIPT_URL,
+                params={"sheet": sheet_name, "x_secret": settings.X_SECRET, "offset": offset, "limit": page_size},
             )
             response.raise_for_status()
             json_data = response.json()
-            if isinstance(json_data, dict) and json_data.get("success"):
-                data = json_data.get("data", [])
-                logger.info(f"  -> Fetched {len(data)} rows from {sheet_name}.")
-                return data
-            else:
-                logger.info(f"type: {type(json_data)} - success: {json_data.get('success')}")
-                logger.info(json_data)
-                return []
         except Exception as e:
             logger.error(f"  -> An error occurred while fetching {sheet_name}: {e}", exc_info=True)
-            return []
+            raise SheetFetchError(f"Sheet {sheet_name}: lettura fallita all'offset {offset}: {e}") from e
+        if not (isinstance(json_data, dict) and json_data.get("success")):
+            logger.info(f"type: {type(json_data)}")
+            logger.info(json_data)
+            raise SheetFetchError(f"Sheet {sheet_name}: risposta non valida all'offset {offset}")
+
+        data = json_data.get("data", [])
+        total = json_data.get("total")
+        offset += len(data)
+        if data:
+            yield data
+        if total is not None:
+            # l'endpoint può limitare le righe per pagina (es. --max-page-size dello stand-in):
+            # fa fede solo total
+            finished = not data or offset >= total
+        elif "offset" in json_data:
+            finished = len(data) != page_size
+        else:
+            # senza "total" né "offset" l'endpoint ignora offset/limit: richiedere la pagina successiva
+            # rileggerebbe le stesse righe all'infinito (es. foglio di esattamente page_size righe)
+            finished = True
+        if finished:
+            logger.info(f"  -> Fetched {offset} rows from {sheet_name}.")
+            return
+
+
+async def fetch_sheet_data(sheet_name: str) -> List[Dict[str, Any]]:
+    """Tutte le righe del foglio (per i passi che devono vedere il foglio intero, es. join e groupby)."""
+    return [row async for page in iter_sheet_pages(sheet_name) for row in page]
 
 
 key_map = {
@@ -365,6 +437,23 @@ user_class_map = {"Coaches": CoachUser, "Students": StudentUser, "Clients": Clie
 user_type_map = {"Coaches": "coach", "Students": "student", "Clients": "company", "Companies": "company"}
 
 
+def build_user_item(user_type: str):
+    """Validazione di una riga utente + hash della password (bcrypt), eseguita nel thread pool del motore."""
+
+    def build(row):
+        # all empty values to None
+        row = {k: row[k] if row[k] else None for k in row}
+
+        # validate row
+        data = user_class_map[user_type].model_validate(row)
+        item = data.model_dump(by_alias=False, exclude={"password"})
+        item["user_type"] = user_type_map[user_type]
+        item["password_hash"] = hash_password(str(data.password))
+        return to_dynamodb_item(item)
+
+    return build
+
+
 # async def migrate_users(db: Any):
 #     table = await get_table(db, settings.USERS_TABLE)
 
@@ -458,35 +547,7 @@ async def migrate_coaches(db: Any):
 
     #################################################
 
-    table = await get_table(db, table_name)
-
-    user_type = "Coaches"
-    row_index = 2
-    for row in coaches:
-        try:
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = user_class_map[user_type].model_validate(row)
-            item = data.model_dump(by_alias=False, exclude={"password"})
-            item["user_type"] = user_type_map[user_type]
-            item["password_hash"] = hash_password(str(data.password))
-
-            # use key fields
-            key = None
-            if user_type in key_map:
-                key = {k: item[k] for k in key_map[user_type]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{user_type}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {user_type}: {previous_item}")
-                await table.put_item(Item=to_dynamodb_item(item))
-        except ValidationError as e:
-            logger.warning(f"  -> Skipping invalid {user_type} row {row_index}: {e} | Data: {repr(row)}")
-        row_index += 1
+    await migrate_rows(db, table_name, "Coaches", coaches, build_user_item("Coaches"))
 
 
 async def migrate_students(db: Any):
@@ -525,35 +586,7 @@ async def migrate_students(db: Any):
 
     #################################################
 
-    table = await get_table(db, table_name)
-
-    user_type = "Students"
-    row_index = 2
-    for row in students:
-        try:
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = user_class_map[user_type].model_validate(row)
-            item = data.model_dump(by_alias=False, exclude={"password"})
-            item["user_type"] = user_type_map[user_type]
-            item["password_hash"] = hash_password(str(data.password))
-
-            # use key fields
-            key = None
-            if user_type in key_map:
-                key = {k: item[k] for k in key_map[user_type]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{user_type}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {user_type}: {previous_item}")
-                await table.put_item(Item=to_dynamodb_item(item))
-        except ValidationError as e:
-            logger.warning(f"  -> Skipping invalid {user_type} row {row_index}: {e} | Data: {repr(row)}")
-        row_index += 1
+    await migrate_rows(db, table_name, "Students", students, build_user_item("Students"))
 
 
 async def migrate_companies(db: Any):
@@ -579,213 +612,194 @@ async def migrate_companies(db: Any):
 
     #################################################
 
-    table = await get_table(db, table_name)
-    row_index = 2
-
-    user_type = "Companies"
-    row_index = 2
-    for row in companies:
-        try:
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = user_class_map[user_type].model_validate(row)
-            item = data.model_dump(by_alias=False, exclude={"password"})
-            item["user_type"] = user_type_map[user_type]
-            item["password_hash"] = hash_password(str(data.password))
-
-            # use key fields
-            key = None
-            if user_type in key_map:
-                key = {k: item[k] for k in key_map[user_type]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{user_type}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {user_type}: {previous_item}")
-                await table.put_item(Item=to_dynamodb_item(item))
-        except ValidationError as e:
-            logger.warning(f"  -> Skipping invalid {user_type} row {row_index}: {e} | Data: {repr(row)}")
-        row_index += 1
+    await migrate_rows(db, table_name, "Companies", companies, build_user_item("Companies"))
 
 
 async def get_contract(db, student_id):
     contract_table = await get_table(db, settings.CONTRACTS_TABLE)
-    response = await contract_table.query(
+    items = await query_items(
+        contract_table,
+        page_size=1,
+        max_items=1,
         IndexName="student-id-status-index",
         KeyConditionExpression=Key("student_id").eq(student_id),
-        Limit=1,
     )
-    if "Items" in response and len(response["Items"]) > 0:
-        return response["Items"][0]
-    else:
-        return None
+    return items[0] if items else None
 
 
 async def get_product_by_name(db, product_name):
     products_table = await get_table(db, settings.PRODUCTS_TABLE)
-    response = await products_table.query(
+    items = await query_items(
+        products_table,
+        page_size=1,
+        max_items=1,
         IndexName="product_name-index",
         KeyConditionExpression=Key("product_name").eq(product_name),
-        Limit=1,
     )
-    return clean_dynamo_value(response["Items"][0])
+    return clean_dynamo_value(items[0])
+
+
+async def migrate_generic(
+    db: Any,
+    table_name: str,
+    sheet_name: str,
+    model_cls: BaseModel,
+    special_logic=None,
+    skip_rows: bool = True,
+    full: bool = False,
+):
+    # contratti letti per la migrazione delle report card, uno per studente (task condivisi tra le righe)
+    contracts_by_student: Dict[str, asyncio.Task] = {}
+
+    def get_student_contract(student_id):
+        if student_id not in contracts_by_student:
+            contracts_by_student[student_id] = asyncio.ensure_future(get_contract(db, student_id))
+        return contracts_by_student[student_id]
+
+    async def prepare(row):
+        if sheet_name == "OLD - Debriefs":
+            # from OLD Debrief
+            #   Timestamp	Email Address	Student	Date	Coach	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework
+            # to new Debrief
+            #   Date	Coach ID	Student ID	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework	Draft	Sent	Sent Date
+
+            # filtering testing rows
+            if row.get("Student ID") == "NAM.SUR":
+                return None
+
+            new_row = {}
+
+            # Date	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework
+            for key in ["Date", "Goals", "Topics", "Grammar", "Vocabulary", "Pronunciation", "Other", "Homework"]:
+                new_row[key] = row[key]
+
+            # Coach ID	Student ID
+            new_row["Coach ID"] = row["Coach"]
+            new_row["Student ID"] = row["Student"]
+
+            # Draft	Sent	Sent Date
+            for key in ["Draft", "Sent", "Sent Date"]:
+                new_row[key] = None
+
+            # back to row
+            row = new_row
+
+        if sheet_name == "OLD - Report Cards":
+            # from OLD Report Card
+            #   Student ID	Client ID	Recurrency	Start	End	Attendance	Report	Coach	Final check	Sent
+            # to new Report Card
+            #   Date	Student ID	Contract ID	Coach ID	Attendance	Report	Status	Sent
+            new_row = {}
+            new_row["Date"] = row["End"]
+            new_row["Student ID"] = row["Student ID"]
+            new_row["Contract ID"] = None
+            new_row["Coach ID"] = row["Coach"]
+            new_row["Attendance"] = row["Attendance"]
+            new_row["Report"] = row["Report"]
+            new_row["Status"] = row["Final check"]
+            new_row["Sent"] = row["Sent"]
+        if (
+            table_name == settings.INVOICES_TABLE
+            and row.get("Invoice ID") in ["", None]
+            and row.get("Client ID") in ["", None]
+        ):
+            return None
+
+        if table_name == settings.DEBRIEFS_TABLE and (
+            row.get("Coach ID") in ["", None] or row.get("Student ID") in ["", None]
+        ):
+            return None
+
+        if table_name == settings.CONTRACTS_TABLE:
+            if row["Invoice ID"] in ["", None]:
+                return None
+            if row["Report Card Cadency"] not in ["", None] and isinstance(row["Report Card Cadency"], int):
+                row["report_card_generator_id"] = f"{row['Student ID']}#{row['Client ID']}#{row['Report Card Cadency']}"
+            else:
+                row["report_card_generator_id"] = ""
 
+        if table_name == settings.CALLS_TABLE:
+            if row["Student ID"] in ["", None]:
+                return None
+
+        if table_name == settings.REPORT_CARDS_TABLE:
+            if row["Student ID"] in ["", None]:
+                return None
+            contract_id = row.get("Contract ID")
+            contract = None
+            if contract_id in ["", None]:
+                # prendere contract_id del primo contract in cui compare row['Student ID']
+                contract = await get_student_contract(row["Student ID"])
+            else:
+                contract = await get_item(db, settings.CONTRACTS_TABLE, {"contract_id": contract_id})
+            if contract is None:
+                # salta per la migrazione (dati troppo vecchi)
+                return None
+            row["client_id"] = contract["client_id"]
+            row["report_card_cadency"] = contract["report_card_cadency"]
+            row["report_card_email_recipients"] = contract["report_card_email_recipients"]
+            row["report_card_generator_id"] = f"{contract['student_id']}#{row['client_id']}#{row['report_card_cadency']}"
+            row["report_card_id"] = f"{row['Coach ID']}#{row['report_card_generator_id']}"
+            row["start_month"] = contract["report_card_start_month"]
+            row["end_month"] = parse_date_field(
+                datetime.fromisoformat(row["start_month"] + "-01").date()
+                + relativedelta(months=row["report_card_cadency"])
+            )[:7]
+            report_date = parse_date_field(row["Date"])
+            while report_date < row["start_month"] or row["end_month"] < report_date:
+                time_sign = 1
+                if report_date < row["start_month"]:
+                    time_sign = -1
+
+                # update start_month with time_sign and report_card_cadency
+                row["start_month"] = parse_date_field(
+                    datetime.fromisoformat(row["start_month"] + "-01").date()
+                    + relativedelta(months=time_sign * row["report_card_cadency"])
+                )[:7]
 
-async def migrate_generic(db: Any, table_name: str, sheet_name: str, model_cls: BaseModel, special_logic=None):
-    table = await get_table(db, table_name)
-    row_index = 2
-    for row in await fetch_sheet_data(sheet_name):
-        try:
-            if sheet_name == "OLD - Debriefs":
-                # from OLD Debrief
-                #   Timestamp	Email Address	Student	Date	Coach	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework
-                # to new Debrief
-                #   Date	Coach ID	Student ID	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework	Draft	Sent	Sent Date
-
-                # filtering testing rows
-                if row.get("Student ID") == "NAM.SUR":
-                    continue
-
-                new_row = {}
-
-                # Date	Goals	Topics	Grammar	Vocabulary	Pronunciation	Other	Homework
-                for key in ["Date", "Goals", "Topics", "Grammar", "Vocabulary", "Pronunciation", "Other", "Homework"]:
-                    new_row[key] = row[key]
-
-                # Coach ID	Student ID
-                new_row["Coach ID"] = row["Coach"]
-                new_row["Student ID"] = row["Student"]
-
-                # Draft	Sent	Sent Date
-                for key in ["Draft", "Sent", "Sent Date"]:
-                    new_row[key] = None
-
-                # back to row
-                row = new_row
-
-            if sheet_name == "OLD - Report Cards":
-                # from OLD Report Card
-                #   Student ID	Client ID	Recurrency	Start	End	Attendance	Report	Coach	Final check	Sent
-                # to new Report Card
-                #   Date	Student ID	Contract ID	Coach ID	Attendance	Report	Status	Sent
-                new_row = {}
-                new_row["Date"] = row["End"]
-                new_row["Student ID"] = row["Student ID"]
-                new_row["Contract ID"] = None
-                new_row["Coach ID"] = row["Coach"]
-                new_row["Attendance"] = row["Attendance"]
-                new_row["Report"] = row["Report"]
-                new_row["Status"] = row["Final check"]
-                new_row["Sent"] = row["Sent"]
-            if (
-                table_name == settings.INVOICES_TABLE
-                and row.get("Invoice ID") in ["", None]
-                and row.get("Client ID") in ["", None]
-            ):
-                continue
-
-            if table_name == settings.DEBRIEFS_TABLE and (
-                row.get("Coach ID") in ["", None] or row.get("Student ID") in ["", None]
-            ):
-                continue
-
-            if table_name == settings.CONTRACTS_TABLE:
-                if row["Invoice ID"] in ["", None]:
-                    continue
-                if row["Report Card Cadency"] not in ["", None] and isinstance(row["Report Card Cadency"], int):
-                    row["report_card_generator_id"] = (
-                        f"{row['Student ID']}#{row['Client ID']}#{row['Report Card Cadency']}"
-                    )
-                else:
-                    row["report_card_generator_id"] = ""
-
-            if table_name == settings.CALLS_TABLE:
-                if row["Student ID"] in ["", None]:
-                    continue
-
-            if table_name == settings.REPORT_CARDS_TABLE:
-                if row["Student ID"] in ["", None]:
-                    continue
-                contract_id = row.get("Contract ID")
-                contract = None
-                if contract_id in ["", None]:
-                    # prendere contract_id del primo contract in cui compare row['Student ID']
-                    contract = await get_contract(db, row["Student ID"])
-                else:
-                    contract = await get_item(db, settings.CONTRACTS_TABLE, {"contract_id": contract_id})
-                if contract is None:
-                    # salta per la migrazione (dati troppo vecchi)
-                    continue
-                row["client_id"] = contract["client_id"]
-                row["report_card_cadency"] = contract["report_card_cadency"]
-                row["report_card_email_recipients"] = contract["report_card_email_recipients"]
-                row["report_card_generator_id"] = (
-                    f"{contract['student_id']}#{row['client_id']}#{row['report_card_cadency']}"
-                )
-                row["report_card_id"] = f"{row['Coach ID']}#{row['report_card_generator_id']}"
-                row["start_month"] = contract["report_card_start_month"]
+                # align end_month with start_month
                 row["end_month"] = parse_date_field(
                     datetime.fromisoformat(row["start_month"] + "-01").date()
                     + relativedelta(months=row["report_card_cadency"])
                 )[:7]
-                report_date = parse_date_field(row["Date"])
-                while report_date < row["start_month"] or row["end_month"] < report_date:
-                    time_sign = 1
-                    if report_date < row["start_month"]:
-                        time_sign = -1
-
-                    # update start_month with time_sign and report_card_cadency
-                    row["start_month"] = parse_date_field(
-                        datetime.fromisoformat(row["start_month"] + "-01").date()
-                        + relativedelta(months=time_sign * row["report_card_cadency"])
-                    )[:7]
-
-                    # align end_month with start_month
-                    row["end_month"] = parse_date_field(
-                        datetime.fromisoformat(row["start_month"] + "-01").date()
-                        + relativedelta(months=row["report_card_cadency"])
-                    )[:7]
-                if row["Sent"]:
-                    row["status"] = "sent"
+            if row["Sent"]:
+                row["status"] = "sent"
+            else:
+                if row["Status"]:
+                    row["status"] = "completed"
                 else:
-                    if row["Status"]:
-                        row["status"] = "completed"
-                    else:
-                        # nella migrazione non esistono no_show
-                        row["status"] = "draft"
-
-            if table_name == settings.DEBRIEFS_TABLE:
-                if row["Student ID"] in ["", None]:
-                    continue
-
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = model_cls.model_validate(row)
-            item = data.model_dump()
-            if special_logic:
-                item = special_logic(item)
-
-            item = to_dynamodb_item(item)
-
-            # use key fields
-            key = None
-            if sheet_name in key_map:
-                key = {k: item[k] for k in key_map[sheet_name]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{sheet_name}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {sheet_name}: {previous_item}")
-            await table.put_item(Item=item)
-        except Exception as e:
-            logger.warning(f"  -> Skipping invalid {sheet_name} row {row_index}: {e} | Data: {row}")
-        row_index += 1
+                    # nella migrazione non esistono no_show
+                    row["status"] = "draft"
+
+        if table_name == settings.DEBRIEFS_TABLE:
+            if row["Student ID"] in ["", None]:
+                return None
+
+        return row
+
+    def build(row):
+        # all empty values to None
+        row = {k: row[k] if row[k] else None for k in row}
+
+        # validate row
+        data = model_cls.model_validate(row)
+        item = data.model_dump()
+        if special_logic:
+            item = special_logic(item)
+
+        return to_dynamodb_item(item)
+
+    # le pagine del foglio vengono scritte mentre arrivano le successive
+    await migrate_rows(
+        db,
+        table_name,
+        sheet_name,
+        iter_sheet_pages(sheet_name),
+        build,
+        prepare=prepare,
+        skip_rows=skip_rows,
+        full=full,
+    )
 
 
 def get_cleaned_invoices(old_invoices_df):
@@ -844,39 +858,22 @@ async def migrate_invoices(db: Any, special_logic=None):
 
     #################################################
 
-    table = await get_table(db, table_name)
-    row_index = 2
+    def build(row):
+        if row.get("Invoice ID") in ["", None] and row.get("Client ID") in ["", None]:
+            return None
 
-    for row in invoices:
-        try:
-            if row.get("Invoice ID") in ["", None] and row.get("Client ID") in ["", None]:
-                continue
-
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = model_cls.model_validate(row)
-            item = data.model_dump()
-            if special_logic:
-                item = special_logic(item)
-
-            item = to_dynamodb_item(item)
-
-            # use key fields
-            key = None
-            if sheet_name in key_map:
-                key = {k: item[k] for k in key_map[sheet_name]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{sheet_name}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {sheet_name}: {previous_item}")
-            await table.put_item(Item=item)
-        except Exception as e:
-            logger.warning(f"  -> Skipping invalid {sheet_name} row {row_index}: {e} | Data: {row}")
-        row_index += 1
+        # all empty values to None
+        row = {k: row[k] if row[k] else None for k in row}
+
+        # validate row
+        data = model_cls.model_validate(row)
+        item = data.model_dump()
+        if special_logic:
+            item = special_logic(item)
+
+        return to_dynamodb_item(item)
+
+    await migrate_rows(db, table_name, sheet_name, invoices, build)
 
 
 async def migrate_contracts(db: Any, special_logic=None):
@@ -1013,49 +1010,37 @@ async def migrate_contracts(db: Any, special_logic=None):
 
     # Contract ID
     contracts_df.reset_index(inplace=True, drop=True)
+    # numerazione deterministica (riga i → CON00i, come nelle migrazioni già eseguite: CON0010 per
+    # la riga 10) per rendere la migrazione ripetibile; il contatore degli ID viene poi portato oltre
+    # l'ultimo ID assegnato (parse legge sia CON0010 sia CON010 come 10).
+    # La migrazione va eseguita prima che l'app serva traffico: vedi IdAllocator.ensure_at_least
     contracts_df["Contract ID"] = "CON00" + pd.Series(contracts_df.index).apply(lambda x: str(x + 1))
+    await contract_id_allocator.ensure_at_least(db, len(contracts_df))
 
     # dict
     contracts = contracts_df.to_dict("records")
     #################################################
 
-    table = await get_table(db, table_name)
-    row_index = 2
+    def build(row):
+        if row["Invoice ID"] in ["", None]:
+            return None
+        if row["Report Card Cadency"] not in ["", None] and isinstance(row["Report Card Cadency"], int):
+            row["report_card_generator_id"] = f"{row['Student ID']}#{row['Client ID']}#{row['Report Card Cadency']}"
+        else:
+            row["report_card_generator_id"] = ""
+
+        # all empty values to None
+        row = {k: row[k] if row[k] else None for k in row}
 
-    for row in contracts:
-        try:
-            if row["Invoice ID"] in ["", None]:
-                continue
-            if row["Report Card Cadency"] not in ["", None] and isinstance(row["Report Card Cadency"], int):
-                row["report_card_generator_id"] = f"{row['Student ID']}#{row['Client ID']}#{row['Report Card Cadency']}"
-            else:
-                row["report_card_generator_id"] = ""
+        # validate row
+        data = model_cls.model_validate(row)
+        item = data.model_dump()
+        if special_logic:
+            item = special_logic(item)
 
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = model_cls.model_validate(row)
-            item = data.model_dump()
-            if special_logic:
-                item = special_logic(item)
-
-            item = to_dynamodb_item(item)
-
-            # use key fields
-            key = None
-            if sheet_name in key_map:
-                key = {k: item[k] for k in key_map[sheet_name]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{sheet_name}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {sheet_name}: {previous_item}")
-            await table.put_item(Item=item)
-        except Exception as e:
-            logger.warning(f"  -> Skipping invalid {sheet_name} row {row_index}: {e} | Data: {row}")
-        row_index += 1
+        return to_dynamodb_item(item)
+
+    await migrate_rows(db, table_name, sheet_name, contracts, build)
 
 
 async def migrate_trackers(db: Any, special_logic=None):
@@ -1063,7 +1048,6 @@ async def migrate_trackers(db: Any, special_logic=None):
     sheet_name = "OLD - Trackers"
     model_cls = Tracker
 
-    calls = []
     #################################################
     # from
     # OLD Trackers
@@ -1082,7 +1066,31 @@ async def migrate_trackers(db: Any, special_logic=None):
         .to_dict("records")
     )
 
-    for row in old_rows:
+    # prodotti e contratti letti una volta sola (task condivisi tra righe uguali)
+    products_by_name: Dict[str, asyncio.Task] = {}
+    contracts_by_key: Dict[tuple, asyncio.Task] = {}
+    contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
+
+    def product_by_name(product_name):
+        if product_name not in products_by_name:
+            products_by_name[product_name] = asyncio.ensure_future(get_product_by_name(db, product_name))
+        return products_by_name[product_name]
+
+    def contracts_for(client_id, product_id, student_id):
+        key = (client_id, product_id, student_id)
+        if key not in contracts_by_key:
+            contracts_by_key[key] = asyncio.ensure_future(
+                query_items(
+                    contracts_table,
+                    IndexName="client-id-product-id-index",
+                    KeyConditionExpression=Key("client_id").eq(client_id) & Key("product_id").eq(product_id),
+                    FilterExpression=Attr("student_id").eq(student_id),
+                    ProjectionExpression="invoice_id, contract_id",
+                )
+            )
+        return contracts_by_key[key]
+
+    async def prepare(row):
         new_row = {}
 
         # Date	Student ID	Coach ID    Units	Attendance	Notes
@@ -1094,7 +1102,7 @@ async def migrate_trackers(db: Any, special_logic=None):
         new_row["Notes"] = row["Info"]
 
         # Product ID    Duration	Coach Rate	Prod cost
-        product = await get_product_by_name(db, row["Product"])
+        product = await product_by_name(row["Product"])
         coach = await get_item(db, settings.USERS_TABLE, {"id": new_row["Coach ID"]})
 
         new_row["Product ID"] = product["product_id"]
@@ -1104,14 +1112,7 @@ async def migrate_trackers(db: Any, special_logic=None):
 
         # Contract ID
         invoice_id, client_id, _ = row["Allocation ID"].split(" – ")
-        contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-        contracts_response = await contracts_table.query(
-            IndexName="client-id-product-id-index",
-            KeyConditionExpression=Key("client_id").eq(client_id) & Key("product_id").eq(new_row["Product ID"]),
-            FilterExpression=Attr("student_id").eq(new_row["Student ID"]),
-            ProjectionExpression="invoice_id, contract_id",
-        )
-        contracts = contracts_response.get("Items", [])
+        contracts = await contracts_for(client_id, new_row["Product ID"], new_row["Student ID"])
 
         if contracts:
             if len(contracts) == 1:
@@ -1141,59 +1142,48 @@ async def migrate_trackers(db: Any, special_logic=None):
             raise Exception("Contract not found")
 
         # new_row in calls
-        calls.append(new_row)
+        return new_row
+
+    # le righe senza contratto corrispondente vengono saltate (warning) senza fermare la migrazione
+    calls = [row for row in await prepare_rows(sheet_name, old_rows, prepare) if row is not None]
 
     #################################################
 
-    table = await get_table(db, table_name)
-    row_index = 2
+    def build(row):
+        # all empty values to None
+        row = {k: row[k] if row[k] else None for k in row}
 
-    for row in calls:
-        try:
-            # all empty values to None
-            row = {k: row[k] if row[k] else None for k in row}
-
-            # validate row
-            data = model_cls.model_validate(row)
-            item = data.model_dump()
-            if special_logic:
-                item = special_logic(item)
-
-            item = to_dynamodb_item(item)
-
-            # use key fields
-            key = None
-            if sheet_name in key_map:
-                key = {k: item[k] for k in key_map[sheet_name]}
-            if key:
-                previous_item_response = await table.get_item(Key=key)
-                previous_item = previous_item_response.get("Item", None)
-                if previous_item:
-                    logger.info(f"{sheet_name}, row_index: {row_index}")
-                    logger.info(f"Already inserted overwritten item {sheet_name}: {previous_item}")
-            await table.put_item(Item=item)
-        except Exception as e:
-            logger.warning(f"  -> Skipping invalid {sheet_name} row {row_index}: {e} | Data: {row}")
-        row_index += 1
+        # validate row
+        data = model_cls.model_validate(row)
+        item = data.model_dump()
+        if special_logic:
+            item = special_logic(item)
+
+        return to_dynamodb_item(item)
+
+    # tracker_logic dipende dai debrief (has_debrief): una riga invariata può dare un item diverso
+    await migrate_rows(db, table_name, sheet_name, calls, build, skip_rows=False)
 
 
 # ---
 # SEZIONE 3: FUNZIONE DI CREAZIONE DEI REPORT CARD GENERATOR
 # ---
-async def introduce_report_card_generators_and_report_cards(db: Any):
+async def introduce_report_card_generators_and_report_cards(db: Any) -> int:
+    """Crea report card generator e report card dai contratti; restituisce i report card scritti."""
     # propagare dati mancanti relativi a report card in contract
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
 
     # contracts with rc
-    contracts_response = await contracts_table.query(
+    contracts_with_rc = await query_items(
+        contracts_table,
         IndexName="client_id-index",
         KeyConditionExpression=Key("client_id").eq("M1A"),
         FilterExpression=Attr("report_card_generator_id").exists(),
     )
-    contracts_with_rc = contracts_response.get("Items", [])
 
     # contracts without rc, active, unlimited or not expired
-    contracts_response = await contracts_table.query(
+    contracts_without_rc = await query_items(
+        contracts_table,
         IndexName="client-id-status-index",
         KeyConditionExpression=Key("client_id").eq("M1A") & Key("status").eq("Active"),
         FilterExpression=(
@@ -1205,8 +1195,6 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
         ProjectionExpression="contract_id, client_id, student_id",
     )
 
-    contracts_without_rc = contracts_response.get("Items", [])
-
     contracts_without_rc_df = pd.DataFrame.from_dict(contracts_without_rc)
 
     for contract_with_rc in contracts_with_rc:
@@ -1237,7 +1225,8 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
                 )
 
     # creazione report card generators
-    contracts_response = await contracts_table.query(
+    contracts = await query_items(
+        contracts_table,
         IndexName="status-index",
         KeyConditionExpression=Key("status").eq("Active"),
         FilterExpression=(
@@ -1247,7 +1236,6 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
         )
         & Attr("report_card_generator_id").exists(),
     )
-    contracts = contracts_response.get("Items", [])
 
     contracts_df = pd.DataFrame.from_dict(contracts)
     if not contracts_df.empty:
@@ -1266,9 +1254,13 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
             .rename(columns={"report_card_start_month": "start_month"})
         )
 
-        report_card_generators_table = await get_table(db, settings.REPORT_CARD_GENERATORS_TABLE)
         today_string = get_today_string()
-        for rcg in report_card_generators_df.to_dict("records"):
+        calls_table = await get_table(db, settings.CALLS_TABLE)
+        generator_items = []
+        report_card_items = []
+        semaphore = asyncio.Semaphore(settings.MIGRATION_WRITE_CONCURRENCY)
+
+        async def process_generator(rcg):
             rcg["current_start_month"] = rcg["start_month"]
             rcg["next_start_month"] = parse_date_field(
                 datetime.fromisoformat(rcg["current_start_month"] + "-01").date()
@@ -1283,23 +1275,22 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
 
             data = ReportCardGenerator.model_validate(rcg)
             report_card_generator = to_dynamodb_item(data.model_dump())
-            await report_card_generators_table.put_item(Item=report_card_generator)
+            generator_items.append(report_card_generator)
 
             # creazione dei report card draft e no show
-            report_cards_table = await get_table(db, settings.REPORT_CARDS_TABLE)
-            calls_table = await get_table(db, settings.CALLS_TABLE)
 
             # current period
-            calls_response = await calls_table.query(
-                IndexName="student-id-date-index",
-                KeyConditionExpression=Key("student_id").eq(report_card_generator["student_id"])
-                & Key("date").between(
-                    low_value=report_card_generator["current_start_month"],
-                    high_value=report_card_generator["next_start_month"],
-                ),
-                ProjectionExpression="coach_id",
-            )
-            calls = calls_response.get("Items", [])
+            async with semaphore:
+                calls = await query_items(
+                    calls_table,
+                    IndexName="student-id-date-index",
+                    KeyConditionExpression=Key("student_id").eq(report_card_generator["student_id"])
+                    & Key("date").between(
+                        low_value=report_card_generator["current_start_month"],
+                        high_value=report_card_generator["next_start_month"],
+                    ),
+                    ProjectionExpression="coach_id",
+                )
 
             if calls:
                 # draft
@@ -1321,7 +1312,7 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
                     report_card["report_card_email_recipients"] = report_card_generator["report_card_email_recipients"]
                     report_card["report_card_cadency"] = report_card_generator["report_card_cadency"]
                     report_card["client_id"] = report_card_generator["client_id"]
-                    await report_cards_table.put_item(Item=to_dynamodb_item(report_card))
+                    report_card_items.append(to_dynamodb_item(report_card))
             else:
                 # no_show
                 # new report card
@@ -1339,16 +1330,17 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
                 report_card["report_card_email_recipients"] = report_card_generator["report_card_email_recipients"]
                 report_card["report_card_cadency"] = report_card_generator["report_card_cadency"]
                 report_card["client_id"] = report_card_generator["client_id"]
-                await report_cards_table.put_item(Item=to_dynamodb_item(report_card))
+                report_card_items.append(to_dynamodb_item(report_card))
 
             # next period
-            calls_response = await calls_table.query(
-                IndexName="student-id-date-index",
-                KeyConditionExpression=Key("student_id").eq(report_card_generator["student_id"])
-                & Key("date").gt(report_card_generator["next_start_month"]),
-                ProjectionExpression="coach_id",
-            )
-            calls = calls_response.get("Items", [])
+            async with semaphore:
+                calls = await query_items(
+                    calls_table,
+                    IndexName="student-id-date-index",
+                    KeyConditionExpression=Key("student_id").eq(report_card_generator["student_id"])
+                    & Key("date").gt(report_card_generator["next_start_month"]),
+                    ProjectionExpression="coach_id",
+                )
 
             if calls:
                 # draft
@@ -1369,7 +1361,12 @@ async def introduce_report_card_generators_and_report_cards(db: Any):
                     report_card["report_card_email_recipients"] = report_card_generator["report_card_email_recipients"]
                     report_card["report_card_cadency"] = report_card_generator["report_card_cadency"]
                     report_card["client_id"] = report_card_generator["client_id"]
-                    await report_cards_table.put_item(Item=to_dynamodb_item(report_card))
+                    report_card_items.append(to_dynamodb_item(report_card))
+
+        await asyncio.gather(*[process_generator(rcg) for rcg in report_card_generators_df.to_dict("records")])
+        await write_items(db, settings.REPORT_CARD_GENERATORS_TABLE, "Report Card Generators", generator_items)
+        return await write_items(db, settings.REPORT_CARDS_TABLE, "Generated Report Cards", report_card_items)
+    return 0
 
 
 # ---
@@ -1380,27 +1377,31 @@ async def insert_company_student_relations(db: Any):
 
     users_table = await get_table(db, settings.USERS_TABLE)
     contracts_table = await get_table(db, settings.CONTRACTS_TABLE)
-    company_employees_table = await get_table(db, settings.COMPANY_EMPLOYEES_TABLE)
 
     # list of company ids
-    response = await users_table.query(
+    companies = await query_items(
+        users_table,
         IndexName="user-type-index",
         KeyConditionExpression=Key("user_type").eq("company"),
         ProjectionExpression="#id",
         ExpressionAttributeNames={"#id": "id"},
     )
-    company_ids = [item.get("id") for item in response.get("Items", [])]
-
-    contracts_for_companies = []
-    for company_id in company_ids:
-        # contracts for company_id
-        contracts_response = await contracts_table.query(
-            IndexName="client-id-status-index",
-            KeyConditionExpression=Key("client_id").eq(company_id) & Key("status").eq("Active"),
-            ProjectionExpression="#student, #client",
-            ExpressionAttributeNames={"#student": "student_id", "#client": "client_id"},
-        )
-        contracts_for_companies += contracts_response.get("Items", [])
+    company_ids = [item.get("id") for item in companies]
+
+    # contracts for company_id (una query per company, in parallelo)
+    contracts_per_company = await asyncio.gather(
+        *[
+            query_items(
+                contracts_table,
+                IndexName="client-id-status-index",
+                KeyConditionExpression=Key("client_id").eq(company_id) & Key("status").eq("Active"),
+                ProjectionExpression="#student, #client",
+                ExpressionAttributeNames={"#student": "student_id", "#client": "client_id"},
+            )
+            for company_id in company_ids
+        ]
+    )
+    contracts_for_companies = [contract for contracts in contracts_per_company for contract in contracts]
 
     unique_company_student_relations = (
         pd.DataFrame.from_dict(contracts_for_companies)[["client_id", "student_id"]]
@@ -1409,10 +1410,11 @@ async def insert_company_student_relations(db: Any):
         .to_dict("records")
     )
 
-    for relation in unique_company_student_relations:
-        data = CompanyEmployee.model_validate(relation)
-        item = to_dynamodb_item(data.model_dump())
-        await company_employees_table.put_item(Item=item)
+    items = [
+        to_dynamodb_item(CompanyEmployee.model_validate(relation).model_dump())
+        for relation in unique_company_student_relations
+    ]
+    await write_items(db, settings.COMPANY_EMPLOYEES_TABLE, "Company - Student Relations", items)
 
 
 # ---
@@ -1420,18 +1422,20 @@ async def insert_company_student_relations(db: Any):
 # ---
 
 
-async def migrate_all_data(db: Any):
-    """Orchestra l'intera migrazione dei dati."""
-    logger.info("STARTING DATA MIGRATION FROM GOOGLE SHEETS API...")
-
-    logger.info("\n--- Migrating Users ---")
-    # await migrate_users(db)
-    await migrate_coaches(db)
-    await migrate_students(db)
-    await migrate_companies(db)
+async def migrate_all_data(db: Any, resume: Optional[bool] = None, full: bool = False):
+    """
+    Orchestra l'intera migrazione dei dati.
+    I fogli indipendenti vengono migrati in parallelo; depends_on riflette le letture
+    che ogni passo fa sulle tabelle scritte dai passi precedenti.
 
-    logger.info("\n--- Migrating Products ---")
-    await migrate_generic(db, settings.PRODUCTS_TABLE, "Products", Product)
+    Di default è una sync incrementale (righe invariate saltate, vedi migration_engine);
+    resume salta i fogli completati nel run precedente (default: settings.MIGRATION_RESUME):
+    un foglio interrotto viene riletto, saltando le righe già scritte.
+    full riscrive tutto ignorando i checkpoint.
+    """
+    resume = settings.MIGRATION_RESUME if resume is None else resume
+    set_run_mode(resume=resume, full=full)
+    logger.info(f"STARTING DATA MIGRATION FROM GOOGLE SHEETS API... (resume={resume}, full={full})")
 
     def invoice_logic(item):
         if "invoice_date" in item:
@@ -1443,9 +1447,6 @@ async def migrate_all_data(db: Any):
     # logger.info("\n--- Migrating Invoices ---")
     # await migrate_generic(db, settings.INVOICES_TABLE, "Invoices", Invoice, special_logic=invoice_logic)
 
-    logger.info("\n--- Migrating OLD  Invoices ---")
-    await migrate_invoices(db, special_logic=invoice_logic)
-
     def contract_logic(item):
         if item.get("unlimited"):
             if "used_calls" in item:
@@ -1464,29 +1465,19 @@ async def migrate_all_data(db: Any):
     # logger.info("\n--- Migrating Contracts ---")
     # await migrate_generic(db, settings.CONTRACTS_TABLE, "Contracts", Contract, special_logic=contract_logic)
 
-    logger.info("\n--- Migrating OLD Allocations ---")
-    await migrate_contracts(db, special_logic=contract_logic)
-
-    # migration for company - student relations
-    await insert_company_student_relations(db)
-
-    calls_with_debrief = []
+    # debrief_logic gira nel thread pool di validazione: niente variabili globali,
+    # solo add su un set (atomico)
+    calls_with_debrief = set()
 
     def debrief_logic(item):
         item["date"] = item.pop("debrief_date")
         item["debrief_id"] = f"{item['student_id']}#{item['coach_id']}"
-        global id_for_debrief_in_call
-        id_for_debrief_in_call = f"{item['debrief_id']}#{item['date']}"
-        if id_for_debrief_in_call not in calls_with_debrief:
-            calls_with_debrief.append(id_for_debrief_in_call)
+        calls_with_debrief.add(f"{item['debrief_id']}#{item['date']}")
         return item
 
     # logger.info("\n--- Migrating Debriefs ---")
     # await migrate_generic(db, settings.DEBRIEFS_TABLE, "Debriefs", Debrief, special_logic=debrief_logic)
 
-    logger.info("\n--- Migrating OLD Debriefs ---")
-    await migrate_generic(db, settings.DEBRIEFS_TABLE, "OLD - Debriefs", Debrief, special_logic=debrief_logic)
-
     def tracker_logic(item):
         item["date"] = item.pop("session_date")
         item["session_id"] = f"{item['coach_id']}#{item['student_id']}#{item['date']}"
@@ -1497,14 +1488,87 @@ async def migrate_all_data(db: Any):
     # logger.info("\n--- Migrating Tracker ---")
     # await migrate_generic(db, settings.CALLS_TABLE, "Tracker", Tracker, special_logic=tracker_logic)
 
-    logger.info("\n--- Migrating OLD Trackers ---")
-    await migrate_trackers(db, special_logic=tracker_logic)
-
-    logger.info("\n--- Report Card Generators and Report Cards ---")
-    await introduce_report_card_generators_and_report_cards(db)
     # logger.info("\n--- Migrating Report Cards ---")
     # await migrate_generic(db, settings.REPORT_CARDS_TABLE, "Report Cards", ReportCard)
-    logger.info("\n--- Migrating OLD Report Cards ---")
-    await migrate_generic(db, settings.REPORT_CARDS_TABLE, "OLD - Report Cards", ReportCard)
+
+    generated_report_cards = 0
+
+    async def report_card_generators_step():
+        nonlocal generated_report_cards
+        generated_report_cards = await introduce_report_card_generators_and_report_cards(db)
+
+    async def old_report_cards_step():
+        # i report card storici sovrascrivono quelli generati: se il passo precedente ne ha riscritto
+        # qualcuno, le righe "invariate" dello storico vanno riscritte comunque
+        await migrate_generic(
+            db,
+            settings.REPORT_CARDS_TABLE,
+            "OLD - Report Cards",
+            ReportCard,
+            full=generated_report_cards > 0,
+        )
+
+    try:
+        await run_migration_graph(
+            [
+                # await migrate_users(db)
+                MigrationStep("Coaches", lambda: migrate_coaches(db)),
+                MigrationStep("Students", lambda: migrate_students(db)),
+                MigrationStep("Companies", lambda: migrate_companies(db)),
+                MigrationStep("Products", lambda: migrate_generic(db, settings.PRODUCTS_TABLE, "Products", Product)),
+                MigrationStep("OLD Invoices", lambda: migrate_invoices(db, special_logic=invoice_logic)),
+                MigrationStep("OLD Allocations", lambda: migrate_contracts(db, special_logic=contract_logic)),
+                MigrationStep(
+                    "OLD Debriefs",
+                    # debrief_logic riempie calls_with_debrief: tutte le righe vanno elaborate
+                    lambda: migrate_generic(
+                        db,
+                        settings.DEBRIEFS_TABLE,
+                        "OLD - Debriefs",
+                        Debrief,
+                        special_logic=debrief_logic,
+                        skip_rows=False,
+                    ),
+                ),
+                # migration for company - student relations
+                MigrationStep(
+                    "Company - Student Relations",
+                    lambda: insert_company_student_relations(db),
+                    depends_on=["Companies", "OLD Allocations"],
+                ),
+                # legge PRODUCTS, CONTRACTS e i coach; has_debrief richiede i debrief già letti
+                MigrationStep(
+                    "OLD Trackers",
+                    lambda: migrate_trackers(db, special_logic=tracker_logic),
+                    depends_on=["Products", "Coaches", "OLD Allocations", "OLD Debriefs"],
+                ),
+                MigrationStep(
+                    "Report Card Generators and Report Cards",
+                    report_card_generators_step,
+                    depends_on=["OLD Allocations", "OLD Trackers"],
+                ),
+                # i report card storici sovrascrivono quelli generati
+                MigrationStep(
+                    "OLD Report Cards",
+                    old_report_cards_step,
+                    depends_on=["OLD Allocations", "Report Card Generators and Report Cards"],
+                ),
+            ]
+        )
+    finally:
+        await close_sheets_client()
 
     logger.info("DATA MIGRATION COMPLETED.")
+
+
+async def _main(resume: bool, full: bool):
+    async with dynamodb_connection() as db:
+        await migrate_all_data(db, resume=resume, full=full)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrazione dei dati dai Google Sheets a DynamoDB.")
+    parser.add_argument("--resume", action="store_true", help="salta i fogli completati nel run precedente")
+    parser.add_argument("--full", action="store_true", help="riscrive tutte le righe, ignorando i checkpoint")
+    args = parser.parse_args()
+    asyncio.run(_main(resume=args.resume, full=args.full))
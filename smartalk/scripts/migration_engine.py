@@ -0,0 +1,412 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from smartalk.core.dynamodb import batch_write_items, get_db_client, get_table
+from smartalk.core.settings import settings
+
+logger = logging.getLogger("data_migration")
+
+# ==========================
+# MOTORE DI MIGRAZIONE
+# ==========================
+#
+# Ogni foglio passa per tre fasi:
+#   1. prepare (opzionale, async): mapping riga → riga nuova, con eventuali letture sul DB
+#   2. build (sync): validazione Pydantic, hash password ecc. in un thread pool,
+#      a blocchi di righe, così l'event loop dell'app resta libero
+#   3. scrittura con BatchWriteItem (smartalk.core.dynamodb.batch_write_items)
+# run_migration_graph esegue i passi in parallelo rispettando le dipendenze tra tabelle.
+#
+# CHECKPOINT
+# Per ogni foglio (scope) un file JSON in settings.MIGRATION_CHECKPOINT_DIR con gli hash
+# del contenuto delle righe (o degli item) già scritti, aggiornato dopo ogni blocco:
+#   - una riga invariata non viene né validata né riscritta, quindi un secondo run è una
+#     sync incrementale e un run interrotto riparte di fatto dall'ultimo blocco scritto;
+#   - una riga scartata da prepare o build (es. errore di validazione, contratto non ancora
+#     presente) non viene registrata e viene ritentata al run successivo;
+#   - con resume i fogli completati nel run precedente vengono saltati (quelli letti a pagine,
+#     vedi iter_sheet_pages, senza nemmeno rileggerli).
+# I checkpoint sono separati per tabella di destinazione (endpoint, nome e data di creazione,
+# vedi checkpoint_target): verso un altro ambiente o una tabella ricreata il primo run riscrive tutto.
+# Con full=True gli hash vengono ignorati e tutto viene riscritto.
+# Gli hash non vedono le modifiche fatte direttamente su DynamoDB né quelle delle tabelle
+# lette in prepare: in quei casi serve un run full.
+
+VALIDATION_CHUNK_SIZE = 200
+
+_validation_executor: Optional[ThreadPoolExecutor] = None
+
+# modalità del run corrente (vedi set_run_mode)
+_resume = False
+_full = False
+
+
+def set_run_mode(resume: bool = False, full: bool = False) -> None:
+    global _resume, _full
+    _resume = resume
+    _full = full
+
+
+def get_validation_executor() -> ThreadPoolExecutor:
+    global _validation_executor
+    if _validation_executor is None:
+        _validation_executor = ThreadPoolExecutor(
+            max_workers=settings.MIGRATION_VALIDATION_WORKERS, thread_name_prefix="migration"
+        )
+    return _validation_executor
+
+
+def _build_chunk(
+    sheet_name: str,
+    build_item: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    chunk: List[Tuple[int, int, Any]],
+) -> List[Tuple[int, Dict[str, Any]]]:
+    # eseguita nel thread pool: una riga non valida viene saltata, le altre proseguono
+    items = []
+    for position, row_number, row in chunk:
+        try:
+            item = build_item(row)
+            if item is not None:
+                items.append((position, item))
+        except Exception as e:
+            logger.warning(f"  -> Skipping invalid {sheet_name} row {row_number}: {e} | Data: {row}")
+    return items
+
+
+async def build_indexed_items(
+    sheet_name: str,
+    rows: Iterable[Optional[Dict[str, Any]]],
+    build_item: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    row_numbers: Optional[List[int]] = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Applica build_item a tutte le righe nel thread pool (a blocchi), mantenendo l'ordine del foglio.
+    Restituisce (posizione della riga in rows, item) per le sole righe da cui è uscito un item.
+    row_numbers: numero di riga nel foglio di ogni riga, per i warning (default 2, 3, ...).
+    """
+    rows = list(rows)
+    row_numbers = row_numbers or list(range(2, len(rows) + 2))
+    indexed = [
+        (position, row_number, row)
+        for position, (row_number, row) in enumerate(zip(row_numbers, rows))
+        if row is not None
+    ]
+    loop = asyncio.get_running_loop()
+    executor = get_validation_executor()
+    chunks = await asyncio.gather(
+        *[
+            loop.run_in_executor(executor, _build_chunk, sheet_name, build_item, indexed[i : i + VALIDATION_CHUNK_SIZE])
+            for i in range(0, len(indexed), VALIDATION_CHUNK_SIZE)
+        ]
+    )
+    return [entry for chunk in chunks for entry in chunk]
+
+
+async def build_items(
+    sheet_name: str,
+    rows: Iterable[Optional[Dict[str, Any]]],
+    build_item: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    row_numbers: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """Come build_indexed_items, ma restituisce solo gli item."""
+    return [item for _, item in await build_indexed_items(sheet_name, rows, build_item, row_numbers=row_numbers)]
+
+
+async def prepare_rows(
+    sheet_name: str,
+    rows: List[Dict[str, Any]],
+    prepare: Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]],
+    max_concurrency: Optional[int] = None,
+    row_numbers: Optional[List[int]] = None,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Esegue prepare (async) su tutte le righe, al massimo max_concurrency alla volta.
+    None = riga da saltare; un errore su una riga la salta con un warning.
+    Il risultato è allineato a rows (stessa posizione), così si sa quali righe sono sopravvissute.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or settings.MIGRATION_WRITE_CONCURRENCY)
+    row_numbers = row_numbers or list(range(2, len(rows) + 2))
+
+    async def run(row_index: int, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await prepare(row)
+            except Exception as e:
+                logger.warning(f"  -> Skipping invalid {sheet_name} row {row_index}: {e} | Data: {row}")
+                return None
+
+    return list(await asyncio.gather(*[run(row_number, row) for row_number, row in zip(row_numbers, rows)]))
+
+
+def content_hash(value: Any) -> str:
+    """Hash stabile del contenuto (chiavi ordinate; Decimal, date ecc. come stringhe)."""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:20]
+
+
+def _safe_path_part(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", value).strip("_")
+
+
+async def checkpoint_target(db: Any, table_name: str) -> str:
+    """
+    Identità della tabella di destinazione: endpoint DynamoDB, nome e data di creazione.
+    Una tabella ricreata (es. DynamoDB Local ripulito) ha una nuova data di creazione.
+    """
+    table = await get_table(db, table_name)
+    created = await table.creation_date_time
+    return f"{get_db_client(db).meta.endpoint_url}/{table_name}@{created.isoformat()}"
+
+
+class SheetCheckpoint:
+    def __init__(self, scope: str, target: str):
+        self.scope = scope
+        self.target = target
+        self.path = os.path.join(
+            settings.MIGRATION_CHECKPOINT_DIR, _safe_path_part(target), _safe_path_part(scope) + ".json"
+        )
+        self.done = False
+        self.hashes: Set[str] = set()
+
+    @classmethod
+    async def load(cls, db: Any, table_name: str, scope: str, full: bool = False) -> "SheetCheckpoint":
+        checkpoint = cls(scope, await checkpoint_target(db, table_name))
+        if _full or full or not os.path.exists(checkpoint.path):
+            return checkpoint
+        try:
+            data = await asyncio.to_thread(_read_json, checkpoint.path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"  -> Checkpoint {checkpoint.path} non leggibile, ignorato: {e}")
+            return checkpoint
+        checkpoint.done = data.get("done", False)
+        checkpoint.hashes = set(data.get("hashes", []))
+        return checkpoint
+
+    async def save(self) -> None:
+        data = {
+            "scope": self.scope,
+            "target": self.target,
+            "done": self.done,
+            "hashes": sorted(self.hashes),
+        }
+        await asyncio.to_thread(_write_json, self.path, data)
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    # scrittura atomica: un run interrotto non lascia un checkpoint troncato
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+Rows = Union[List[Dict[str, Any]], AsyncIterator[List[Dict[str, Any]]]]
+
+
+async def _row_blocks(rows: Rows) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    (indice della prima riga, righe) a blocchi: una lista viene divisa in blocchi da
+    settings.MIGRATION_CHECKPOINT_ROWS, uno stream di pagine dà un blocco per pagina.
+    Dallo stream viene letta in anticipo la pagina successiva, così la lettura del foglio
+    si sovrappone alla scrittura del blocco corrente.
+    """
+    if isinstance(rows, list):
+        block_size = max(1, settings.MIGRATION_CHECKPOINT_ROWS)
+        for block_start in range(0, len(rows), block_size):
+            yield block_start, rows[block_start : block_start + block_size]
+        return
+
+    pages = rows.__aiter__()
+    next_page = asyncio.ensure_future(pages.__anext__())
+    block_start = 0
+    try:
+        while True:
+            try:
+                page = await next_page
+            except StopAsyncIteration:
+                return
+            next_page = asyncio.ensure_future(pages.__anext__())
+            yield block_start, page
+            block_start += len(page)
+    finally:
+        if not next_page.done():
+            next_page.cancel()
+
+
+async def migrate_rows(
+    db: Any,
+    table_name: str,
+    sheet_name: str,
+    rows: Rows,
+    build_item: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    prepare: Optional[Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]] = None,
+    skip_rows: bool = True,
+    full: bool = False,
+) -> int:
+    """
+    Pipeline completa di un foglio: prepare → build (thread pool) → BatchWriteItem, a blocchi
+    (vedi _row_blocks) con un checkpoint dopo ogni blocco. rows: lista o stream di pagine
+    (es. iter_sheet_pages): con lo stream il foglio non viene mai tenuto tutto in memoria.
+    Le righe invariate rispetto all'ultimo run vengono saltate prima di prepare/build.
+    skip_rows=False quando build_item ha effetti collaterali (es. debrief_logic): tutte le righe
+    vengono elaborate e si saltano solo gli item invariati.
+    full=True ignora il checkpoint di questo foglio (come il run full, ma solo qui).
+    Restituisce gli item scritti.
+    """
+    checkpoint = await SheetCheckpoint.load(db, table_name, sheet_name, full=full)
+    if _resume and skip_rows and checkpoint.done:
+        logger.info(f"  -> {sheet_name}: già completato nel run precedente, saltato (resume)")
+        return 0
+    checkpoint.done = False
+
+    written = skipped = total = 0
+    seen: Set[str] = set()
+    async for block_start, block in _row_blocks(rows):
+        total += len(block)
+        row_numbers = list(range(block_start + 2, block_start + 2 + len(block)))
+
+        if skip_rows:
+            # prepare può modificare le righe: hash calcolati prima
+            row_hashes = [content_hash(row) for row in block]
+            seen.update(row_hashes)
+            pending = [i for i, h in enumerate(row_hashes) if h not in checkpoint.hashes]
+            skipped += len(block) - len(pending)
+            block = [block[i] for i in pending]
+            row_numbers = [row_numbers[i] for i in pending]
+            row_hashes = [row_hashes[i] for i in pending]
+
+        if prepare is not None:
+            block = await prepare_rows(sheet_name, block, prepare, row_numbers=row_numbers)
+        built = await build_indexed_items(sheet_name, block, build_item, row_numbers=row_numbers)
+        items = [item for _, item in built]
+
+        if skip_rows:
+            # solo le righe da cui è uscito un item: quelle scartate (anche per errori transitori) vengono ritentate
+            new_hashes = [row_hashes[position] for position, _ in built]
+        else:
+            item_hashes = [content_hash(item) for item in items]
+            seen.update(item_hashes)
+            pending = [i for i, h in enumerate(item_hashes) if h not in checkpoint.hashes]
+            skipped += len(items) - len(pending)
+            items = [items[i] for i in pending]
+            new_hashes = [item_hashes[i] for i in pending]
+
+        written += await batch_write_items(db, table_name, items, max_concurrency=settings.MIGRATION_WRITE_CONCURRENCY)
+        checkpoint.hashes.update(new_hashes)
+        await checkpoint.save()
+
+    # righe non più presenti nel foglio: i loro hash non servono più
+    checkpoint.hashes &= seen
+    checkpoint.done = True
+    await checkpoint.save()
+
+    logger.info(
+        f"  -> {sheet_name}: {written} items scritti in {table_name} "
+        f"({total} righe, {skipped} {'righe invariate' if skip_rows else 'items invariati'})"
+    )
+    return written
+
+
+async def write_items(
+    db: Any,
+    table_name: str,
+    scope: str,
+    items: List[Dict[str, Any]],
+) -> int:
+    """
+    Scrive con BatchWriteItem solo gli item cambiati dall'ultimo run (hash in checkpoint),
+    a blocchi di settings.MIGRATION_CHECKPOINT_ROWS con un checkpoint dopo ogni blocco.
+    Per i passi che non partono da un foglio (es. report card generati dai contratti).
+    Restituisce gli item scritti.
+    """
+    checkpoint = await SheetCheckpoint.load(db, table_name, scope)
+    item_hashes = [content_hash(item) for item in items]
+    pending = [item for item, h in zip(items, item_hashes) if h not in checkpoint.hashes]
+
+    written = 0
+    block_size = max(1, settings.MIGRATION_CHECKPOINT_ROWS)
+    for block_start in range(0, len(pending), block_size):
+        block = pending[block_start : block_start + block_size]
+        written += await batch_write_items(db, table_name, block, max_concurrency=settings.MIGRATION_WRITE_CONCURRENCY)
+        checkpoint.hashes.update(content_hash(item) for item in block)
+        await checkpoint.save()
+
+    checkpoint.hashes &= set(item_hashes)
+    checkpoint.done = True
+    await checkpoint.save()
+    if len(pending) < len(items):
+        logger.info(f"  -> {scope}: {len(items) - len(pending)} items invariati non riscritti")
+    return written
+
+
+# ==========================
+# GRAFO DELLE DIPENDENZE
+# ==========================
+
+
+class MigrationStep:
+    def __init__(self, name: str, run: Callable[[], Awaitable[Any]], depends_on: Iterable[str] = ()):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+
+
+async def run_migration_graph(steps: List[MigrationStep]) -> None:
+    """
+    Esegue i passi appena le loro dipendenze sono completate: i passi indipendenti
+    (es. PRODUCTS e DEBRIEFS) girano in parallelo. Se un passo fallisce, i passi che
+    ne dipendono non vengono eseguiti e l'errore viene rilanciato alla fine.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        missing = [dep for dep in step.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Passo di migrazione {step.name}: dipendenze sconosciute {missing}")
+    _check_acyclic(by_name)
+
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_step(step: MigrationStep) -> None:
+        if step.depends_on:
+            await asyncio.gather(*[tasks[dep] for dep in step.depends_on])
+        logger.info(f"\n--- {step.name} ---")
+        await step.run()
+        logger.info(f"--- {step.name}: completato ---")
+
+    for step in steps:
+        tasks[step.name] = asyncio.ensure_future(run_step(step))
+
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    errors = [(name, r) for name, r in zip(tasks, results) if isinstance(r, BaseException)]
+    if errors:
+        for name, error in errors:
+            logger.error(f"Passo di migrazione {name} non completato: {error!r}")
+        raise errors[0][1]
+
+
+def _check_acyclic(by_name: Dict[str, MigrationStep]) -> None:
+    state: Dict[str, int] = {}  # 1 = in visita, 2 = visitato
+
+    def visit(name: str, path: Tuple[str, ...]) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"Dipendenze di migrazione cicliche: {' -> '.join(path + (name,))}")
+        state[name] = 1
+        for dep in by_name[name].depends_on:
+            visit(dep, path + (name,))
+        state[name] = 2
+
+    for name in by_name:
+        visit(name, ())
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ==========================
+# SOSTITUTO LOCALE DELL'ENDPOINT APPS SCRIPT DEI FOGLI
+# ==========================
+#
+# Serve i fogli da file JSON locali (<dir>/<nome foglio>.json, una lista di righe) con lo stesso
+# protocollo a pagine usato da iter_sheet_pages (smartalk.scripts.migrate_data):
+#   GET /exec?sheet=...&x_secret=...&offset=...&limit=...
+#   → {"success": true, "data": [...], "total": N}
+# Per provare la migrazione senza Google:
+#   poetry run python -m smartalk.scripts.sheets_stand_in_server sheets/ --port 8765
+#   APPS_SCRIPT_URL=http://localhost:8765/exec
+
+
+def make_handler(sheets_dir: str, secret: str | None, max_page_size: int | None):
+    class SheetsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+
+            if secret is not None and query.get("x_secret") != secret:
+                return self._send({"success": False, "error": "Invalid secret"})
+
+            path = os.path.join(sheets_dir, f"{query.get('sheet', '')}.json")
+            if not os.path.isfile(path):
+                return self._send({"success": False, "error": f"Sheet not found: {query.get('sheet')}"})
+            with open(path, encoding="utf-8") as f:
+                rows = json.load(f)
+
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", len(rows)))
+            if max_page_size:
+                limit = min(limit, max_page_size)
+            self._send({"success": True, "data": rows[offset : offset + limit], "total": len(rows)})
+
+        def _send(self, body):
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return SheetsHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint locale che serve i fogli da file JSON, a pagine.")
+    parser.add_argument("sheets_dir", help="cartella con un <nome foglio>.json per foglio")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--secret", default=None, help="x_secret richiesto (default: nessun controllo)")
+    parser.add_argument("--max-page-size", type=int, default=None, help="limite massimo di righe per pagina")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(args.sheets_dir, args.secret, args.max_page_size)
+    )
+    print(f"Fogli da {args.sheets_dir} su http://127.0.0.1:{args.port}/exec")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,38 @@
+import argparse
 import inspect
 import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List
 
 import boto3
+from botocore.config import Config
 
 from smartalk.core.settings import settings
 
 LOCAL_ENDPOINT = settings.DYNAMO_ENDPOINT or "http://localhost:8000"
 
+DUMPS_DIR = "dumps"
+# Scan parallela sulla sorgente: numero di segmenti (Segment/TotalSegments) per tabella
+SCAN_SEGMENTS = 4
+# BatchWriteItem contemporanee per tabella (default di --concurrency)
+WRITE_CONCURRENCY = 4
+# Moltiplicatore della concorrenza di scrittura per le tabelle grandi
+TABLE_WRITE_CONCURRENCY_FACTOR = {
+    settings.CALLS_TABLE: 2,
+    settings.REPORT_CARDS_TABLE: 2,
+}
+# Tabelle copiate in parallelo (default di --tables-in-parallel)
+TABLE_CONCURRENCY = 2
+BATCH_SIZE = 25  # limite di BatchWriteItem
+MAX_RETRIES = 8
+PROGRESS_EVERY_SECONDS = 5
+# calendar_sync non va copiata: i watcher vanno ricreati nell'ambiente di destinazione
+SKIP_TABLES = {settings.CALENDAR_SYNC_TABLE}
+
 
 def _extract_table_names():
     """
@@ -46,88 +71,227 @@ def _extract_table_names():
     return actual_table_names
 
 
-def export_local(table_names):
+def _client(local: bool, max_connections: int):
     """
-    Esporta tutte le tabelle locali in /dumps/<table>.json
+    Client low-level: gli item restano in wire format ({"S": ...}, {"N": ...}),
+    serializzabili in JSON senza conversioni (niente Decimal) e riscrivibili così come sono.
     """
-    os.makedirs("dumps", exist_ok=True)
-    ddb = boto3.resource(
-        "dynamodb",
-        endpoint_url=LOCAL_ENDPOINT,
-        region_name=settings.AWS_REGION,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
+    kwargs = {
+        "region_name": settings.AWS_REGION,
+        "aws_access_key_id": settings.AWS_ACCESS_KEY_ID,
+        "aws_secret_access_key": settings.AWS_SECRET_ACCESS_KEY,
+        # "adaptive": i retry di botocore rallentano il client quando DynamoDB risponde con throttling
+        "config": Config(max_pool_connections=max_connections, retries={"mode": "adaptive", "max_attempts": 10}),
+    }
+    if local:
+        kwargs["endpoint_url"] = LOCAL_ENDPOINT
+    return boto3.client("dynamodb", **kwargs)
+
+
+def _dump_path(table_name: str) -> str:
+    return os.path.join(DUMPS_DIR, f"{table_name}.ndjson")
+
+
+class Progress:
+    """Conteggio item thread-safe, con stampa periodica del throughput."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.started = time.monotonic()
+        self._last_print = self.started
+        self._lock = threading.Lock()
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.count += n
+            now = time.monotonic()
+            if now - self._last_print >= PROGRESS_EVERY_SECONDS:
+                self._last_print = now
+                print(f"  … {self.label}: {self.count} items ({self.rate():.0f} items/s)")
+
+    def rate(self) -> float:
+        return self.count / max(time.monotonic() - self.started, 1e-6)
+
+    def done(self, verb: str) -> None:
+        elapsed = time.monotonic() - self.started
+        print(f"  ✔ {self.label}: {self.count} items {verb} in {elapsed:.1f}s ({self.rate():.0f} items/s)")
+
+
+# -------------------------------------------------
+# EXPORT: scan parallela → NDJSON
+# -------------------------------------------------
+
+
+def _scan_segment(client, table_name: str, segment: int, total_segments: int, out, lock, progress: Progress) -> None:
+    kwargs: Dict[str, Any] = {"TableName": table_name, "Segment": segment, "TotalSegments": total_segments}
+    while True:
+        resp = client.scan(**kwargs)
+        items = resp.get("Items", [])
+        if items:
+            # una riga JSON per item: scritta pagina per pagina, mai tutta la tabella in memoria
+            chunk = "".join(json.dumps(item, separators=(",", ":")) + "\n" for item in items)
+            with lock:
+                out.write(chunk)
+            progress.add(len(items))
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def export_table(client, table_name: str, segments: int = SCAN_SEGMENTS) -> int:
+    progress = Progress(f"export {table_name}")
+    lock = threading.Lock()
+    tmp_path = _dump_path(table_name) + ".tmp"
+
+    with open(tmp_path, "w") as out, ThreadPoolExecutor(max_workers=segments) as pool:
+        futures = [
+            pool.submit(_scan_segment, client, table_name, seg, segments, out, lock, progress)
+            for seg in range(segments)
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+    # il dump compare solo se completo
+    os.replace(tmp_path, _dump_path(table_name))
+    progress.done("salvati")
+    return progress.count
+
+
+def export_local(table_names, segments: int = SCAN_SEGMENTS, tables_in_parallel: int = TABLE_CONCURRENCY):
+    """
+    Esporta tutte le tabelle locali in dumps/<table>.ndjson (un item DynamoDB in wire format per riga).
+    """
+    os.makedirs(DUMPS_DIR, exist_ok=True)
+    client = _client(local=True, max_connections=segments * tables_in_parallel)
 
     print("\n=== EXPORT DA DYNAMODB LOCALE ===")
-
-    for table_name in table_names:
-        if table_name == settings.CALENDAR_SYNC_TABLE:
-            print(f"SKIP {table_name} (calendar_sync non va importata)")
-            continue
-
-        table = ddb.Table(table_name)
-        print(f"→ Esporto {table_name} ...")
-
-        items = []
-        scan_kwargs = {}
-        while True:
-            resp = table.scan(**scan_kwargs)
-            items.extend(resp.get("Items", []))
-            if "LastEvaluatedKey" in resp:
-                scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
-            else:
-                break
-
-        with open(f"dumps/{table_name}.json", "w") as f:
-            json.dump(items, f)
-
-        print(f"  ✔ {len(items)} items salvati")
-
-
-def import_to_aws(table_names):
+    _run_tables(table_names, lambda table_name: export_table(client, table_name, segments), tables_in_parallel)
+
+
+# -------------------------------------------------
+# IMPORT: NDJSON → BatchWriteItem
+# -------------------------------------------------
+
+
+def _read_batches(path: str, batch_size: int = BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def write_batch(client, table_name: str, items: List[Dict[str, Any]], max_retries: int = MAX_RETRIES) -> None:
+    """BatchWriteItem (max 25 item); gli UnprocessedItems vengono ripetuti con backoff esponenziale e jitter."""
+    request = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+    for attempt in range(max_retries + 1):
+        resp = client.batch_write_item(RequestItems=request)
+        request = resp.get("UnprocessedItems") or {}
+        if not request:
+            return
+        if attempt == max_retries:
+            left = sum(len(v) for v in request.values())
+            raise RuntimeError(f"{table_name}: {left} UnprocessedItems dopo {max_retries} retry")
+        # "full jitter": i thread che ripetono insieme non si risincronizzano
+        time.sleep(random.uniform(0, min(0.05 * 2**attempt, 5)))
+
+
+def import_table(client, table_name: str, concurrency: int) -> int:
+    progress = Progress(f"import {table_name}")
+    # al massimo 2 batch in coda per worker: il file viene letto in streaming
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def write(items):
+        try:
+            write_batch(client, table_name, items)
+            progress.add(len(items))
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for items in _read_batches(_dump_path(table_name)):
+            slots.acquire()
+            futures.append(pool.submit(write, items))
+        for future in as_completed(futures):
+            future.result()
+
+    progress.done("importati")
+    return progress.count
+
+
+def table_write_concurrency(table_name: str, concurrency: int) -> int:
+    """BatchWriteItem parallele per table_name: concurrency, scalata per le tabelle grandi."""
+    return concurrency * TABLE_WRITE_CONCURRENCY_FACTOR.get(table_name, 1)
+
+
+def import_to_aws(table_names, concurrency: int = WRITE_CONCURRENCY, tables_in_parallel: int = TABLE_CONCURRENCY):
     """
-    Importa da /dumps/*.json nel DynamoDB AWS.
+    Importa da dumps/*.ndjson nel DynamoDB AWS.
     """
-    ddb = boto3.resource(
-        "dynamodb",
-        region_name=settings.AWS_REGION,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
+    max_concurrency = max((table_write_concurrency(t, concurrency) for t in table_names), default=concurrency)
+    client = _client(local=False, max_connections=max_concurrency * tables_in_parallel)
 
     print("\n=== IMPORT SU AWS DYNAMODB ===")
 
-    for table_name in table_names:
-        if table_name == settings.CALENDAR_SYNC_TABLE:
-            print(f"SKIP {table_name} (calendar_sync deve restare vuota)")
-            continue
-
-        path = f"dumps/{table_name}.json"
-        if not os.path.exists(path):
+    def run(table_name):
+        if not os.path.exists(_dump_path(table_name)):
             print(f"✖ File mancante per {table_name}, salto.")
-            continue
+            return 0
+        return import_table(client, table_name, table_write_concurrency(table_name, concurrency))
 
-        table = ddb.Table(table_name)
-        print(f"→ Importo {table_name} ...")
+    _run_tables(table_names, run, tables_in_parallel)
 
-        items = json.load(open(path))
 
-        for item in items:
-            table.put_item(Item=item)
+def _run_tables(table_names, run, tables_in_parallel: int = TABLE_CONCURRENCY) -> None:
+    """Esegue run(table_name) su più tabelle in parallelo (tables_in_parallel) e stampa il totale."""
+    started = time.monotonic()
+    tables = []
+    for table_name in table_names:
+        if table_name in SKIP_TABLES:
+            print(f"SKIP {table_name} (calendar_sync non va copiata)")
+        else:
+            tables.append(table_name)
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=tables_in_parallel) as pool:
+        futures = {pool.submit(run, table_name): table_name for table_name in tables}
+        for future in as_completed(futures):
+            total += future.result()
 
-        print(f"  ✔ {len(items)} items importati")
+    elapsed = time.monotonic() - started
+    print(f"Totale: {total} items in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.0f} items/s)")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Copia le tabelle DynamoDB locali su AWS (via dumps/*.ndjson).")
+    parser.add_argument("step", nargs="?", choices=["export", "import", "all"], default="all")
+    parser.add_argument("--segments", type=int, default=SCAN_SEGMENTS, help="segmenti della scan parallela")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=WRITE_CONCURRENCY,
+        help="BatchWriteItem parallele per tabella (x2 per CALLS e REPORT_CARDS)",
+    )
+    parser.add_argument("--tables-in-parallel", type=int, default=TABLE_CONCURRENCY)
+    args = parser.parse_args()
+
     table_names = _extract_table_names()
 
     print("\nTabelle individuate automaticamente:")
     for t in table_names:
         print(" -", t)
 
-    export_local(table_names)
-    import_to_aws(table_names)
+    if args.step in ("export", "all"):
+        export_local(table_names, args.segments, args.tables_in_parallel)
+    if args.step in ("import", "all"):
+        import_to_aws(table_names, args.concurrency, args.tables_in_parallel)
 
     print("\n=== COMPLETATO ===\n")
 
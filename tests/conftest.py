@@ -0,0 +1,33 @@
+import os
+
+# settings legge la configurazione all'import: valori fittizi per i test (nessun accesso ad AWS o Google)
+_TEST_ENV = {
+    "SENDER": "test@example.com",
+    "AWS_REGION": "eu-west-1",
+    "USERS_TABLE": "USERS",
+    "PRODUCTS_TABLE": "PRODUCTS",
+    "CONTRACTS_TABLE": "CONTRACTS",
+    "INVOICES_TABLE": "INVOICES",
+    "CALLS_TABLE": "CALLS",
+    "REPORT_CARDS_TABLE": "REPORT_CARDS",
+    "REPORT_CARD_GENERATORS_TABLE": "REPORT_CARD_GENERATORS",
+    "DEBRIEFS_TABLE": "DEBRIEFS",
+    "COMPANY_EMPLOYEES_TABLE": "COMPANY_EMPLOYEES",
+    "BOOKING_CALLS_TABLE": "BOOKING_CALLS",
+    "COUNTERS_TABLE": "COUNTERS",
+    "CALENDAR_SYNC_TABLE": "CALENDAR_SYNC",
+    "BOOKING_LOCKS_TABLE": "BOOKING_LOCKS",
+    "JWT_SECRET": "test",
+    "JWT_ALG": "HS256",
+    "GOOGLE_CLIENT_ID": "test",
+    "GMAIL_TOKEN_JSON": "{}",
+    "CALENDAR_SERVICE": "{}",
+    "LOCAL_ENDPOINT": "http://localhost:8000",
+    "X_SECRET": "test",
+    "INTERNAL_STARTUP_KEY": "test",
+    "CRON_SECRET": "test",
+    "CALENDAR_SYNC_WEBHOOK_URL": "http://localhost:8000/webhook",
+}
+
+for name, value in _TEST_ENV.items():
+    os.environ.setdefault(name, value)
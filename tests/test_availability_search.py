@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timezone
+
+from smartalk.db_usage import dynamodb_student
+from smartalk.db_usage.dynamodb_student import get_free_slots_all_coaches
+from smartalk.email_and_automations.utils.calendars_manager import CalendarManager, availability_index
+
+DAY_START = datetime(2025, 3, 3, 0, 0, tzinfo=timezone.utc)
+DAY_END = datetime(2025, 3, 4, 0, 0, tzinfo=timezone.utc)
+
+COACHES = [
+    {"id": "COA1", "email": "coa1@example.com", "calendar_id": "cal-1"},
+    {"id": "COA2", "email": "coa2@example.com", "calendar_id": "cal-2"},
+    {"id": "COA3", "email": "coa3@example.com", "calendar_id": "cal-broken"},
+]
+
+
+def _free_event(event_id, start, end):
+    return {
+        "id": event_id,
+        "start": {"dateTime": f"2025-03-03T{start}:00Z"},
+        "end": {"dateTime": f"2025-03-03T{end}:00Z"},
+        "transparency": "transparent",
+    }
+
+
+# calendari finti: cal-broken non è leggibile (es. permessi revocati)
+CALENDARS = {
+    "cal-1": [_free_event("free", "10:00", "11:00")],
+    "cal-2": [_free_event("free", "09:00", "10:30")],
+}
+
+
+def _search(monkeypatch, durations):
+    async def list_events_in_range(self, start_date, end_date):
+        await asyncio.sleep(0)
+        if self.calendar_id not in CALENDARS:
+            raise RuntimeError("403 Forbidden")
+        return list(CALENDARS[self.calendar_id])
+
+    async def slot_durations(student_id, contract_id, db, durations=None):
+        return durations
+
+    async def bookable_coaches(db):
+        return COACHES
+
+    monkeypatch.setattr(CalendarManager, "list_events_in_range", list_events_in_range)
+    monkeypatch.setattr(dynamodb_student, "get_contract_slot_durations", slot_durations)
+    monkeypatch.setattr(dynamodb_student, "get_bookable_coaches", bookable_coaches)
+
+    availability_index.clear()
+    try:
+        return asyncio.run(get_free_slots_all_coaches("STU1", "CON1", DAY_START, DAY_END, db=None, durations=durations))
+    finally:
+        availability_index.clear()
+
+
+def test_slots_of_all_coaches_are_merged_by_start(monkeypatch):
+    slots = _search(monkeypatch, [30, 60])
+
+    assert [(slot["start"][11:16], slot["coach_ids"]) for slot in slots[30]] == [
+        ("09:00", ["COA2"]),
+        ("09:30", ["COA2"]),
+        ("10:00", ["COA1", "COA2"]),
+        ("10:30", ["COA1"]),
+    ]
+    assert [(slot["start"][11:16], slot["coach_ids"]) for slot in slots[60]] == [
+        ("09:00", ["COA2"]),
+        ("09:30", ["COA2"]),
+        ("10:00", ["COA1"]),
+    ]
+
+
+def test_unreadable_calendar_is_skipped(monkeypatch):
+    slots = _search(monkeypatch, [30])
+    assert slots[30]
+    assert all("COA3" not in slot["coach_ids"] for slot in slots[30])
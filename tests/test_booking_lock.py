@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from smartalk.core import booking_lock
+from smartalk.core.booking_lock import BookingLockConflict, acquire_booking_lock, lock_ids, release_booking_lock
+
+START = datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc)
+END = datetime(2025, 3, 3, 10, 0, tzinfo=timezone.utc)
+
+
+def _client_error(code, reasons=None, operation="TransactWriteItems"):
+    response = {"Error": {"Code": code, "Message": code}}
+    if reasons is not None:
+        response["CancellationReasons"] = [{"Code": reason} for reason in reasons]
+    return ClientError(response, operation)
+
+
+def _fail_transaction(monkeypatch, error):
+    async def make_atomic_transaction(db, puts=None, **kwargs):
+        raise error
+
+    monkeypatch.setattr(booking_lock, "make_atomic_transaction", make_atomic_transaction)
+
+
+def test_lock_ids_cover_every_half_hour():
+    assert lock_ids("C1", START, END) == ["C1#2025-03-03T09:00:00+00:00", "C1#2025-03-03T09:30:00+00:00"]
+    # slot non allineato: tocca anche le mezz'ore parziali
+    assert lock_ids("C1", datetime(2025, 3, 3, 9, 15, tzinfo=timezone.utc), END) == [
+        "C1#2025-03-03T09:00:00+00:00",
+        "C1#2025-03-03T09:30:00+00:00",
+    ]
+
+
+def test_acquire_writes_one_conditional_put_per_bucket(monkeypatch):
+    calls = []
+
+    async def make_atomic_transaction(db, puts=None, **kwargs):
+        calls.append(puts)
+
+    monkeypatch.setattr(booking_lock, "make_atomic_transaction", make_atomic_transaction)
+    ids = asyncio.run(acquire_booking_lock(None, "C1", START, END, "owner-1"))
+
+    assert ids == lock_ids("C1", START, END)
+    assert len(calls) == 1
+    assert [put["Item"]["lock_id"]["S"] for put in calls[0]] == ids
+    assert all(put["ConditionExpression"] == "attribute_not_exists(lock_id) OR expires_at < :now" for put in calls[0])
+
+
+def test_conditional_check_failure_is_a_conflict(monkeypatch):
+    _fail_transaction(monkeypatch, _client_error("TransactionCanceledException", ["None", "ConditionalCheckFailed"]))
+    with pytest.raises(BookingLockConflict):
+        asyncio.run(acquire_booking_lock(None, "C1", START, END, "owner-2"))
+
+
+@pytest.mark.parametrize(
+    "reasons",
+    [
+        ["ThrottlingError", "None"],
+        ["TransactionConflict", "None"],
+        ["ConditionalCheckFailed", "ThrottlingError"],
+        [],
+    ],
+)
+def test_other_cancellation_reasons_are_reraised(monkeypatch, reasons):
+    _fail_transaction(monkeypatch, _client_error("TransactionCanceledException", reasons))
+    with pytest.raises(ClientError) as excinfo:
+        asyncio.run(acquire_booking_lock(None, "C1", START, END, "owner-2"))
+    assert not isinstance(excinfo.value, BookingLockConflict)
+
+
+def test_other_client_errors_are_reraised(monkeypatch):
+    _fail_transaction(monkeypatch, _client_error("ProvisionedThroughputExceededException"))
+    with pytest.raises(ClientError):
+        asyncio.run(acquire_booking_lock(None, "C1", START, END, "owner-2"))
+
+
+def test_slot_too_long_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(acquire_booking_lock(None, "C1", START, START.replace(hour=22), "owner-1"))
+
+
+class _FakeLocksTable:
+    """Tabella BOOKING_LOCKS in memoria: delete_item rispetta la condizione sull'owner."""
+
+    def __init__(self, owners):
+        self.owners = owners
+
+    async def delete_item(self, Key, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        lock_id = Key["lock_id"]
+        if self.owners.get(lock_id) != ExpressionAttributeValues[":owner"]:
+            raise _client_error("ConditionalCheckFailedException", operation="DeleteItem")
+        del self.owners[lock_id]
+
+
+def _use_table(monkeypatch, table):
+    async def get_table(db, table_name):
+        return table
+
+    monkeypatch.setattr(booking_lock, "get_table", get_table)
+
+
+def test_release_by_owner_deletes_locks(monkeypatch):
+    ids = lock_ids("C1", START, END)
+    table = _FakeLocksTable({lock_id: "owner-1" for lock_id in ids})
+    _use_table(monkeypatch, table)
+
+    asyncio.run(release_booking_lock(None, ids, "owner-1"))
+    assert table.owners == {}
+
+
+def test_release_by_non_owner_leaves_locks(monkeypatch):
+    # lock scaduto e ripreso da un'altra prenotazione: il vecchio owner non deve rilasciarlo
+    ids = lock_ids("C1", START, END)
+    table = _FakeLocksTable({ids[0]: "owner-2", ids[1]: "owner-1"})
+    _use_table(monkeypatch, table)
+
+    asyncio.run(release_booking_lock(None, ids, "owner-1"))
+    assert table.owners == {ids[0]: "owner-2"}
+
+
+def test_context_manager_releases_on_error(monkeypatch):
+    owners = {}
+
+    async def make_atomic_transaction(db, puts=None, **kwargs):
+        for put in puts:
+            owners[put["Item"]["lock_id"]["S"]] = put["Item"]["owner"]["S"]
+
+    monkeypatch.setattr(booking_lock, "make_atomic_transaction", make_atomic_transaction)
+    _use_table(monkeypatch, _FakeLocksTable(owners))
+
+    async def run():
+        async with booking_lock.booking_lock(None, "C1", START, END) as ids:
+            assert sorted(owners) == sorted(ids)
+            raise RuntimeError("Google non risponde")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert owners == {}
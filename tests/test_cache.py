@@ -0,0 +1,114 @@
+import asyncio
+
+from smartalk.core.cache import ReadThroughCache, TTLCache, invalidate_item, register_item_cache
+
+
+def test_ttl_cache_does_not_store_with_ttl_disabled():
+    cache = TTLCache(ttl_seconds=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl_seconds=60, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_concurrent_gets_share_one_load():
+    cache = ReadThroughCache(ttl_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "P1"}
+
+    async def run():
+        return await asyncio.gather(*[cache.get("P1", loader) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(result == {"id": "P1"} for result in results)
+    assert cache.peek("P1") == {"id": "P1"}
+
+
+def test_none_is_not_cached():
+    cache = ReadThroughCache(ttl_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        return None
+
+    async def run():
+        await cache.get("missing", loader)
+        await cache.get("missing", loader)
+
+    asyncio.run(run())
+    assert calls == 2
+
+
+def test_invalidate_during_load_discards_result():
+    cache = ReadThroughCache(ttl_seconds=60)
+    versions = iter(["old", "new"])
+
+    async def run():
+        loading = asyncio.Event()
+
+        async def loader():
+            loading.set()
+            await asyncio.sleep(0.01)
+            return next(versions)
+
+        first = asyncio.ensure_future(cache.get("P1", loader))
+        await loading.wait()
+        cache.invalidate("P1")  # scrittura sul DB mentre il caricamento è in corso
+        assert await first == "old"
+        assert cache.peek("P1") is None
+        return await cache.get("P1", loader)
+
+    assert asyncio.run(run()) == "new"
+
+
+def test_failed_load_is_not_cached_and_is_retried():
+    cache = ReadThroughCache(ttl_seconds=60)
+    attempts = 0
+
+    async def loader():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    async def run():
+        try:
+            await cache.get("P1", loader)
+        except RuntimeError:
+            pass
+        return await cache.get("P1", loader)
+
+    assert asyncio.run(run()) == "ok"
+    assert attempts == 2
+
+
+def test_invalidate_item_uses_primary_key():
+    cache = register_item_cache("TEST_ITEMS", key_names=("item_id",), ttl_seconds=60)
+    cache.set(("A",), {"item_id": "A"})
+    cache.set(("B",), {"item_id": "B"})
+
+    invalidate_item("TEST_ITEMS", {"item_id": "A", "name": "updated"})
+    assert cache.peek(("A",)) is None
+    assert cache.peek(("B",)) == {"item_id": "B"}
+
+    # chiave non ricostruibile: la cache viene svuotata
+    invalidate_item("TEST_ITEMS", {"name": "no key"})
+    assert len(cache) == 0
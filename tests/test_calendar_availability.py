@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timezone
+
+from smartalk.email_and_automations.utils.calendars_manager import (
+    CalendarAvailability,
+    apply_calendar_event,
+    availability_index,
+    get_calendar_availability,
+)
+
+DAY_START = datetime(2025, 3, 3, 0, 0, tzinfo=timezone.utc)
+DAY_END = datetime(2025, 3, 4, 0, 0, tzinfo=timezone.utc)
+
+
+def _event(event_id, start, end, free=True, **fields):
+    event = {
+        "id": event_id,
+        "start": {"dateTime": f"2025-03-03T{start}:00Z"},
+        "end": {"dateTime": f"2025-03-03T{end}:00Z"},
+        **fields,
+    }
+    if free:
+        event["transparency"] = "transparent"
+    return event
+
+
+def _availability(*events):
+    availability = CalendarAvailability(DAY_START, DAY_END)
+    for event in events:
+        availability.apply_event(event)
+    return availability
+
+
+def _slot_starts(availability, duration):
+    return [slot["start"][11:16] for slot in availability.free_slots(DAY_START, DAY_END, duration)]
+
+
+def test_busy_event_removes_slots_from_free_events():
+    availability = _availability(
+        _event("free-1", "09:00", "11:00"),
+        _event("free-2", "11:00", "12:00"),  # adiacente a free-1
+        _event("busy", "10:00", "10:30", free=False),
+    )
+    assert _slot_starts(availability, 30) == ["09:00", "09:30", "10:30", "11:00", "11:30"]
+    assert _slot_starts(availability, 60) == ["09:00", "10:30", "11:00"]
+
+
+def test_partial_minutes_are_not_free():
+    # FREE non allineato: conta solo dalla mezz'ora successiva; BUSY blocca ogni minuto toccato
+    availability = _availability(
+        _event("free", "09:10", "11:00"),
+        _event("busy", "10:29", "10:31", free=False),
+    )
+    assert _slot_starts(availability, 30) == ["09:30"]
+
+
+def test_event_update_and_cancellation():
+    availability = _availability(_event("free", "09:00", "10:00"), _event("busy", "09:00", "09:30", free=False))
+    assert _slot_starts(availability, 30) == ["09:30"]
+
+    availability.apply_event(_event("busy", "09:30", "10:00", free=False))  # spostato
+    assert _slot_starts(availability, 30) == ["09:00"]
+
+    availability.apply_event({"id": "busy", "status": "cancelled"})
+    assert _slot_starts(availability, 30) == ["09:00", "09:30"]
+
+    availability.apply_event({"id": "free", "status": "cancelled"})
+    assert _slot_starts(availability, 30) == []
+
+
+def test_all_day_events_are_ignored():
+    availability = _availability(
+        _event("free", "09:00", "10:00"),
+        {"id": "holiday", "start": {"date": "2025-03-03"}, "end": {"date": "2025-03-04"}},
+    )
+    assert _slot_starts(availability, 30) == ["09:00", "09:30"]
+
+
+def test_long_busy_event_started_before_range():
+    availability = _availability(
+        _event("busy", "00:00", "10:00", free=False),
+        _event("free", "09:00", "11:00"),
+    )
+    assert _slot_starts(availability, 60) == ["10:00"]
+
+
+def test_free_slots_by_duration_share_one_computation():
+    availability = _availability(_event("free", "09:00", "10:30"))
+    slots = availability.free_slots_by_duration(DAY_START, DAY_END, [30, 45, 90])
+    assert {duration: [slot["start"][11:16] for slot in values] for duration, values in slots.items()} == {
+        30: ["09:00", "09:30", "10:00"],
+        45: ["09:00", "09:30"],
+        90: ["09:00"],
+    }
+    assert slots[45][0]["end"] == "2025-03-03T09:45:00+00:00"
+
+
+class _FakeManager:
+    calendar_id = "coach@example.com"
+
+    def __init__(self, events):
+        self.events = events
+        self.loads = 0
+
+    async def list_events_in_range(self, start_date, end_date):
+        self.loads += 1
+        await asyncio.sleep(0)
+        return list(self.events)
+
+
+def test_index_is_loaded_once_and_updated_by_events():
+    availability_index.clear()
+    manager = _FakeManager([_event("free", "09:00", "10:00")])
+
+    async def run():
+        availabilities = await asyncio.gather(
+            *[get_calendar_availability(manager, DAY_START, DAY_END) for _ in range(5)]
+        )
+        assert manager.loads == 1
+        assert all(availability is availabilities[0] for availability in availabilities)
+
+        apply_calendar_event(manager.calendar_id, _event("busy", "09:00", "09:30", free=False))
+        availability = await get_calendar_availability(manager, DAY_START, DAY_END)
+        assert manager.loads == 1
+        return _slot_starts(availability, 30)
+
+    try:
+        assert asyncio.run(run()) == ["09:30"]
+    finally:
+        availability_index.clear()
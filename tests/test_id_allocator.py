@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from smartalk.core import id_allocator
+from smartalk.core.id_allocator import IdAllocator
+
+
+class _FakeCountersTable:
+    """Tabella COUNTERS in memoria con le sole espressioni usate da IdAllocator."""
+
+    def __init__(self):
+        self.values = {}
+        self.updates = 0
+
+    def _condition_failed(self, operation):
+        return ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, operation)
+
+    async def put_item(self, Item, ConditionExpression):
+        if Item["counter_name"] in self.values:
+            raise self._condition_failed("PutItem")
+        self.values[Item["counter_name"]] = Item["value"]
+
+    async def update_item(
+        self,
+        Key,
+        UpdateExpression,
+        ConditionExpression,
+        ExpressionAttributeNames,
+        ExpressionAttributeValues,
+        ReturnValues=None,
+    ):
+        await asyncio.sleep(0)
+        name = Key["counter_name"]
+        self.updates += 1
+        if UpdateExpression.startswith("ADD"):
+            if name not in self.values:
+                raise self._condition_failed("UpdateItem")
+            self.values[name] += ExpressionAttributeValues[":n"]
+            return {"Attributes": {"value": self.values[name]}}
+        if name in self.values and self.values[name] >= ExpressionAttributeValues[":v"]:
+            raise self._condition_failed("UpdateItem")
+        self.values[name] = ExpressionAttributeValues[":v"]
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    table = _FakeCountersTable()
+
+    async def get_table(db, table_name):
+        return table
+
+    monkeypatch.setattr(id_allocator, "get_table", get_table)
+    return table
+
+
+def test_format_and_parse_accept_legacy_widths():
+    allocator = IdAllocator("contract_id", prefix="CON")
+    assert allocator.format(7) == "CON007"
+    assert allocator.format(1234) == "CON1234"
+    assert allocator.parse("CON007") == 7
+    assert allocator.parse("CON0010") == 10
+    assert allocator.parse("STU001") is None
+    assert allocator.parse("CON") is None
+
+
+def test_concurrent_next_id_never_repeats(counters):
+    allocator = IdAllocator("contract_id", prefix="CON")
+
+    async def run():
+        return await asyncio.gather(*[allocator.next_id(None) for _ in range(20)])
+
+    ids = asyncio.run(run())
+    assert sorted(ids) == [f"CON{n:03d}" for n in range(1, 21)]
+
+
+def test_seed_is_used_once_when_counter_is_missing(counters):
+    seeds = 0
+
+    async def seed(db):
+        nonlocal seeds
+        seeds += 1
+        return 41
+
+    allocator = IdAllocator("contract_id", prefix="CON", seed=seed)
+
+    async def run():
+        return [await allocator.next_id(None), await allocator.next_id(None)]
+
+    assert asyncio.run(run()) == ["CON042", "CON043"]
+    assert seeds == 1
+
+
+def test_block_size_reserves_once_per_block(counters):
+    allocator = IdAllocator("contract_id", prefix="CON", block_size=5)
+
+    async def run():
+        return [await allocator.next_id(None) for _ in range(6)]
+
+    assert asyncio.run(run()) == ["CON001", "CON002", "CON003", "CON004", "CON005", "CON006"]
+    assert counters.values["contract_id"] == 10
+    assert counters.updates == 3  # ADD fallita (contatore assente), primo blocco, secondo blocco
+
+
+def test_ensure_at_least_discards_local_block(counters):
+    allocator = IdAllocator("contract_id", prefix="CON", block_size=5)
+
+    async def run():
+        first = await allocator.next_id(None)
+        await allocator.ensure_at_least(None, 50)  # import con ID fino a CON050
+        await allocator.ensure_at_least(None, 20)  # mai all'indietro
+        return first, await allocator.next_id(None)
+
+    assert asyncio.run(run()) == ("CON001", "CON051")
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from smartalk.core.settings import settings
+from smartalk.scripts import migrate_data, migration_engine
+from smartalk.scripts.migrate_data import SheetFetchError, iter_sheet_pages
+from smartalk.scripts.migration_engine import migrate_rows, write_items
+
+
+class _FakeTable:
+    def __init__(self, created):
+        self.created = created
+
+    @property
+    def creation_date_time(self):
+        return asyncio.sleep(0, result=self.created)
+
+    @property
+    def key_schema(self):
+        return asyncio.sleep(0, result=[{"AttributeName": "id", "KeyType": "HASH"}])
+
+
+class _FakeDb:
+    """Risorsa DynamoDB minima: una tabella per nome e BatchWriteItem registrata."""
+
+    def __init__(self, endpoint_url="http://localhost:8000", created=datetime(2025, 1, 1, tzinfo=timezone.utc)):
+        self.meta = SimpleNamespace(client=SimpleNamespace(meta=SimpleNamespace(endpoint_url=endpoint_url)))
+        self.created = created
+        self.written = []
+
+    async def Table(self, name):
+        return _FakeTable(self.created)
+
+    async def batch_write_item(self, RequestItems):
+        for requests in RequestItems.values():
+            self.written.extend(request["PutRequest"]["Item"]["id"] for request in requests)
+        return {}
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MIGRATION_CHECKPOINT_DIR", str(tmp_path))
+    migration_engine.set_run_mode()
+    yield
+    migration_engine.set_run_mode()
+
+
+ROWS = [{"id": "A", "name": "a"}, {"id": "B", "name": "b"}, {"id": "C", "name": "c"}]
+
+
+def _build(row):
+    return {"id": row["id"], "name": row["name"]}
+
+
+def _migrate(db, rows=ROWS, **kwargs):
+    return asyncio.run(migrate_rows(db, "USERS", "Users", [dict(row) for row in rows], _build, **kwargs))
+
+
+def test_unchanged_rows_are_skipped_on_the_next_run():
+    db = _FakeDb()
+    assert _migrate(db) == 3
+    assert _migrate(db) == 0
+    changed = [ROWS[0], {"id": "B", "name": "b2"}, ROWS[2]]
+    assert _migrate(db, changed) == 1
+    assert db.written[-1] == "B"
+
+
+def test_rows_dropped_by_prepare_or_build_are_retried():
+    contract_ready = False
+
+    async def prepare(row):
+        if row["id"] == "B" and not contract_ready:
+            raise RuntimeError("contratto non ancora migrato")
+        return row
+
+    def build(row):
+        if row["id"] == "C" and not contract_ready:
+            raise ValueError("riga non valida")
+        return _build(row)
+
+    db = _FakeDb()
+
+    def run():
+        return asyncio.run(migrate_rows(db, "USERS", "Users", [dict(row) for row in ROWS], build, prepare=prepare))
+
+    assert run() == 1
+    contract_ready = True
+    assert run() == 2
+    assert db.written == ["A", "B", "C"]
+    assert run() == 0
+
+
+def test_checkpoints_are_scoped_to_the_target_table():
+    local = _FakeDb()
+    assert _migrate(local) == 3
+
+    # altro ambiente: stesso foglio, nessuna riga data per già scritta
+    aws = _FakeDb(endpoint_url="https://dynamodb.eu-west-1.amazonaws.com")
+    assert _migrate(aws) == 3
+
+    # tabella locale ricreata: nuova data di creazione
+    recreated = _FakeDb(created=datetime(2025, 6, 1, tzinfo=timezone.utc))
+    assert _migrate(recreated) == 3
+
+    assert _migrate(local) == 0
+
+
+def test_full_ignores_the_checkpoint_of_one_sheet():
+    db = _FakeDb()
+    assert _migrate(db) == 3
+    assert _migrate(db, full=True) == 3
+
+
+def test_write_items_returns_only_changed_items():
+    db = _FakeDb()
+    items = [_build(row) for row in ROWS]
+    assert asyncio.run(write_items(db, "REPORT_CARDS", "Generated", items)) == 3
+    items[1] = {"id": "B", "name": "b2"}
+    assert asyncio.run(write_items(db, "REPORT_CARDS", "Generated", items)) == 1
+
+
+class _FailingSheetsClient:
+    async def get(self, url, params):
+        raise OSError("connessione rifiutata")
+
+
+def test_failed_sheet_read_does_not_complete_the_checkpoint(monkeypatch):
+    monkeypatch.setattr(migrate_data, "get_sheets_client", lambda: _FailingSheetsClient())
+    db = _FakeDb()
+
+    def migrate_failing_sheet():
+        return asyncio.run(migrate_rows(db, "USERS", "Users", iter_sheet_pages("Users"), _build))
+
+    # primo run: nessun checkpoint scritto, con resume il foglio non viene saltato
+    with pytest.raises(SheetFetchError):
+        migrate_failing_sheet()
+    migration_engine.set_run_mode(resume=True)
+    assert _migrate(db) == 3
+
+    # run successivo fallito: gli hash restano, il run dopo non riscrive nulla
+    migration_engine.set_run_mode()
+    with pytest.raises(SheetFetchError):
+        migrate_failing_sheet()
+    assert _migrate(db) == 0
@@ -0,0 +1,169 @@
+import asyncio
+import base64
+import json
+import re
+from types import SimpleNamespace
+
+import botocore.session
+import pytest
+from botocore.validate import validate_parameters
+
+from smartalk.db_usage import dynamodb_coach
+from smartalk.email_and_automations import report_card_sender
+from smartalk.email_and_automations.utils import email_sender
+from smartalk.email_and_automations.utils.email_sender import EmailTransportError, InMemoryTransport
+from smartalk.routes.coach import send_all_completed_report_cards
+
+HEAD_COACH = {"id": "HC1", "email": "head@example.com", "user_type": "head_coach"}
+
+_TRANSACT_WRITE_INPUT = (
+    botocore.session.get_session().get_service_model("dynamodb").operation_model("TransactWriteItems").input_shape
+)
+
+
+class _FakeDynamoClient:
+    """Client low-level che valida le richieste come botocore (ParamValidationError) e le registra."""
+
+    def __init__(self):
+        self.transactions = []
+
+    async def transact_write_items(self, **params):
+        validate_parameters(params, _TRANSACT_WRITE_INPUT)
+        for item in params["TransactItems"]:
+            for operation in item.values():
+                for name in ("ConditionExpression", "UpdateExpression"):
+                    # "status" è una parola riservata di DynamoDB: va usata tramite ExpressionAttributeNames
+                    assert not re.search(r"(?<![#:\w])status\b", operation.get(name, "")), operation[name]
+        self.transactions.append(params["TransactItems"])
+
+
+def _report_card(report_card_id, generator_id, client_id, start_month, recipients):
+    return {
+        "report_card_id": report_card_id,
+        "report_card_generator_id": generator_id,
+        "student_id": "STU001",
+        "coach_id": "COA001",
+        "client_id": client_id,
+        "start_month": start_month,
+        "end_month": start_month,
+        "attendance": "100%",
+        "report": "ok",
+        "report_card_email_recipients": recipients,
+    }
+
+
+REPORT_CARDS = [
+    # RCG1: un gruppo inviato e uno senza destinatari → solo RC1 a sent, il generator non avanza
+    _report_card("RC1", "RCG1", "CLI1", "2025-01", "hr@client1.com"),
+    _report_card("RC2", "RCG1", "CLI1", "2025-02", None),
+    # RCG2: destinatari senza indirizzo utilizzabile → nessun aggiornamento
+    _report_card("RC3", "RCG2", "CLI2", "2025-01", " , "),
+    # RCG3: client mancante → nessun aggiornamento
+    _report_card("RC4", "RCG3", None, "2025-01", "hr@client3.com"),
+    # RCG4: tutto inviato → report card a sent e generator eliminato
+    _report_card("RC5", "RCG4", "CLI4", "2025-01", "hr@client4.com, cc@client4.com"),
+]
+
+
+def _mock_send_flow(monkeypatch, transport):
+    async def no_expired(db):
+        return {"success": True}
+
+    async def completed_report_cards(db):
+        return [dict(report_card) for report_card in REPORT_CARDS]
+
+    async def resolve_names(ids, db):
+        return {id_: f"Name {id_}" for id_ in ids}
+
+    async def min_start_month(report_card_generator_id, db):
+        return None
+
+    async def render_pdf_bytes(html_content):
+        return b"%PDF-1.4"
+
+    monkeypatch.setattr(dynamodb_coach, "is_empty_no_show_or_draft_expired_report_cards", no_expired)
+    monkeypatch.setattr(dynamodb_coach, "get_completed_expired_report_cards", completed_report_cards)
+    monkeypatch.setattr(dynamodb_coach, "resolve_names", resolve_names)
+    monkeypatch.setattr(dynamodb_coach, "get_min_report_card_start_month_by_report_card_generator_id", min_start_month)
+    monkeypatch.setattr(report_card_sender, "render_pdf_bytes", render_pdf_bytes)
+    monkeypatch.setattr(report_card_sender, "load_snippet_from_template", lambda name: "")
+    monkeypatch.setattr(email_sender, "get_email_transport", lambda: transport)
+
+
+def test_partial_failure_marks_only_delivered_report_cards(monkeypatch):
+    transport = InMemoryTransport()
+    _mock_send_flow(monkeypatch, transport)
+    client = _FakeDynamoClient()
+    db = SimpleNamespace(meta=SimpleNamespace(client=client))
+
+    response = asyncio.run(send_all_completed_report_cards(head_coach=HEAD_COACH, DBDependency=db))
+    body = json.loads(response.body)
+
+    recipients = sorted(
+        re.search(r"^To: (.*)$", base64.urlsafe_b64decode(raw).decode(), re.M).group(1) for raw in transport.sent
+    )
+    assert recipients == ["hr@client1.com", "hr@client4.com"]
+
+    updated = {
+        (
+            operation["Update"]["Key"]["report_card_id"]["S"],
+            operation["Update"]["ExpressionAttributeValues"][":report_card_generator_id"]["S"],
+        )
+        for transaction in client.transactions
+        for operation in transaction
+        if "Update" in operation
+    }
+    deleted = [
+        operation["Delete"]["Key"]["report_card_generator_id"]["S"]
+        for transaction in client.transactions
+        for operation in transaction
+        if "Delete" in operation
+    ]
+    assert updated == {("RC1", "RCG1"), ("RC5", "RCG4")}
+    assert deleted == ["RCG4"]
+
+    assert sorted((f["client_id"] or "", f["start_month"]) for f in body["failed"]) == [
+        ("", "2025-01"),
+        ("CLI1", "2025-02"),
+        ("CLI2", "2025-01"),
+    ]
+
+
+class _BrokenTransport:
+    """Trasporto che solleva un errore non di trasporto (es. socket chiuso) per i messaggi marcati."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, raw_b64):
+        if raw_b64 == "broken":
+            raise OSError("connection reset by peer")
+        self.sent.append(raw_b64)
+        return {"id": f"fake-{len(self.sent)}"}
+
+
+def test_unexpected_transport_error_fails_only_its_message():
+    async def messages():
+        for index, raw in enumerate(["ok-1", "broken", "ok-2"]):
+            yield {"raw": raw, "index": index}
+
+    results = asyncio.run(email_sender.send_messages(messages(), transport=_BrokenTransport()))
+
+    assert [(r["index"], r["success"]) for r in results] == [(0, True), (1, False), (2, True)]
+    assert "connection reset" in results[1]["error"]
+
+
+def test_gmail_transport_wraps_connection_errors(monkeypatch):
+    class _Request:
+        def execute(self):
+            raise TimeoutError("timed out")
+
+    service = SimpleNamespace(
+        users=lambda: SimpleNamespace(messages=lambda: SimpleNamespace(send=lambda userId, body: _Request()))
+    )
+    monkeypatch.setattr(email_sender, "get_gmail_service", lambda: service)
+
+    with pytest.raises(EmailTransportError) as excinfo:
+        email_sender.GmailApiTransport()._send_sync("raw")
+    assert excinfo.value.status is None
+    assert excinfo.value.retryable
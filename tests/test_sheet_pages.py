@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from smartalk.scripts import migrate_data
+from smartalk.scripts.migrate_data import iter_sheet_pages
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class _FakeSheetsClient:
+    """
+    Endpoint Apps Script finto: paginated=False imita lo script che ignora offset/limit e non manda total,
+    max_page_size lo stand-in che limita le righe per pagina.
+    """
+
+    def __init__(self, rows, paginated=True, max_page_size=None):
+        self.rows = rows
+        self.paginated = paginated
+        self.max_page_size = max_page_size
+        self.requests = 0
+
+    async def get(self, url, params):
+        self.requests += 1
+        if self.requests > 10:
+            raise AssertionError("troppe richieste: paginazione senza fine")
+        if not self.paginated:
+            return _Response({"success": True, "data": self.rows})
+        offset, limit = params["offset"], params["limit"]
+        if self.max_page_size:
+            limit = min(limit, self.max_page_size)
+        return _Response({"success": True, "data": self.rows[offset : offset + limit], "total": len(self.rows)})
+
+
+def _pages(monkeypatch, client, page_size):
+    monkeypatch.setattr(migrate_data, "get_sheets_client", lambda: client)
+
+    async def run():
+        return [page async for page in iter_sheet_pages("Students", page_size=page_size)]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("row_count, expected_pages", [(0, 0), (3, 1), (4, 1), (5, 2), (8, 2), (9, 3)])
+def test_paginated_endpoint(monkeypatch, row_count, expected_pages):
+    rows = [{"id": i} for i in range(row_count)]
+    pages = _pages(monkeypatch, _FakeSheetsClient(rows), page_size=4)
+    assert len(pages) == expected_pages
+    assert [row for page in pages for row in page] == rows
+
+
+@pytest.mark.parametrize("row_count", [3, 4, 9])
+def test_endpoint_ignoring_offset_returns_one_page(monkeypatch, row_count):
+    rows = [{"id": i} for i in range(row_count)]
+    client = _FakeSheetsClient(rows, paginated=False)
+    assert _pages(monkeypatch, client, page_size=4) == [rows]
+    assert client.requests == 1
+
+
+def test_endpoint_capping_the_page_size_returns_every_row(monkeypatch):
+    rows = [{"id": i} for i in range(10)]
+    pages = _pages(monkeypatch, _FakeSheetsClient(rows, max_page_size=3), page_size=5)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert [row for page in pages for row in page] == rows
@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from smartalk.email_and_automations.utils.calendars_manager import (
+    _from_minutes,
+    _to_minutes,
+    merge_intervals,
+    slot_starts_by_duration,
+    subtract_intervals,
+)
+
+# lunedì 3 marzo 2025, 09:00 UTC: allineato alla mezz'ora
+BASE = _to_minutes(datetime(2025, 3, 3, 9, 0, tzinfo=timezone.utc))
+
+
+@pytest.mark.parametrize(
+    "intervals, expected",
+    [
+        ([], []),
+        ([(0, 30)], [(0, 30)]),
+        ([(0, 30), (30, 60)], [(0, 60)]),  # adiacenti
+        ([(0, 45), (30, 60)], [(0, 60)]),  # sovrapposti
+        ([(0, 120), (30, 60)], [(0, 120)]),  # contenuto
+        ([(0, 30), (31, 60)], [(0, 30), (31, 60)]),  # separati da un minuto
+        ([(0, 30), (10, 20), (25, 90), (100, 110)], [(0, 90), (100, 110)]),
+    ],
+)
+def test_merge_intervals(intervals, expected):
+    assert merge_intervals(intervals) == expected
+
+
+@pytest.mark.parametrize(
+    "free, busy, expected",
+    [
+        ([(0, 120)], [], [(0, 120)]),
+        ([], [(0, 120)], []),
+        ([(0, 120)], [(0, 120)], []),
+        ([(0, 120)], [(30, 60)], [(0, 30), (60, 120)]),
+        ([(0, 120)], [(0, 30)], [(30, 120)]),  # busy all'inizio
+        ([(0, 120)], [(90, 120)], [(0, 90)]),  # busy alla fine
+        ([(0, 120)], [(-30, 10), (110, 200)], [(10, 110)]),  # busy che sbordano
+        ([(0, 60), (90, 150)], [(30, 120)], [(0, 30), (120, 150)]),  # un busy su due free
+        ([(0, 60), (90, 150)], [(-10, 200)], []),
+        ([(0, 120)], [(10, 20), (30, 40), (50, 60)], [(0, 10), (20, 30), (40, 50), (60, 120)]),
+        ([(0, 30), (60, 90)], [(30, 60)], [(0, 30), (60, 90)]),  # busy solo tra i free
+    ],
+)
+def test_subtract_intervals(free, busy, expected):
+    assert subtract_intervals(free, busy) == expected
+
+
+def _starts(intervals, durations):
+    return {
+        duration: [int(m) - BASE for m in starts]
+        for duration, starts in slot_starts_by_duration(intervals, durations).items()
+    }
+
+
+def test_slot_boundaries_for_each_duration():
+    # due ore libere: uno slot deve finire entro la fine dell'intervallo
+    assert _starts([(BASE, BASE + 120)], [30, 45, 60, 90, 120, 150]) == {
+        30: [0, 30, 60, 90],
+        45: [0, 30, 60],
+        60: [0, 30, 60],
+        90: [0, 30],
+        120: [0],
+        150: [],
+    }
+
+
+def test_slot_starts_are_aligned_to_half_hour():
+    # 09:10-10:40: il primo start è 09:30, l'ultimo da 60 minuti 09:30 (10:00 + 60 > 10:40)
+    assert _starts([(BASE + 10, BASE + 100)], [30, 60]) == {30: [30, 60], 60: [30]}
+
+
+def test_slot_exactly_fitting_and_one_minute_short():
+    assert _starts([(BASE, BASE + 45)], [45]) == {45: [0]}
+    assert _starts([(BASE, BASE + 44)], [45]) == {45: []}
+    assert _starts([(BASE + 1, BASE + 60)], [30]) == {30: [30]}
+
+
+def test_slots_over_multiple_intervals_and_midnight():
+    midnight = _to_minutes(datetime(2025, 3, 4, 0, 0, tzinfo=timezone.utc))
+    intervals = [(BASE, BASE + 60), (midnight - 60, midnight + 60)]
+    starts = slot_starts_by_duration(intervals, [60])[60]
+    assert [_from_minutes(int(m)).isoformat() for m in starts] == [
+        "2025-03-03T09:00:00+00:00",
+        "2025-03-03T23:00:00+00:00",
+        "2025-03-03T23:30:00+00:00",
+        "2025-03-04T00:00:00+00:00",
+    ]
+
+
+def test_no_intervals_or_too_short_intervals():
+    assert _starts([], [30, 60]) == {30: [], 60: []}
+    assert _starts([(BASE + 5, BASE + 25)], [30]) == {30: []}
+    assert slot_starts_by_duration([(BASE, BASE + 60)], []) == {}